@@ -0,0 +1,86 @@
+"""Compare embedding backends: load time, peak RSS and per-query latency.
+
+Each backend runs in its own subprocess so RSS numbers are not mixed up:
+
+    python bench_embeddings.py --backends torch onnx onnx-int8 --queries 200
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+SAMPLE_QUERIES = [
+    "Как привлечь первых клиентов в B2B?",
+    "Требования ЦБ РФ к финтех-стартапам",
+    "Какие венчурные фонды инвестируют на ранних стадиях?",
+    "Тренды онлайн-образования в России",
+    "Маркетплейс для малого бизнеса",
+]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(backend: str, n_queries: int) -> dict:
+    start = time.perf_counter()
+    import rag
+
+    embedding_fn = rag.E5EmbeddingFunction(backend)
+    load_s = time.perf_counter() - start
+    rss_after_load = _peak_rss_mb()
+
+    latencies = []
+    for i in range(n_queries):
+        query = f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} #{i}"
+        t0 = time.perf_counter()
+        embedding_fn._encode_queries([query])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "rss_after_load_mb": round(rss_after_load, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "query_p50_ms": round(statistics.median(latencies), 2),
+        "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.queries)))
+        return
+
+    results = []
+    for backend in args.backends:
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--queries", str(args.queries)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    header = f"{'backend':<10} {'load s':>8} {'RSS MB':>8} {'peak MB':>8} {'p50 ms':>8} {'p95 ms':>8}"
+    print(header)
+    for r in results:
+        print(
+            f"{r['backend']:<10} {r['load_s']:>8} {r['rss_after_load_mb']:>8} "
+            f"{r['peak_rss_mb']:>8} {r['query_p50_ms']:>8} {r['query_p95_ms']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Evaluate RAG retrieval quality and per-stage latency on a labelled query set.
+
+Each line of the query set is {"query": ..., "relevant": [...]}, where every
+relevant entry is a text snippet; a retrieved chunk containing it counts as a
+hit. Snippets survive re-chunking and reindexing, chunk ids do not. The seed
+set in sample_docs/eval_queries.jsonl matches the default CHROMA_DOCS_DIR.
+
+Every retrieval mode runs over the same set: plain vector order, vector with
+the BM25 rerank, and hybrid RRF. For each it reports recall@k and MRR, plus
+p50/p95/p99 per stage (encode, vector, rerank/fuse, lexical, total):
+
+    python bench_rag_eval.py --out eval.json
+    python bench_rag_eval.py --baseline eval.json   # exit 1 on a recall/MRR drop
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import rag
+
+MODES = {
+    "vector": {"hybrid": False, "rerank": False},
+    "vector+rerank": {"hybrid": False, "rerank": True},
+    "hybrid": {"hybrid": True, "rerank": True},
+}
+STAGES = ("encode", "vector", "rerank", "fuse", "lexical", "total")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def load_queries(path: Path) -> list[dict]:
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def _first_hit(chunks: list[str], snippets: list[str]) -> int | None:
+    for rank, chunk in enumerate(chunks, start=1):
+        if any(snippet in chunk for snippet in snippets):
+            return rank
+    return None
+
+
+def _recall(chunks: list[str], snippets: list[str]) -> float:
+    return sum(any(snippet in chunk for chunk in chunks) for snippet in snippets) / len(snippets)
+
+
+def evaluate(instance: rag.StartupRAG, queries: list[dict], top_k: int, rounds: int) -> dict:
+    """Quality from the first round, latency from all rounds with cold query encodes."""
+    ks = [k for k in (1, 3, 5, 10) if k <= top_k] or [top_k]
+    stage_ms: dict[str, list[float]] = {}
+    per_query = []
+    for round_no in range(rounds):
+        for item in queries:
+            # Measure cold encodes, not query-embedding cache hits
+            instance.embedding_fn._query_cache.clear()
+            timings: dict[str, float] = {}
+            chunks = instance.query(item["query"], top_k=top_k, timings=timings)
+            for stage, seconds in timings.items():
+                stage_ms.setdefault(stage, []).append(seconds * 1000)
+            if round_no == 0:
+                per_query.append({
+                    "query": item["query"],
+                    "first_hit": _first_hit(chunks, item["relevant"]),
+                    **{f"recall@{k}": _recall(chunks[:k], item["relevant"]) for k in ks},
+                })
+
+    result = {
+        f"recall@{k}": round(sum(q[f"recall@{k}"] for q in per_query) / len(per_query), 4) for k in ks
+    }
+    result["mrr"] = round(sum(1 / q["first_hit"] for q in per_query if q["first_hit"]) / len(per_query), 4)
+    result["latency_ms"] = {
+        stage: {
+            "p50": round(_percentile(stage_ms[stage], 50), 2),
+            "p95": round(_percentile(stage_ms[stage], 95), 2),
+            "p99": round(_percentile(stage_ms[stage], 99), 2),
+        }
+        for stage in STAGES
+        if stage in stage_ms
+    }
+    result["queries"] = per_query
+    return result
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: dict, baseline: dict, max_drop: float) -> list[str]:
+    """Quality metrics that fell more than `max_drop` below the baseline."""
+    regressions = []
+    for mode, metrics in report["modes"].items():
+        old = baseline.get("modes", {}).get(mode)
+        if not old:
+            continue
+        for name, value in metrics.items():
+            if name.startswith("recall@") or name == "mrr":
+                if name in old and value < old[name] - max_drop:
+                    regressions.append(f"{mode} {name}: {old[name]} -> {value}")
+        for stage, pcts in metrics["latency_ms"].items():
+            before = old.get("latency_ms", {}).get(stage)
+            if before:
+                print(f"  {mode:<14} {stage:<8} p95 {before['p95']:>8.2f} -> {pcts['p95']:>8.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG retrieval quality and latency evaluation")
+    parser.add_argument("--queries", type=Path, default=Path("sample_docs/eval_queries.jsonl"))
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the set for latency percentiles")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--out", type=Path, help="write the JSON report here")
+    parser.add_argument("--baseline", type=Path, help="JSON report of an earlier commit to compare against")
+    parser.add_argument("--max-drop", type=float, default=0.02, help="tolerated recall/MRR drop vs baseline")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    instance = rag.StartupRAG.build()
+    # Warm up the model and caches so the first query does not skew p99
+    for item in queries:
+        instance.query(item["query"], top_k=args.top_k)
+
+    report = {
+        "commit": _commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "query_set": str(args.queries),
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "rounds": args.rounds,
+        "config": {
+            "embedding_model": rag.EMBEDDING_MODEL_NAME,
+            "embedding_backend": rag.EMBEDDING_BACKEND,
+            "vector_store": rag.VECTOR_STORE,
+            "chunks": instance.collection.count(),
+        },
+        "modes": {},
+    }
+    for mode in args.modes:
+        rag.HYBRID_RETRIEVAL = MODES[mode]["hybrid"]
+        rag.RERANK_ENABLED = MODES[mode]["rerank"]
+        report["modes"][mode] = evaluate(instance, queries, args.top_k, args.rounds)
+
+    recall_keys = [key for key in next(iter(report["modes"].values())) if key.startswith("recall@")]
+    header = " ".join(f"{key:>9}" for key in recall_keys)
+    print(f"{'mode':<14} {header} {'mrr':>6}  " + " ".join(f"{stage + ' p95':>12}" for stage in STAGES))
+    for mode, metrics in report["modes"].items():
+        recalls = " ".join(f"{metrics[key]:>9.3f}" for key in recall_keys)
+        latencies = " ".join(
+            f"{metrics['latency_ms'][stage]['p95'] if stage in metrics['latency_ms'] else '-':>12}" for stage in STAGES
+        )
+        print(f"{mode:<14} {recalls} {metrics['mrr']:>6.3f}  {latencies}")
+
+    if args.out:
+        args.out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        print(f"Compared with {baseline.get('commit') or args.baseline}:")
+        regressions = compare(report, baseline, args.max_drop)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
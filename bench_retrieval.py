@@ -0,0 +1,75 @@
+"""Measure StartupRAG.query latency with hybrid retrieval on and off.
+
+Exits with status 1 if the hybrid p95 exceeds the budget
+(RAG_RETRIEVAL_BUDGET_MS, default 150 ms):
+
+    python bench_retrieval.py --rounds 20
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import rag
+
+QUERIES = [
+    "Требования 152-ФЗ к хранению персональных данных",
+    "Роскомнадзор реестр операторов персональных данных",
+    "Как привлечь первых клиентов в B2B?",
+    "Какие венчурные фонды инвестируют на ранних стадиях?",
+    "Тренды онлайн-образования в России",
+    "Маркетплейс для малого бизнеса",
+    "AML/KYC для платежного сервиса",
+    "Каналы продвижения SaaS для корпораций",
+]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1)]
+
+
+def _measure(instance: rag.StartupRAG, rounds: int, top_k: int) -> list[float]:
+    latencies = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            # Measure cold encodes, not query-embedding cache hits
+            instance.embedding_fn._query_cache.clear()
+            start = time.perf_counter()
+            instance.query(query, top_k=top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG retrieval latency benchmark")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=rag.RETRIEVAL_BUDGET_MS)
+    args = parser.parse_args()
+
+    instance = rag.StartupRAG.build()
+    # Warm up the model and caches so the first query does not skew p95
+    _measure(instance, 1, args.top_k)
+
+    results = {}
+    for hybrid in (False, True):
+        rag.HYBRID_RETRIEVAL = hybrid
+        latencies = _measure(instance, args.rounds, args.top_k)
+        results["hybrid" if hybrid else "vector+rerank"] = latencies
+
+    print(f"{'mode':<15} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for mode, latencies in results.items():
+        print(
+            f"{mode:<15} {statistics.median(latencies):>8.2f} "
+            f"{_percentile(latencies, 95):>8.2f} {max(latencies):>8.2f}"
+        )
+
+    p95 = _percentile(results["hybrid"], 95)
+    print(f"hybrid p95 {p95:.2f} ms, budget {args.budget_ms:.0f} ms")
+    if p95 > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Compare vector search backends on synthetic normalized embeddings.
+
+Every backend gets the same corpus and queries. Exact float32 search is the
+ground truth for recall@k. Chroma is built once per HNSW setting given as
+M:ef_construction:ef_search; the NumPy store runs as float32, float16 and
+product-quantized codes:
+
+    python bench_vector_store.py --sizes 10000 100000 --hnsw 16:100:10 16:100:64 32:200:128
+    python bench_vector_store.py --sizes 100000 --json results.json --plot recall_latency.png
+
+Memory is the on-disk size of the index (Chroma: its persist directory).
+Set CHROMA_HTTP_HOST to benchmark a remote Chroma; its size is then estimated.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from vector_store import ChromaVectorStore, NumpyVectorStore, PQVectorStore
+
+DIM = 384
+INSERT_BATCH = 4096
+CLUSTERS = 1000
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _corpus(rng: np.random.Generator, n: int) -> np.ndarray:
+    # Clustered like real embeddings of related documents, not uniform noise
+    centers = rng.standard_normal((CLUSTERS, DIM), dtype=np.float32)
+    noise = rng.standard_normal((n, DIM), dtype=np.float32)
+    return _normalize(centers[rng.integers(0, CLUSTERS, n)] + 0.6 * noise)
+
+
+def _latencies(store, queries: np.ndarray, k: int) -> tuple[list[float], list[list[str]]]:
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _, _ = store.search([query.tolist()], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids[0])
+    latencies.sort()
+    return latencies, results
+
+
+def _row(backend: str, n: int, build_s: float, memory_bytes: int, latencies: list[float], recall: float) -> dict:
+    return {
+        "backend": backend,
+        "n": n,
+        "build_s": round(build_s, 1),
+        "memory_mb": round(memory_bytes / 2**20, 1),
+        "recall": round(recall, 3),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+    }
+
+
+def _recall(found: list[list[str]], exact: list[list[str]], k: int) -> float:
+    return float(np.mean([len(set(a) & set(e)) / k for a, e in zip(found, exact)]))
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _chroma_client(path: Path):
+    import chromadb
+
+    if os.getenv("CHROMA_HTTP_HOST"):
+        return chromadb.HttpClient(
+            host=os.environ["CHROMA_HTTP_HOST"], port=int(os.getenv("CHROMA_HTTP_PORT", "8000"))
+        )
+    return chromadb.PersistentClient(path=str(path))
+
+
+def _bench_numpy(store, label: str, corpus, ids, docs, queries, k, exact) -> tuple[dict, list[list[str]]]:
+    start = time.perf_counter()
+    step = INSERT_BATCH * 16
+    for i in range(0, len(ids), step):
+        store.append(ids[i:i + step], corpus[i:i + step], docs[i:i + step])
+    build_s = time.perf_counter() - start
+    latencies, found = _latencies(store, queries, k)
+    # PQ scans its codes; the float16 rows are only paged in for refined candidates
+    memory = getattr(store, "codes_path", store.vectors_path).stat().st_size
+    recall = _recall(found, exact, k) if exact is not None else 1.0
+    return _row(label, len(ids), build_s, memory, latencies, recall), found
+
+
+def _bench_chroma(tmp_dir: Path, hnsw: tuple[int, int, int], corpus, ids, docs, queries, k, exact) -> dict:
+    m, construction_ef, search_ef = hnsw
+    path = tmp_dir / f"chroma_{m}_{construction_ef}_{search_ef}"
+    client = _chroma_client(path)
+    collection = client.create_collection(
+        name=f"bench_{len(ids)}_{m}_{construction_ef}_{search_ef}",
+        embedding_function=None,
+        metadata={
+            "hnsw:space": "cosine",
+            "hnsw:M": m,
+            "hnsw:construction_ef": construction_ef,
+            "hnsw:search_ef": search_ef,
+        },
+    )
+    start = time.perf_counter()
+    for i in range(0, len(ids), INSERT_BATCH):
+        collection.add(
+            ids=ids[i:i + INSERT_BATCH],
+            embeddings=corpus[i:i + INSERT_BATCH].tolist(),
+            documents=docs[i:i + INSERT_BATCH],
+        )
+    build_s = time.perf_counter() - start
+    latencies, found = _latencies(ChromaVectorStore(collection), queries, k)
+    # Remote servers: float32 vectors plus ~2*M int32 graph links per row
+    memory = _dir_size(path) if path.exists() else len(ids) * (DIM * 4 + 2 * m * 4)
+    client.delete_collection(collection.name)
+    return _row(
+        f"chroma-{m}/{construction_ef}/{search_ef}", len(ids), build_s, memory, latencies, _recall(found, exact, k)
+    )
+
+
+def run_size(
+    n: int,
+    n_queries: int,
+    k: int,
+    hnsw: list[tuple[int, int, int]],
+    pq_subvectors: int,
+    with_chroma: bool,
+    seed: int = 0,
+) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    corpus = _corpus(rng, n)
+    # Queries near corpus points, like real questions near their answers
+    noise = _normalize(rng.standard_normal((n_queries, DIM)))
+    queries = _normalize(corpus[rng.integers(0, n, n_queries)] + 0.3 * noise)
+    ids = [f"chunk_{i}" for i in range(n)]
+    docs = [f"doc {i}" for i in range(n)]
+
+    rows = []
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench_vs_"))
+    try:
+        args = (corpus, ids, docs, queries, k)
+        row, exact = _bench_numpy(NumpyVectorStore(tmp_dir / "vectors"), "numpy-float32", *args, None)
+        rows.append(row)
+        store = NumpyVectorStore(tmp_dir / "vectors", dtype="float16")
+        rows.append(_bench_numpy(store, "numpy-float16", *args, exact)[0])
+        # Raw PQ ranking, then re-scored from the local float16 rows
+        store = PQVectorStore(tmp_dir / "vectors", subvectors=pq_subvectors, refine=0, min_train_size=256)
+        rows.append(_bench_numpy(store, f"numpy-pq{pq_subvectors}", *args, exact)[0])
+        store = PQVectorStore(tmp_dir / "vectors_refine", subvectors=pq_subvectors, refine=4, min_train_size=256)
+        rows.append(_bench_numpy(store, f"numpy-pq{pq_subvectors}-refine4", *args, exact)[0])
+        if with_chroma:
+            for setting in hnsw:
+                rows.append(_bench_chroma(tmp_dir, setting, *args, exact))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return rows
+
+
+def plot(rows: list[dict], out: Path) -> None:
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise SystemExit("--plot needs matplotlib (pip install matplotlib)")
+
+    sizes = sorted({r["n"] for r in rows})
+    fig, axes = plt.subplots(1, 2, figsize=(12, 5))
+    for n in sizes:
+        for r in (r for r in rows if r["n"] == n):
+            for ax, x in zip(axes, ("p95_ms", "memory_mb")):
+                ax.scatter(r[x], r["recall"])
+                ax.annotate(f"{r['backend']} n={n}", (r[x], r["recall"]), fontsize=7)
+    axes[0].set_xlabel("p95 latency, ms")
+    axes[1].set_xlabel("index size, MB")
+    for ax in axes:
+        ax.set_ylabel("recall@k")
+        ax.set_xscale("log")
+        ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(out, dpi=120)
+
+
+def _hnsw_setting(value: str) -> tuple[int, int, int]:
+    m, construction_ef, search_ef = (int(part) for part in value.split(":"))
+    return m, construction_ef, search_ef
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=15)
+    parser.add_argument(
+        "--hnsw", type=_hnsw_setting, nargs="+", default=[(16, 100, 10), (16, 100, 64), (32, 200, 128)],
+        help="Chroma settings as M:ef_construction:ef_search",
+    )
+    parser.add_argument("--pq-subvectors", type=int, default=48)
+    parser.add_argument("--chroma-max", type=int, default=100_000, help="skip Chroma above this corpus size")
+    parser.add_argument("--json", type=Path, help="write all rows to this file")
+    parser.add_argument("--plot", type=Path, help="save recall vs latency/memory plot (needs matplotlib)")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'backend':<22} {'n':>9} {'build s':>8} {'MB':>8} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for n in args.sizes:
+        for r in run_size(n, args.queries, args.top_k, args.hnsw, args.pq_subvectors, n <= args.chroma_max):
+            print(
+                f"{r['backend']:<22} {r['n']:>9} {r['build_s']:>8} {r['memory_mb']:>8} "
+                f"{r['recall']:>7} {r['p50_ms']:>8} {r['p95_ms']:>8}"
+            )
+            rows.append(r)
+    if args.json:
+        args.json.write_text(json.dumps(rows, indent=2), encoding="utf-8")
+    if args.plot:
+        plot(rows, args.plot)
+
+
+if __name__ == "__main__":
+    main()
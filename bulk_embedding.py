@@ -0,0 +1,65 @@
+"""Passage embedding on a process pool for large ingests (reindex, migration, big crawls).
+
+Every worker loads its own model copy with a capped thread count, so
+`workers * threads` roughly matches the cores without oversubscription.
+Heavy imports happen inside the worker after the thread limits are set.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List
+
+_MODEL = None
+
+
+def _init_worker(backend: str, threads: int) -> None:
+    global _MODEL
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+
+    torch.set_num_threads(threads)
+    from rag import _load_embedding_model
+
+    _MODEL = _load_embedding_model(backend)
+
+
+def _embed_shard(texts: List[str]) -> List[List[float]]:
+    prefixed = [f"passage: {text}" for text in texts]
+    return _MODEL.encode(prefixed, normalize_embeddings=True, batch_size=64).tolist()
+
+
+class BulkEmbedder:
+    """Process pool of embedding workers; reuse one instance across batches.
+
+    Workers load the model lazily on their first shard and keep it until the
+    pool is closed, so a paginated job pays the model load once per worker.
+    """
+
+    def __init__(self, workers: int, threads: int, backend: str, shard_size: int = 256):
+        self.workers = workers
+        self.threads = threads
+        self.shard_size = shard_size
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(backend, threads),
+        )
+
+    def __enter__(self) -> "BulkEmbedder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def embed(self, texts: List[str]) -> Iterator[List[List[float]]]:
+        """Yield E5 passage embeddings of `texts` shard by shard, in input order."""
+        shards = [texts[i:i + self.shard_size] for i in range(0, len(texts), self.shard_size)]
+        yield from self._pool.map(_embed_shard, shards)
@@ -0,0 +1,115 @@
+"""Fit retrieved chunks into a token budget before they go into a prompt.
+
+Retrieved chunks are whole 1000-character windows that share up to 200
+characters with their neighbours. The assembler merges overlapping
+neighbours, drops duplicates, keeps the sentences that share the most
+terms with the query and stops at the endpoint's token budget.
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+from typing import List
+
+from lexical_index import tokenize
+from metrics import RAG_CONTEXT_TOKENS
+
+# Token budgets for retrieved context per endpoint (0 = no limit)
+CONTEXT_BUDGET_ANALYZE = int(os.getenv("RAG_CONTEXT_BUDGET_ANALYZE", "600"))
+CONTEXT_BUDGET_CHAT = int(os.getenv("RAG_CONTEXT_BUDGET_CHAT", "500"))
+CONTEXT_BUDGET_INTERVIEW = int(os.getenv("RAG_CONTEXT_BUDGET_INTERVIEW", "800"))
+# Average characters per YandexGPT token, used instead of a remote tokenize call
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("RAG_CONTEXT_CHARS_PER_TOKEN", "3.5"))
+# Shortest suffix/prefix match treated as the splitter's chunk overlap
+MIN_OVERLAP_CHARS = 40
+MAX_OVERLAP_CHARS = 300
+# Query and sentence words match on their first letters, a cheap stand-in for stemming
+STEM_CHARS = 5
+
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+GAP = " … "
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN)
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that starts `right`."""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_overlapping(chunks: List[str]) -> List[str]:
+    """Drop repeated chunks and join neighbours that continue each other.
+
+    The merged text sits at the rank of its best-ranked part.
+    """
+    merged: List[str] = []
+    for chunk in (c.strip() for c in chunks):
+        if not chunk or any(chunk in kept for kept in merged):
+            continue
+        for i, kept in enumerate(merged):
+            if size := _overlap(kept, chunk):
+                merged[i] = kept + chunk[size:]
+                break
+            if size := _overlap(chunk, kept):
+                merged[i] = chunk + kept[size:]
+                break
+        else:
+            contained = [i for i, kept in enumerate(merged) if kept in chunk]
+            if not contained:
+                merged.append(chunk)
+                continue
+            merged[contained[0]] = chunk
+            merged = [kept for i, kept in enumerate(merged) if i not in contained[1:]]
+    return merged
+
+
+def _stems(text: str) -> set[str]:
+    return {token[:STEM_CHARS] for token in tokenize(text)}
+
+
+def assemble_context(query: str, chunks: List[str], budget_tokens: int, endpoint: str = "") -> List[str]:
+    """Return the parts of `chunks` worth sending for `query`, within `budget_tokens`.
+
+    Sentences are picked by the number of query terms they contain, ties
+    going to better-ranked chunks, and printed in their original order with
+    an ellipsis where text was cut. Repeated sentences are sent once. When
+    everything fits, or there is no budget, the merged chunks go whole.
+    """
+    merged = merge_overlapping(chunks)
+    if budget_tokens <= 0 or sum(estimate_tokens(chunk) for chunk in merged) <= budget_tokens:
+        selected = merged
+    else:
+        query_stems = _stems(query)
+        sentences, seen = [], set()
+        for rank, chunk in enumerate(merged):
+            for position, sentence in enumerate(s.strip() for s in SENTENCE_RE.split(chunk)):
+                if sentence and sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append((-len(query_stems & _stems(sentence)), rank, position, sentence))
+        # Sentences sharing no term with the query only fill in when none do
+        if any(score for score, *_ in sentences):
+            sentences = [item for item in sentences if item[0]]
+        picked: dict[int, dict[int, str]] = {}
+        used = 0
+        for _, rank, position, sentence in sorted(sentences):
+            cost = estimate_tokens(sentence) + 1
+            if used + cost > budget_tokens:
+                continue
+            picked.setdefault(rank, {})[position] = sentence
+            used += cost
+        selected = []
+        for rank in sorted(picked):
+            positions = sorted(picked[rank])
+            text = picked[rank][positions[0]]
+            for previous, position in zip(positions, positions[1:]):
+                text += (" " if position == previous + 1 else GAP) + picked[rank][position]
+            selected.append(text)
+    if endpoint:
+        RAG_CONTEXT_TOKENS.labels(endpoint=endpoint).observe(sum(estimate_tokens(chunk) for chunk in selected))
+    return selected
@@ -111,7 +111,7 @@ def append_to_rag(url: str, delay: float = 1.0):
         # Use existing scraper logic
         filepath, text = scrape_and_save(url)
         if text and filepath:
-            chunks_added = rag.add_text_to_rag(text)
+            chunks_added = rag.add_file_to_rag(filepath)
             logger.info(f"SUCCESS: Added {chunks_added} chunks from {url}")
         else:
             status = "FAILED"
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+from metrics import EMBEDDING_BATCH_SIZE
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item encodes into one batched call.
+
+    Callers block on `submit`. A worker thread takes the first pending item,
+    waits up to `max_wait_ms` for up to `max_batch` items in total, runs
+    `encode_batch` once and resolves every caller's future.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], List[List[float]]],
+        max_batch: int = 32,
+        max_wait_ms: float = 5.0,
+    ):
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue[tuple[str, Future]] = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str, timeout: float | None = None) -> List[float]:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self) -> list[tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            EMBEDDING_BATCH_SIZE.observe(len(batch))
+            try:
+                vectors = self.encode_batch([text for text, _ in batch])
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
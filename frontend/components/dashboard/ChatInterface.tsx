@@ -4,7 +4,7 @@ import { motion } from "framer-motion";
 import { Send, User, Bot, Loader2, Sparkles, Lightbulb, Users, Calculator, HelpCircle } from "lucide-react";
 import ReactMarkdown from "react-markdown";
 // Button unused
-import { ChatMessageResponse, ChatSessionDetailResponse, sendChatMessage, getChatSession } from "@/lib/api";
+import { ChatMessageResponse, ChatSessionDetailResponse, streamChatMessage, getChatSession } from "@/lib/api";
 import { getToken } from "@/lib/auth";
 import { AnalysisCard } from "@/components/dashboard/AnalysisCard";
 import dayjs from "dayjs";
@@ -56,7 +56,16 @@ export function ChatInterface({ session, onUpdate }: ChatInterfaceProps) {
             const token = getToken();
             if (!token) throw new Error("No token");
 
-            await sendChatMessage(session.id, content, token);
+            const tempAssistantMsg: ChatMessageResponse = {
+                id: -2,
+                role: "assistant",
+                content: "",
+                created_at: new Date().toISOString(),
+            };
+            setMessages((prev) => [...prev, tempAssistantMsg]);
+            await streamChatMessage(session.id, content, token, (delta) => {
+                setMessages((prev) => prev.map(m => m.id === -2 ? { ...m, content: m.content + delta } : m));
+            });
 
             // Fetch updated session to check for analysis
             const updatedSession = await getChatSession(session.id, token);
@@ -66,7 +75,7 @@ export function ChatInterface({ session, onUpdate }: ChatInterfaceProps) {
         } catch (error) {
             console.error(error);
             alert("Ошибка отправки сообщения");
-            setMessages((prev) => prev.filter(m => m.id !== -1));
+            setMessages((prev) => prev.filter(m => m.id !== -1 && m.id !== -2));
         } finally {
             setIsLoading(false);
             setTimeout(() => textareaRef.current?.focus(), 100);
@@ -95,7 +104,7 @@ export function ChatInterface({ session, onUpdate }: ChatInterfaceProps) {
 
                 {messages.map((msg, idx) => (
                     <motion.div
-                        key={msg.id === -1 ? `temp-${idx}` : msg.id}
+                        key={msg.id < 0 ? `temp-${idx}` : msg.id}
                         initial={{ opacity: 0, y: 10 }}
                         animate={{ opacity: 1, y: 0 }}
                         className={`flex gap-4 ${msg.role === "user" ? "flex-row-reverse" : "flex-row"}`}
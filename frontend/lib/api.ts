@@ -227,6 +227,58 @@ export async function sendChatMessage(sessionId: number, content: string, token:
   return postAuthJson<ChatMessageResponse>(`/chat/sessions/${sessionId}/messages`, { content }, token);
 }
 
+// Streams the assistant reply over SSE; `onToken` receives text deltas as they arrive.
+export async function streamChatMessage(
+  sessionId: number,
+  content: string,
+  token: string,
+  onToken: (text: string) => void
+): Promise<ChatMessageResponse> {
+  const headers: Record<string, string> = { "Content-Type": "application/json" };
+  if (token && token !== COOKIE_SESSION_MARKER) {
+    headers.Authorization = `Bearer ${token}`;
+  }
+  const res = await fetch(`${API_BASE}/chat/sessions/${sessionId}/messages/stream`, {
+    method: "POST",
+    headers,
+    body: JSON.stringify({ content }),
+    credentials: "include",
+  });
+  if (!res.ok || !res.body) {
+    const err = await res.json().catch(() => ({}));
+    const detail = typeof err?.detail === "string" ? err.detail : "Request failed";
+    throw new Error(detail);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === "token") onToken(payload.text);
+      else if (event === "done") return payload as ChatMessageResponse;
+      else if (event === "error") throw new Error(payload.detail || "Request failed");
+    }
+  }
+  throw new Error("Stream ended unexpectedly");
+}
+
 export async function createPayment(tier: string, is_annual: boolean, promo_code: string | null, token: string): Promise<{ confirmation_url: string }> {
   return postAuthJson<{ confirmation_url: string }>("/billing/create-payment", { tier, is_annual, promo_code }, token);
 }
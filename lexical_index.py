@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w{3,}")
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """BM25 statistics and inverted index for every chunk in the collection.
+
+    Term frequencies, document lengths and document frequencies are computed
+    once at ingest time, so scoring a query only does dictionary lookups and
+    NumPy arithmetic over the candidate set. `search` retrieves over the whole
+    index through the postings.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self.term_freqs: Dict[str, Dict[str, int]] = {}
+        # Inverted index: term -> {doc_id: tf}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lens: Dict[str, int] = {}
+        self.char_lens: Dict[str, int] = {}
+        self.doc_freqs: Counter[str] = Counter()
+        self._total_len = 0
+        self._save_timer: threading.Timer | None = None
+
+    def __len__(self) -> int:
+        return len(self.doc_lens)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lens
+
+    @property
+    def avg_doc_len(self) -> float:
+        return self._total_len / len(self.doc_lens) if self.doc_lens else 0.0
+
+    def add(self, items: Iterable[Tuple[str, str]]) -> None:
+        """Index `(doc_id, text)` pairs, replacing existing entries."""
+        with self._lock:
+            for doc_id, text in items:
+                if doc_id in self.doc_lens:
+                    self._remove_one(doc_id)
+                tokens = tokenize(text)
+                tf = Counter(tokens)
+                self.term_freqs[doc_id] = dict(tf)
+                for term, count in tf.items():
+                    self.postings.setdefault(term, {})[doc_id] = count
+                self.doc_lens[doc_id] = len(tokens)
+                self.char_lens[doc_id] = len(text.strip())
+                self.doc_freqs.update(tf.keys())
+                self._total_len += len(tokens)
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self.doc_lens:
+                    self._remove_one(doc_id)
+
+    def _remove_one(self, doc_id: str) -> None:
+        tf = self.term_freqs.pop(doc_id)
+        self._total_len -= self.doc_lens.pop(doc_id)
+        self.char_lens.pop(doc_id, None)
+        for term in tf:
+            self.doc_freqs[term] -= 1
+            if self.doc_freqs[term] <= 0:
+                del self.doc_freqs[term]
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def idf(self, terms: List[str]) -> np.ndarray:
+        n = len(self.doc_lens)
+        df = np.array([self.doc_freqs.get(t, 0) for t in terms], dtype=np.float32)
+        return np.log1p((n - df + 0.5) / (df + 0.5))
+
+    def score(self, query: str, doc_ids: List[str]) -> np.ndarray:
+        """BM25 score of `query` for each of `doc_ids` (0 for unknown ids)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not doc_ids:
+            return np.zeros(len(doc_ids), dtype=np.float32)
+        with self._lock:
+            tf = np.array(
+                [[self.term_freqs.get(d, {}).get(t, 0) for t in terms] for d in doc_ids],
+                dtype=np.float32,
+            )
+            lens = np.array([self.doc_lens.get(d, 0) for d in doc_ids], dtype=np.float32)
+            idf = self.idf(terms)
+            avg_len = self.avg_doc_len or 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lens / avg_len)
+        return ((tf * (BM25_K1 + 1)) / (tf + norm[:, None])) @ idf
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top-`k` `(doc_id, score)` pairs over the whole index via the postings."""
+        if k <= 0:
+            return []
+        with self._lock:
+            # Filtered under the lock: a concurrent remove may drop a term's postings
+            terms = [t for t in dict.fromkeys(tokenize(query)) if t in self.postings]
+            if not terms:
+                return []
+            idf = self.idf(terms)
+            avg_len = self.avg_doc_len or 1.0
+            scores: Dict[str, float] = {}
+            for term, term_idf in zip(terms, idf):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                doc_ids = list(posting)
+                tf = np.fromiter(posting.values(), dtype=np.float32, count=len(doc_ids))
+                lens = np.fromiter(
+                    (self.doc_lens[d] for d in doc_ids), dtype=np.float32, count=len(doc_ids)
+                )
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lens / avg_len)
+                contrib = term_idf * tf * (BM25_K1 + 1) / (tf + norm)
+                for doc_id, value in zip(doc_ids, contrib.tolist()):
+                    scores[doc_id] = scores.get(doc_id, 0.0) + value
+        if not scores:
+            return []
+        ids = list(scores)
+        values = np.fromiter(scores.values(), dtype=np.float32, count=len(ids))
+        top = min(k, len(ids))
+        best = np.argpartition(-values, top - 1)[:top]
+        best = best[np.argsort(-values[best], kind="stable")]
+        return [(ids[i], float(values[i])) for i in best]
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(self.doc_lens)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            payload = {
+                "term_freqs": self.term_freqs,
+                "char_lens": self.char_lens,
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Unique per writer: other workers may be saving the same file
+            tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    def save_soon(self, delay: float) -> None:
+        """Save once, `delay` seconds after the first unsaved change.
+
+        Coalesces the saves of a crawl or upload burst into one write instead
+        of rewriting the whole file per document. Changes lost to a crash
+        before the write are re-indexed from the collection on the next start.
+        """
+        if self.path is None:
+            return
+        if delay <= 0:
+            self.save()
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(delay, self._deferred_save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _deferred_save(self) -> None:
+        with self._lock:
+            self._save_timer = None
+        self.save()
+
+    def load(self) -> bool:
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self.term_freqs = {k: dict(v) for k, v in payload["term_freqs"].items()}
+            self.char_lens = dict(payload.get("char_lens", {}))
+            self.doc_lens = {k: sum(v.values()) for k, v in self.term_freqs.items()}
+            self.postings = {}
+            for doc_id, tf in self.term_freqs.items():
+                for term, count in tf.items():
+                    self.postings.setdefault(term, {})[doc_id] = count
+            self.doc_freqs = Counter(t for tf in self.term_freqs.values() for t in tf)
+            self._total_len = sum(self.doc_lens.values())
+        return True
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(d) = sum over lists of 1 / (k + rank)."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+    top = float(scores.max()) if scores.size else 0.0
+    if top <= 0 or math.isnan(top):
+        return np.zeros_like(scores)
+    return scores / top
@@ -0,0 +1,227 @@
+"""Cluster-wide token buckets for outbound LLM calls.
+
+Two buckets are checked together: requests per second and tokens per
+minute. With Redis they live in one hash per bucket and a Lua script
+refills, checks and takes from both atomically, so every worker and process
+shares the folder quota. Without Redis each process keeps its own buckets
+with a 1/workers share of the limits.
+
+A call that does not fit waits for the bucket to refill, up to a deadline.
+Token use is estimated before the call and corrected afterwards with the
+usage the API reports.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from metrics import LLM_RATE_LIMIT_REJECTIONS, LLM_RATE_LIMIT_WAIT
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS: request bucket, token bucket
+# ARGV: rps, request burst, tokens per minute (0 = unlimited), tokens wanted
+# Returns {1, 0} when both buckets had room (and were charged), else {0, ms to wait}
+_ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local function level(key, rate_per_ms, capacity)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + math.max(0, now - ts) * rate_per_ms)
+end
+
+local rps, burst, tpm, wanted = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local req_rate = rps / 1000
+local requests = level(KEYS[1], req_rate, burst)
+local wait = 0
+if requests < 1 then
+    wait = math.ceil((1 - requests) / req_rate)
+end
+
+local tok_rate, tokens = 0, 0
+if tpm > 0 then
+    tok_rate = tpm / 60000
+    tokens = level(KEYS[2], tok_rate, tpm)
+    -- A single call above the whole minute budget waits for a full bucket
+    local need = math.min(wanted, tpm)
+    if tokens < need then
+        wait = math.max(wait, math.ceil((need - tokens) / tok_rate))
+    end
+end
+if wait > 0 then
+    return {0, wait}
+end
+
+redis.call('HSET', KEYS[1], 'tokens', requests - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / req_rate) + 1000)
+if tpm > 0 then
+    redis.call('HSET', KEYS[2], 'tokens', tokens - wanted, 'ts', now)
+    redis.call('PEXPIRE', KEYS[2], 120000)
+end
+return {1, 0}
+"""
+
+# KEYS: token bucket; ARGV: tokens per minute, tokens to give back (negative = charge more)
+_ADJUST_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local tpm, delta = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or tpm
+local ts = tonumber(state[2]) or now
+tokens = math.min(tpm, tokens + math.max(0, now - ts) * tpm / 60000 + delta)
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return 1
+"""
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM rate limit: next slot in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class _LocalBuckets:
+    """In-process twin of the Lua script, used while Redis is unavailable."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state: dict[str, tuple[float, float]] = {}
+
+    def _level(self, key: str, rate: float, capacity: float, now: float) -> float:
+        tokens, ts = self._state.get(key, (capacity, now))
+        return min(capacity, tokens + max(0.0, now - ts) * rate)
+
+    def try_acquire(self, rps: float, burst: float, tpm: float, wanted: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            requests = self._level("requests", rps, burst, now)
+            wait = (1 - requests) / rps if requests < 1 else 0.0
+            tokens = 0.0
+            if tpm > 0:
+                tokens = self._level("tokens", tpm / 60, tpm, now)
+                need = min(wanted, tpm)
+                if tokens < need:
+                    wait = max(wait, (need - tokens) / (tpm / 60))
+            if wait > 0:
+                return wait
+            self._state["requests"] = (requests - 1, now)
+            if tpm > 0:
+                self._state["tokens"] = (tokens - wanted, now)
+            return 0.0
+
+    def adjust(self, tpm: float, delta: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            tokens = self._level("tokens", tpm / 60, tpm, now)
+            self._state["tokens"] = (min(tpm, tokens + delta), now)
+
+
+class TokenBucketLimiter:
+    """Requests-per-second and tokens-per-minute limits shared through Redis.
+
+    `acquire`/`aacquire` block until both buckets have room or `max_wait`
+    seconds would be exceeded, then raise RateLimitExceeded with the time to
+    the next slot. `settle` corrects the token bucket once real usage is known.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rps: float,
+        tpm: int = 0,
+        burst: Optional[float] = None,
+        max_wait: float = 5.0,
+        local_share: int = 1,
+    ):
+        self.name = name
+        self.rps = rps
+        self.tpm = tpm
+        self.burst = burst or max(1.0, rps)
+        self.max_wait = max_wait
+        self.local_share = max(1, local_share)
+        self._local = _LocalBuckets()
+        self._acquire_script = None
+        self._adjust_script = None
+        self._scripts_client = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rps > 0
+
+    def _keys(self) -> list[str]:
+        # Hash tag keeps both buckets in one slot on Redis Cluster
+        return [f"llm_rate:{{{self.name}}}:requests", f"llm_rate:{{{self.name}}}:tokens"]
+
+    def _scripts(self, client: redis.Redis):
+        if self._scripts_client is not client:
+            self._acquire_script = client.register_script(_ACQUIRE_SCRIPT)
+            self._adjust_script = client.register_script(_ADJUST_SCRIPT)
+            self._scripts_client = client
+        return self._acquire_script, self._adjust_script
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take one request and `tokens` if both fit; returns 0 or the seconds to wait."""
+        client = get_redis()
+        if client is not None:
+            try:
+                acquire, _ = self._scripts(client)
+                granted, wait_ms = acquire(keys=self._keys(), args=[self.rps, self.burst, self.tpm, tokens])
+                return 0.0 if int(granted) else int(wait_ms) / 1000
+            except redis.RedisError as exc:
+                logger.warning(f"LLM rate limiter falling back to local buckets: {exc}")
+        share = self.local_share
+        return self._local.try_acquire(
+            self.rps / share, max(1.0, self.burst / share), self.tpm / share, tokens
+        )
+
+    def _deadline_wait(self, wait: float, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if wait > remaining:
+            LLM_RATE_LIMIT_REJECTIONS.labels(limiter=self.name).inc()
+            raise RateLimitExceeded(wait)
+        return wait
+
+    def acquire(self, tokens: int = 0) -> None:
+        if not self.enabled:
+            return
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        while wait := self.try_acquire(tokens):
+            time.sleep(self._deadline_wait(wait, deadline))
+        LLM_RATE_LIMIT_WAIT.labels(limiter=self.name).observe(time.monotonic() - start)
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        if not self.enabled:
+            return
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        while wait := await asyncio.to_thread(self.try_acquire, tokens):
+            await asyncio.sleep(self._deadline_wait(wait, deadline))
+        LLM_RATE_LIMIT_WAIT.labels(limiter=self.name).observe(time.monotonic() - start)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Return over-estimated tokens to the bucket, or charge the shortfall."""
+        if not self.enabled or self.tpm <= 0 or actual <= 0 or actual == estimated:
+            return
+        delta = estimated - actual
+        client = get_redis()
+        if client is not None:
+            try:
+                _, adjust = self._scripts(client)
+                adjust(keys=self._keys()[1:], args=[self.tpm, delta])
+                return
+            except redis.RedisError as exc:
+                logger.warning(f"LLM rate limiter falling back to local buckets: {exc}")
+        self._local.adjust(self.tpm / self.local_share, math.ceil(delta / self.local_share))
@@ -1,11 +1,14 @@
 from contextlib import asynccontextmanager
+import json
 import os
 import logging
 import time
 import random
 from datetime import datetime, timedelta, date
+from pathlib import Path
 
 from fastapi import Depends, FastAPI, HTTPException, Request, Response, UploadFile, File, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.responses import StreamingResponse
@@ -16,13 +19,27 @@ from sqlalchemy import text
 from dotenv import load_dotenv
 
 import rag
-from scraper import scrape_and_save, extract_text_from_pdf
+from context_assembly import (
+    CONTEXT_BUDGET_ANALYZE,
+    CONTEXT_BUDGET_CHAT,
+    CONTEXT_BUDGET_INTERVIEW,
+    assemble_context,
+)
+from scraper import scrape_and_save, iter_pdf_pages, pdf_page_count
 from lockbox import lockbox
 from metrics import ERROR_COUNT, REQUEST_COUNT, REQUEST_LATENCY
 from observability import configure_logging
 import uuid
 from redis_client import get_redis
-from yandex_gpt_client import YandexGPTError, call_yandex_gpt, extract_json, generate_chat_title
+from response_cache import ResponseCache
+from yandex_gpt_client import (
+    YandexGPTError,
+    acall_yandex_gpt,
+    aclose_client,
+    astream_yandex_gpt,
+    extract_json,
+    generate_chat_title,
+)
 from db import SessionLocal, get_db
 from models import User, PromoCode, Analysis, Payment, RagLog
 from models import Analysis, ChatMessage as DbChatMessage, ChatSession, ErrorLog, User, PromoCode, Payment
@@ -88,6 +105,11 @@ SYSTEM_CHAT_PROMPT = (
     "(РВК, бизнес-ангелы). Используй только достоверные данные из контекста."
 )
 
+# Set on analysis responses produced without retrieved context while RAG loads
+RAG_DEGRADED_HEADER = "X-RAG-Degraded"
+
+ANALYSIS_CACHE = ResponseCache("analysis", salt=SYSTEM_PROMPT, embed_fn=rag.encode_query)
+
 
 class AnalyzeRequest(BaseModel):
     description: str = Field(..., min_length=10)
@@ -143,6 +165,8 @@ async def lifespan(_: FastAPI):
     t = threading.Thread(target=_init_rag_bg, daemon=True)
     t.start()
     yield
+    await aclose_client()
+    await run_in_threadpool(rag.flush_indexes)
 
 
 class AdminRAGRequest(BaseModel):
@@ -158,6 +182,22 @@ class AdminRAGResponse(BaseModel):
     message: str
     chunks_added: int = 0
     file_path: str | None = None
+    job_id: str | None = None
+
+class HnswParamsRequest(BaseModel):
+    m: int | None = Field(None, ge=2, le=128)
+    construction_ef: int | None = Field(None, ge=1, le=2000)
+    search_ef: int | None = Field(None, ge=1, le=2000)
+
+class RagJobResponse(BaseModel):
+    job_id: str
+    status: str
+    source: str
+    # Pages for PDF ingestion, files for a reindex
+    done: int = 0
+    total: int = 0
+    chunks_added: int = 0
+    error: str | None = None
 
 class RagLogResponse(BaseModel):
     id: int
@@ -189,6 +229,88 @@ def background_crawl(url: str, is_sitemap: bool, max_pages: int, delay: float):
     except Exception as e:
         log.error(f"Background crawl failed: {e}")
 
+RAG_JOBS = {}
+RAG_JOB_TTL_SECONDS = int(os.getenv("RAG_JOB_TTL_SECONDS", "86400"))
+
+
+def _set_rag_job(job_id: str, **fields) -> None:
+    job = RAG_JOBS.setdefault(job_id, {"job_id": job_id})
+    job.update(fields)
+    redis_client = get_redis()
+    if redis_client:
+        key = f"rag_job:{job_id}"
+        try:
+            redis_client.hset(key, mapping={k: "" if v is None else v for k, v in fields.items()})
+            redis_client.expire(key, RAG_JOB_TTL_SECONDS)
+        except Exception:
+            pass
+
+
+def _get_rag_job(job_id: str) -> dict | None:
+    redis_client = get_redis()
+    if redis_client:
+        try:
+            job = redis_client.hgetall(f"rag_job:{job_id}")
+            if job:
+                return {**job, "job_id": job_id, "error": job.get("error") or None}
+        except Exception:
+            pass
+    return RAG_JOBS.get(job_id)
+
+
+def background_ingest_pdf(job_id: str, pdf_path: str, txt_path: str, filename: str):
+    log = logging.getLogger("app")
+    _set_rag_job(job_id, status="RUNNING")
+    try:
+        pages_total = pdf_page_count(pdf_path)
+        _set_rag_job(job_id, total=pages_total)
+
+        def progress(pages_done: int, chunks_added: int) -> None:
+            if pages_done % 10 == 0 or pages_done == pages_total:
+                _set_rag_job(job_id, done=pages_done, chunks_added=chunks_added)
+
+        chunks_added = rag.add_stream_to_rag(
+            iter_pdf_pages(pdf_path),
+            txt_path,
+            header=f"Source: Uploaded PDF {filename}\n\n",
+            progress=progress,
+        )
+        if chunks_added == 0:
+            raise ValueError("Could not extract text from the PDF. It might be scanned or empty.")
+        _set_rag_job(job_id, status="SUCCESS", done=pages_total, chunks_added=chunks_added)
+        log_entry = RagLog(source_url=filename, source_type="PDF", status="SUCCESS", chunks_added=chunks_added)
+        log.info(f"PDF {filename} indexed: {chunks_added} chunks from {pages_total} pages")
+    except Exception as e:
+        log.error(f"Failed to process PDF {filename}: {e}")
+        # Nothing was indexed: drop the upload so the next boot does not retry it
+        for leftover in (pdf_path, txt_path):
+            Path(leftover).unlink(missing_ok=True)
+        _set_rag_job(job_id, status="FAILED", error=str(e))
+        log_entry = RagLog(source_url=filename, source_type="PDF", status="FAILED", chunks_added=0, error_message=str(e))
+
+    db = SessionLocal()
+    try:
+        db.add(log_entry)
+        db.commit()
+    except Exception as e:
+        log.error(f"Failed to write RAG log for {filename}: {e}")
+    finally:
+        db.close()
+
+def background_reindex(job_id: str, reembed: bool):
+    log = logging.getLogger("app")
+    _set_rag_job(job_id, status="RUNNING")
+    try:
+        name = rag.reindex_rag(
+            reembed=reembed,
+            progress=lambda done, total: _set_rag_job(job_id, done=done, total=total),
+        )
+        _set_rag_job(job_id, status="SUCCESS")
+        log.info(f"RAG reindex finished, serving {name}")
+    except Exception as e:
+        log.error(f"RAG reindex failed: {e}")
+        _set_rag_job(job_id, status="FAILED", error=str(e))
+
 app = FastAPI(title="Startup Analyzer", lifespan=lifespan)
 app.include_router(billing.router)
 
@@ -203,6 +325,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[RAG_DEGRADED_HEADER],
 )
 
 
@@ -342,7 +465,22 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
     return JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
 
 
+async def _retrieve_analysis_context(text: str) -> tuple[list[str], bool]:
+    """Context chunks for an analysis, and whether they are missing because RAG is still loading.
+
+    A degraded answer is reported to the caller and never cached, so it does
+    not outlive the RAG warm-up.
+    """
+    was_ready = rag.is_ready()
+    try:
+        chunks = await run_in_threadpool(rag.get_relevant_chunks, text, top_k=3)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    return chunks, not was_ready and not chunks
+
+
 def _build_user_prompt(description: str, context_chunks: list[str]) -> str:
+    context_chunks = assemble_context(description, context_chunks, CONTEXT_BUDGET_ANALYZE, endpoint="analyze")
     context_block = "\n".join(
         [f"{idx + 1}. {chunk}" for idx, chunk in enumerate(context_chunks)]
     )
@@ -399,6 +537,8 @@ def _format_chat_history(messages: list[ChatMessage], limit: int = 10) -> str:
 
 
 def _build_chat_prompt(messages: list[ChatMessage], context_chunks: list[str]) -> str:
+    last_user = next((m.content for m in reversed(messages) if m.role == "user"), "")
+    context_chunks = assemble_context(last_user, context_chunks, CONTEXT_BUDGET_CHAT, endpoint="chat")
     context_block = "\n".join(
         [f"{idx + 1}. {chunk}" for idx, chunk in enumerate(context_chunks)]
     )
@@ -412,6 +552,68 @@ def _build_chat_prompt(messages: list[ChatMessage], context_chunks: list[str]) -
     )
 
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# Async endpoints run the helpers below with run_in_threadpool, so DB round
+# trips never block the event loop that carries in-flight LLM calls.
+def _add_user_chat_message(db: Session, user: User, session_id: int, content: str) -> list[ChatMessage]:
+    """Store a user message in one of `user`'s chat sessions and return the session history."""
+    session = (
+        db.query(ChatSession)
+        .filter(ChatSession.id == session_id, ChatSession.user_id == user.id)
+        .first()
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+    db.add(DbChatMessage(session_id=session.id, role="user", content=content))
+    db.commit()
+
+    history = (
+        db.query(DbChatMessage)
+        .filter(DbChatMessage.session_id == session_id)
+        .order_by(DbChatMessage.created_at.asc())
+        .all()
+    )
+    return [ChatMessage(role=m.role, content=m.content) for m in history]
+
+
+def _add_interviewer_user_message(db: Session, user: User, session_id: int, content: str) -> list[DbChatMessage]:
+    """Check limits, store a user message in an interviewer session and return its sorted history."""
+    session = (
+        db.query(ChatSession)
+        .filter(ChatSession.id == session_id, ChatSession.user_id == user.id)
+        .first()
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    _check_subscription_limits(user, db, "message", session.id)
+
+    db.add(DbChatMessage(session_id=session.id, role="user", content=content))
+    db.commit()
+    db.refresh(session)
+    return sorted(session.messages, key=lambda m: m.created_at)
+
+
+def _save_assistant_message(db: Session, session_id: int, content: str) -> ChatMessageResponse:
+    message = DbChatMessage(session_id=session_id, role="assistant", content=content)
+    db.add(message)
+    db.commit()
+    db.refresh(message)
+    return ChatMessageResponse(
+        id=message.id,
+        role=message.role,
+        content=message.content,
+        created_at=message.created_at,
+    )
+
+
 @app.get("/")
 def index() -> dict:
     return {"status": "ok"}
@@ -428,10 +630,20 @@ def health() -> dict:
         "db": db_ok,
         "redis": redis_ok,
         "rag": rag_ok,
+        "rag_state": rag.status(),
         "chromadb": rag_ok,
     }
 
 
+@app.get("/ready")
+def ready(response: Response) -> dict:
+    """Readiness probe: 200 once the embedding model and collection are loaded."""
+    state = rag.status()
+    if state != "ready":
+        response.status_code = 503
+    return {"status": state, "startup_seconds": rag.startup_timings()}
+
+
 @app.get("/metrics")
 def metrics():
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -924,16 +1136,19 @@ def verify_email(
 
 
 @app.post("/analyze-startup", response_model=AnalyzeResponse)
-def analyze_startup(payload: AnalyzeRequest) -> AnalyzeResponse:
-    try:
-        context_chunks = rag.get_relevant_chunks(payload.description, top_k=3)
-    except RuntimeError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+async def analyze_startup(payload: AnalyzeRequest, response: Response) -> AnalyzeResponse:
+    cached, query_embedding = await run_in_threadpool(
+        ANALYSIS_CACHE.lookup, "/analyze-startup", payload.description
+    )
+    if cached is not None:
+        return AnalyzeResponse(**cached)
+
+    context_chunks, degraded = await _retrieve_analysis_context(payload.description)
 
     user_prompt = _build_user_prompt(payload.description, context_chunks)
 
     try:
-        raw_text, usage = call_yandex_gpt(SYSTEM_PROMPT, user_prompt)
+        raw_text, usage = await acall_yandex_gpt(SYSTEM_PROMPT, user_prompt)
         logger.info(f"YandexGPT token usage (anonymous /analyze): {usage}")
         data = extract_json(raw_text)
     except YandexGPTError as exc:
@@ -943,10 +1158,16 @@ def analyze_startup(payload: AnalyzeRequest) -> AnalyzeResponse:
         raise HTTPException(status_code=502, detail="Invalid JSON from YandexGPT") from exc
     try:
         normalized = _normalize_analyze_data(data)
-        return AnalyzeResponse(**normalized)
+        result = AnalyzeResponse(**normalized)
     except (ValidationError, TypeError, ValueError) as exc:
         raise HTTPException(status_code=502, detail="Invalid analysis schema from YandexGPT") from exc
 
+    if degraded:
+        response.headers[RAG_DEGRADED_HEADER] = "true"
+    else:
+        await run_in_threadpool(ANALYSIS_CACHE.store, payload.description, normalized, query_embedding)
+    return result
+
 
 def _check_subscription_limits(user: User, db: Session, resource_type: str, session_id: int = None):
     if user.is_admin:
@@ -981,12 +1202,13 @@ def _check_subscription_limits(user: User, db: Session, resource_type: str, sess
 
 
 @app.post("/analysis", response_model=AnalysisResponse)
-def create_analysis(
+async def create_analysis(
     payload: AnalysisCreateRequest,
+    response: Response,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> AnalysisResponse:
-    _check_subscription_limits(user, db, "project")
+    await run_in_threadpool(_check_subscription_limits, user, db, "project")
 
     description_parts = [
         f"Название: {payload.name}",
@@ -997,40 +1219,47 @@ def create_analysis(
     ]
     description = "\n".join([part for part in description_parts if part])
 
-    try:
-        context_chunks = rag.get_relevant_chunks(description, top_k=3)
-    except RuntimeError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    normalized, query_embedding = await run_in_threadpool(ANALYSIS_CACHE.lookup, "/analysis", description)
+    if normalized is None:
+        context_chunks, degraded = await _retrieve_analysis_context(description)
 
-    user_prompt = _build_user_prompt(description, context_chunks)
+        user_prompt = _build_user_prompt(description, context_chunks)
 
-    try:
-        raw_text, usage = call_yandex_gpt(SYSTEM_PROMPT, user_prompt)
-        logger.info(f"YandexGPT token usage (user {user.id} /analyze): {usage}")
-        data = extract_json(raw_text)
-    except YandexGPTError as exc:
-        status = exc.status_code or 502
-        raise HTTPException(status_code=status, detail=exc.message) from exc
-    except ValueError as exc:
-        raise HTTPException(status_code=502, detail="Invalid JSON from YandexGPT") from exc
-    try:
-        normalized = _normalize_analyze_data(data)
-    except (TypeError, ValueError) as exc:
-        raise HTTPException(status_code=502, detail="Invalid analysis schema from YandexGPT") from exc
+        try:
+            raw_text, usage = await acall_yandex_gpt(SYSTEM_PROMPT, user_prompt)
+            logger.info(f"YandexGPT token usage (user {user.id} /analyze): {usage}")
+            data = extract_json(raw_text)
+        except YandexGPTError as exc:
+            status = exc.status_code or 502
+            raise HTTPException(status_code=status, detail=exc.message) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=502, detail="Invalid JSON from YandexGPT") from exc
+        try:
+            normalized = _normalize_analyze_data(data)
+        except (TypeError, ValueError) as exc:
+            raise HTTPException(status_code=502, detail="Invalid analysis schema from YandexGPT") from exc
 
-    analysis = Analysis(
-        user_id=user.id,
-        payload_text=description,
-        investment_score=normalized["investment_score"],
-        strengths=normalized["strengths"],
-        weaknesses=normalized["weaknesses"],
-        recommendations=normalized["recommendations"],
-        market_summary=normalized["market_summary"],
-    )
-    db.add(analysis)
-    db.commit()
-    db.refresh(analysis)
+        if degraded:
+            response.headers[RAG_DEGRADED_HEADER] = "true"
+        else:
+            await run_in_threadpool(ANALYSIS_CACHE.store, description, normalized, query_embedding)
 
+    def _save() -> Analysis:
+        analysis = Analysis(
+            user_id=user.id,
+            payload_text=description,
+            investment_score=normalized["investment_score"],
+            strengths=normalized["strengths"],
+            weaknesses=normalized["weaknesses"],
+            recommendations=normalized["recommendations"],
+            market_summary=normalized["market_summary"],
+        )
+        db.add(analysis)
+        db.commit()
+        db.refresh(analysis)
+        return analysis
+
+    analysis = await run_in_threadpool(_save)
     return AnalysisResponse(
         id=analysis.id,
         name=payload.name,
@@ -1099,7 +1328,7 @@ def list_analyses(
 
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(payload: ChatRequest) -> ChatResponse:
+async def chat(payload: ChatRequest) -> ChatResponse:
     if not payload.messages:
         raise HTTPException(status_code=400, detail="messages is required")
 
@@ -1108,14 +1337,14 @@ def chat(payload: ChatRequest) -> ChatResponse:
         raise HTTPException(status_code=400, detail="last user message is required")
 
     try:
-        context_chunks = rag.get_relevant_chunks(last_user, top_k=3)
+        context_chunks = await run_in_threadpool(rag.get_relevant_chunks, last_user, top_k=3)
     except RuntimeError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
     user_prompt = _build_chat_prompt(payload.messages, context_chunks)
 
     try:
-        raw_text, usage = call_yandex_gpt(SYSTEM_CHAT_PROMPT, user_prompt)
+        raw_text, usage = await acall_yandex_gpt(SYSTEM_CHAT_PROMPT, user_prompt)
         logger.info(f"YandexGPT token usage (anonymous /chat): {usage}")
     except YandexGPTError as exc:
         status = exc.status_code or 502
@@ -1195,61 +1424,74 @@ def list_chat_messages(
 
 
 @app.post("/chat/messages", response_model=ChatMessageResponse)
-def create_chat_message(
+async def create_chat_message(
     payload: ChatMessageCreateRequest,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> ChatMessageResponse:
-    session = (
-        db.query(ChatSession)
-        .filter(ChatSession.id == payload.session_id, ChatSession.user_id == user.id)
-        .first()
-    )
-    if not session:
-        raise HTTPException(status_code=404, detail="Chat session not found")
-
-    user_message = DbChatMessage(
-        session_id=session.id, role="user", content=payload.content
-    )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
-
-    history = (
-        db.query(DbChatMessage)
-        .filter(DbChatMessage.session_id == session.id)
-        .order_by(DbChatMessage.created_at.asc())
-        .all()
-    )
-    chat_messages = [ChatMessage(role=m.role, content=m.content) for m in history]
+    session_id = payload.session_id
+    chat_messages = await run_in_threadpool(_add_user_chat_message, db, user, session_id, payload.content)
 
     try:
-        context_chunks = rag.get_relevant_chunks(payload.content, top_k=3)
+        context_chunks = await run_in_threadpool(rag.get_relevant_chunks, payload.content, top_k=3)
     except RuntimeError as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
     user_prompt = _build_chat_prompt(chat_messages, context_chunks)
 
     try:
-        raw_text, usage = call_yandex_gpt(SYSTEM_CHAT_PROMPT, user_prompt)
-        logger.info(f"YandexGPT token usage (session {session.id} /chat/messages): {usage}")
+        raw_text, usage = await acall_yandex_gpt(SYSTEM_CHAT_PROMPT, user_prompt)
+        logger.info(f"YandexGPT token usage (session {session_id} /chat/messages): {usage}")
     except YandexGPTError as exc:
         status = exc.status_code or 502
         raise HTTPException(status_code=status, detail=exc.message) from exc
 
-    assistant_message = DbChatMessage(
-        session_id=session.id, role="assistant", content=raw_text.strip()
-    )
-    db.add(assistant_message)
-    db.commit()
-    db.refresh(assistant_message)
+    return await run_in_threadpool(_save_assistant_message, db, session_id, raw_text.strip())
 
-    return ChatMessageResponse(
-        id=assistant_message.id,
-        role=assistant_message.role,
-        content=assistant_message.content,
-        created_at=assistant_message.created_at,
-    )
+
+@app.post("/chat/messages/stream")
+async def stream_chat_message(
+    payload: ChatMessageCreateRequest,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    """SSE variant of `/chat/messages`.
+
+    Emits `token` events as the completion arrives, then a `done` event with the
+    persisted assistant message, or an `error` event if generation fails.
+    """
+    session_id = payload.session_id
+    chat_messages = await run_in_threadpool(_add_user_chat_message, db, user, session_id, payload.content)
+
+    try:
+        context_chunks = await run_in_threadpool(rag.get_relevant_chunks, payload.content, top_k=3)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+    user_prompt = _build_chat_prompt(chat_messages, context_chunks)
+
+    async def _events():
+        parts: list[str] = []
+        usage: dict = {}
+        try:
+            async for delta, chunk_usage in astream_yandex_gpt(SYSTEM_CHAT_PROMPT, user_prompt):
+                usage = chunk_usage or usage
+                if delta:
+                    parts.append(delta)
+                    yield _sse_event("token", {"text": delta})
+        except YandexGPTError as exc:
+            yield _sse_event("error", {"code": exc.code, "detail": exc.message})
+            return
+        logger.info(f"YandexGPT token usage (session {session_id} /chat/messages/stream): {usage}")
+
+        def _persist() -> ChatMessageResponse:
+            with SessionLocal() as persist_db:
+                return _save_assistant_message(persist_db, session_id, "".join(parts).strip())
+
+        message = await run_in_threadpool(_persist)
+        yield _sse_event("done", message.model_dump(mode="json"))
+
+    return StreamingResponse(_events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @app.get("/chat/messages/search")
@@ -1677,7 +1919,7 @@ def admin_add_rag_url(
         if not text or not filepath:
             raise HTTPException(status_code=400, detail="Could not extract text from the URL")
             
-        chunks_added = rag.add_text_to_rag(text)
+        chunks_added = rag.add_file_to_rag(filepath)
         
         log_entry = RagLog(source_url=req.url, source_type="URL", status="SUCCESS", chunks_added=chunks_added)
         db.add(log_entry)
@@ -1705,12 +1947,13 @@ def admin_add_rag_url(
 
 @app.post("/admin/rag/add-pdf", response_model=AdminRAGResponse)
 async def admin_add_rag_pdf(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
     _: User = Depends(require_admin),
 ):
     """
-    Saves an uploaded PDF, extracts text, and injects it into the active RAG collection.
+    Saves an uploaded PDF and indexes it page by page in the background.
+    Poll /admin/rag/jobs/{job_id} for progress.
     """
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
@@ -1718,7 +1961,6 @@ async def admin_add_rag_pdf(
     try:
         from pathlib import Path
         import shutil
-        import time
         
         DOCS_DIR = Path("sample_docs")
         DOCS_DIR.mkdir(exist_ok=True)
@@ -1728,43 +1970,92 @@ async def admin_add_rag_pdf(
         ts = int(time.time())
         filepath = DOCS_DIR / f"{ts}_{safe_name}"
         
-        with open(filepath, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Parse text
-        text = extract_text_from_pdf(filepath)
-        if not text:
-            raise HTTPException(status_code=400, detail="Could not extract text from the PDF. It might be scanned or empty.")
-            
-        # Create corresponding .txt file for persistence next time server boots
-        txt_filepath = DOCS_DIR / f"{ts}_{safe_name}.txt"
-        with open(txt_filepath, "w", encoding="utf-8") as f:
-            f.write(f"Source: Uploaded PDF {file.filename}\n\n")
-            f.write(text)
-            
-        chunks_added = rag.add_text_to_rag(text)
-        
-        log_entry = RagLog(source_url=file.filename, source_type="PDF", status="SUCCESS", chunks_added=chunks_added)
-        db.add(log_entry)
-        db.commit()
-        
-        return AdminRAGResponse(
-            success=True,
-            message=f"Successfully parsed {file.filename} and added {chunks_added} chunks to RAG.",
-            chunks_added=chunks_added,
-            file_path=str(txt_filepath)
-        )
-    except HTTPException:
-        raise
+        def _save_upload() -> None:
+            with open(filepath, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+
+        await run_in_threadpool(_save_upload)
     except Exception as e:
-        logger.error(f"Failed to process PDF {e}")
-        try:
-            log_entry = RagLog(source_url=file.filename or "unknown.pdf", source_type="PDF", status="FAILED", chunks_added=0, error_message=str(e))
-            db.add(log_entry)
-            db.commit()
-        except:
-            pass
-        raise HTTPException(status_code=500, detail=f"Failed to process PDF: {e}")
+        logger.error(f"Failed to save PDF {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to save PDF: {e}")
+
+    # Extracted text is persisted as .txt so it is picked up on the next boot
+    txt_filepath = DOCS_DIR / f"{ts}_{safe_name}.txt"
+    job_id = uuid.uuid4().hex
+    _set_rag_job(job_id, status="PENDING", source=file.filename, done=0, total=0, chunks_added=0)
+    background_tasks.add_task(background_ingest_pdf, job_id, str(filepath), str(txt_filepath), file.filename)
+
+    return AdminRAGResponse(
+        success=True,
+        message=f"{file.filename} is being indexed in the background.",
+        file_path=str(txt_filepath),
+        job_id=job_id,
+    )
+
+@app.post("/admin/rag/reindex", response_model=AdminRAGResponse)
+def admin_reindex_rag(
+    background_tasks: BackgroundTasks,
+    reembed: bool = False,
+    _: User = Depends(require_admin),
+):
+    """
+    Rebuilds the RAG collection from the docs directory into a new collection while
+    the current one keeps serving, then switches to it. With reembed=true every
+    chunk is re-embedded; otherwise stored vectors are reused.
+    """
+    if not rag.is_ready():
+        raise HTTPException(status_code=503, detail="RAG is not ready")
+    if rag.reindex_running():
+        raise HTTPException(status_code=409, detail="Reindex is already running")
+    job_id = uuid.uuid4().hex
+    _set_rag_job(job_id, status="PENDING", source="reindex", done=0, total=0, chunks_added=0)
+    background_tasks.add_task(background_reindex, job_id, reembed)
+    return AdminRAGResponse(success=True, message="Reindex started in the background.", job_id=job_id)
+
+@app.get("/admin/rag/hnsw")
+def admin_get_hnsw(_: User = Depends(require_admin)):
+    """
+    Returns the HNSW parameters of the serving collection and the ones the next reindex uses.
+    """
+    return rag.hnsw_params()
+
+@app.put("/admin/rag/hnsw", response_model=AdminRAGResponse)
+def admin_set_hnsw(
+    params: HnswParamsRequest,
+    background_tasks: BackgroundTasks,
+    _: User = Depends(require_admin),
+):
+    """
+    Changes HNSW parameters (M, ef_construction, ef_search). Chroma fixes them when a
+    collection is created, so they are applied by a background reindex that reuses the
+    stored vectors. The change lasts until restart; set RAG_HNSW_* to keep it.
+    """
+    if not rag.is_ready():
+        raise HTTPException(status_code=503, detail="RAG is not ready")
+    if rag.reindex_running():
+        raise HTTPException(status_code=409, detail="Reindex is already running")
+    configured = rag.set_hnsw_params(**params.model_dump())
+    job_id = uuid.uuid4().hex
+    _set_rag_job(job_id, status="PENDING", source="reindex", done=0, total=0, chunks_added=0)
+    background_tasks.add_task(background_reindex, job_id, False)
+    return AdminRAGResponse(
+        success=True,
+        message=f"Reindexing with HNSW parameters {configured}.",
+        job_id=job_id,
+    )
+
+@app.get("/admin/rag/jobs/{job_id}", response_model=RagJobResponse)
+def admin_rag_job(
+    job_id: str,
+    _: User = Depends(require_admin),
+):
+    """
+    Returns progress of a background RAG ingestion job.
+    """
+    job = _get_rag_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.get("/admin/rag/logs", response_model=list[RagLogResponse])
 def admin_rag_logs(
@@ -1926,6 +2217,14 @@ SYSTEM_ECONOMICS_PROMPT = """
 ### Риски и как их снизить
 """
 
+INTERVIEWER_FALLBACK_REPLY = "Извините, я задумался. Можете повторить?"
+# Upstream overloaded or down (circuit breaker open): asking again right away will not help
+INTERVIEWER_UNAVAILABLE_REPLY = "Сервис временно перегружен. Пожалуйста, повторите сообщение через минуту."
+INTERVIEWER_UNAVAILABLE_CODES = {"circuit_open", "rate_limit", "rate_limited"}
+# Topics whose reply may be a JSON analysis that `_finalize_interviewer_response`
+# turns into a summary; streaming their raw tokens would show the JSON
+STRUCTURED_TOPICS = {"Анализ идеи"}
+
 SYSTEM_GENERAL_PROMPT = """
 Ты — многопрофильный бизнес-ассистент для стартапов. 
 Помогай основателю с любыми вопросами по бизнесу, стратегии, HR, разработке или фандрайзингу.
@@ -2245,69 +2544,84 @@ def get_chat_session(
 
 
 @app.post("/chat/sessions/{session_id}/messages", response_model=ChatMessageResponse)
-def send_chat_message(
+async def send_chat_message(
     session_id: int,
     payload: ChatMessageCreateRequest,
     background_tasks: BackgroundTasks,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> ChatMessageResponse:
-    session = (
-        db.query(ChatSession)
-        .filter(ChatSession.id == session_id, ChatSession.user_id == user.id)
-        .first()
-    )
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    _check_subscription_limits(user, db, "message", session.id)
-
     # 1. Save User Message
-    user_msg = DbChatMessage(
-        session_id=session.id,
-        role="user",
-        content=payload.content,
-    )
-    db.add(user_msg)
-    db.commit()
-    db.refresh(session) # Fetch updated messages list
+    history_msgs = await run_in_threadpool(_add_interviewer_user_message, db, user, session_id, payload.content)
 
-    if len(session.messages) == 1:
-        background_tasks.add_task(rename_chat_session_background, session.id, payload.content)
+    if len(history_msgs) == 1:
+        background_tasks.add_task(rename_chat_session_background, session_id, payload.content)
 
     # 2. Generate Assistant Response
-    assistant_text = _generate_interviewer_response(session, db)
+    assistant_text = await _generate_interviewer_response(session_id, history_msgs, db)
 
     # 3. Save Assistant Message
-    ai_msg = DbChatMessage(
-        session_id=session.id,
-        role="assistant",
-        content=assistant_text,
-    )
-    db.add(ai_msg)
-    db.commit()
-    db.refresh(ai_msg)
+    return await run_in_threadpool(_save_assistant_message, db, session_id, assistant_text)
 
-    return ChatMessageResponse(
-        id=ai_msg.id,
-        role=ai_msg.role,
-        content=ai_msg.content,
-        created_at=ai_msg.created_at,
-    )
 
+@app.post("/chat/sessions/{session_id}/messages/stream")
+async def stream_session_message(
+    session_id: int,
+    payload: ChatMessageCreateRequest,
+    background_tasks: BackgroundTasks,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    """SSE variant of `/chat/sessions/{session_id}/messages`.
 
-def _generate_interviewer_response(session: ChatSession, db: Session) -> str:
-    # Fetch history
-    history_msgs = sorted(session.messages, key=lambda m: m.created_at)
+    Emits `token` events while the interviewer reply is generated and a final
+    `done` event with the persisted assistant message. Replies on structured
+    topics can be a raw JSON analysis, so their tokens are not streamed.
+    """
+    history_msgs = await run_in_threadpool(_add_interviewer_user_message, db, user, session_id, payload.content)
 
-    # Check if analysis already exists (sanity check, though we might allow re-analysis)
-    if session.analysis_id:
-        # If analysis done, maybe just chat normally?
-        # For now, let's assume we continue strictly or we shouldn't act as interviewer anymore.
-        # But user wants "possibility to continue dialog".
-        # Let's simple context prompt for now.
-        pass
+    if len(history_msgs) == 1:
+        background_tasks.add_task(rename_chat_session_background, session_id, payload.content)
+
+    system_prompt, user_prompt, topic, history_text = await _prepare_interviewer_prompt(history_msgs)
 
+    stream_tokens = topic not in STRUCTURED_TOPICS
+
+    async def _events():
+        parts: list[str] = []
+        usage: dict = {}
+        failed: YandexGPTError | None = None
+        try:
+            async for delta, chunk_usage in astream_yandex_gpt(system_prompt, user_prompt):
+                usage = chunk_usage or usage
+                if delta:
+                    parts.append(delta)
+                    if stream_tokens:
+                        yield _sse_event("token", {"text": delta})
+            logger.info(f"YandexGPT token usage (session {session_id} stream): {usage}")
+        except YandexGPTError as exc:
+            logger.error(f"Interviewer Error: {exc.message}")
+            failed = exc
+
+        def _persist() -> ChatMessageResponse:
+            with SessionLocal() as persist_db:
+                if failed:
+                    content = _interviewer_error_reply(failed)
+                else:
+                    persist_session = persist_db.get(ChatSession, session_id)
+                    content = _finalize_interviewer_response(
+                        persist_session, persist_db, topic, history_text, "".join(parts)
+                    )
+                return _save_assistant_message(persist_db, session_id, content)
+
+        message = await run_in_threadpool(_persist)
+        yield _sse_event("done", message.model_dump(mode="json"))
+
+    return StreamingResponse(_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def _prepare_interviewer_prompt(history_msgs: list[DbChatMessage]) -> tuple[str, str, str, str]:
+    """Build `(system_prompt, user_prompt, topic, history_text)` from the session's sorted messages."""
     # We use a custom build payload here to inject SYSTEM_INTERVIEW_PROMPT and handle JSON
 
     # Prepare RAG context?
@@ -2321,7 +2635,8 @@ def _generate_interviewer_response(session: ChatSession, db: Session) -> str:
     context_text = ""
     if last_user_text and len(last_user_text) > 10:
         try:
-            chunks = rag.get_relevant_chunks(last_user_text, top_k=5)
+            chunks = await run_in_threadpool(rag.get_relevant_chunks, last_user_text, top_k=5)
+            chunks = assemble_context(last_user_text, chunks, CONTEXT_BUDGET_INTERVIEW, endpoint="interview")
             context_text = "\n".join(chunks)
         except Exception:
             pass
@@ -2342,89 +2657,114 @@ def _generate_interviewer_response(session: ChatSession, db: Session) -> str:
     if context_text:
         system_prompt_final += f"\n\nСправочная информация (RAG):\n{context_text}"
 
-    # Call LLM
-    try:
-        # Helper to call YandexGPT with list of messages
-        # We need to bypass `call_yandex_gpt` which is simple and uses `_build_payload`.
-        # We can implement `_call_yandex_gpt_messages` or similar.
-        # But `call_yandex_gpt` takes system_prompt and user_prompt.
-        # If we want history, format it into user_prompt or use the `messages` list
-        # properly if the helper supported it.
-        # Current `yandex_gpt_client` seems to support `messages` list in `_build_payload`.
-        # But `call_yandex_gpt` hardcodes it to [system, user].
-
-        # Let's serialize history into text for now (simple approach) or fix client.
-        # Serializing history is safer for "turn-based" API usage if we don't valid tokens.
-
-        history_text = ""
-        for m in history_msgs:
-            role_label = "Основатель" if m.role == "user" else "Аналитик"
-            history_text += f"{role_label}: {m.content}\n"
-
-        final_user_prompt = f"История диалога:\n{history_text}\n\nТвоя реакция (вопрос, резюме или ответ на уточнение пользователя):"
-
-        # Forcefully stop questions if history is too long
-        # BUT only if analysis/summary hasn't been given yet
-        # Check: if any AI message is longer than 500 chars, analysis was likely already given
-        analysis_already_given = any(
-            m.role == "assistant" and len(m.content) > 500
-            for m in history_msgs[3:]  # skip greeting + topic
-        )
+    # Helper to call YandexGPT with list of messages
+    # We need to bypass `call_yandex_gpt` which is simple and uses `_build_payload`.
+    # We can implement `_call_yandex_gpt_messages` or similar.
+    # But `call_yandex_gpt` takes system_prompt and user_prompt.
+    # If we want history, format it into user_prompt or use the `messages` list
+    # properly if the helper supported it.
+    # Current `yandex_gpt_client` seems to support `messages` list in `_build_payload`.
+    # But `call_yandex_gpt` hardcodes it to [system, user].
+
+    # Let's serialize history into text for now (simple approach) or fix client.
+    # Serializing history is safer for "turn-based" API usage if we don't valid tokens.
+
+    history_text = ""
+    for m in history_msgs:
+        role_label = "Основатель" if m.role == "user" else "Аналитик"
+        history_text += f"{role_label}: {m.content}\n"
+
+    final_user_prompt = f"История диалога:\n{history_text}\n\nТвоя реакция (вопрос, резюме или ответ на уточнение пользователя):"
+
+    # Forcefully stop questions if history is too long
+    # BUT only if analysis/summary hasn't been given yet
+    # Check: if any AI message is longer than 500 chars, analysis was likely already given
+    analysis_already_given = any(
+        m.role == "assistant" and len(m.content) > 500
+        for m in history_msgs[3:]  # skip greeting + topic
+    )
 
-        if not analysis_already_given:
-            qa_limit = 13 if topic == "Анализ идеи" else 11
-            if len(history_msgs) >= qa_limit:
-                if topic == "Анализ идеи":
-                    final_user_prompt += "\n\n[СИСТЕМНОЕ СООБЩЕНИЕ]: ЛИМИТ ВОПРОСОВ КЛИЕНТУ ИСЧЕРПАН. СЕЙЧАС ЖЕ ВЫДАЙ ФИНАЛЬНЫЙ JSON АНАЛИЗ ОТ 0 ДО 100 БЕЗ КАКИХ-ЛИБО ВОПРОСОВ. НИЧЕГО КРОМЕ JSON СТРОКИ НЕ ВЫВОДИ."
-                else:
-                    final_user_prompt += "\n\n[СИСТЕМНОЕ СООБЩЕНИЕ]: ЛИМИТ ВОПРОСОВ КЛИЕНТУ ИСЧЕРПАН. СЕЙЧАС ЖЕ ВЫДАЙ ФИНАЛЬНОЕ ПОДРОБНОЕ РЕЗЮМЕ/СОВЕТЫ ПО ТЕМЕ БЕЗ КАКИХ-ЛИБО ВОПРОСОВ."
+    if not analysis_already_given:
+        qa_limit = 13 if topic == "Анализ идеи" else 11
+        if len(history_msgs) >= qa_limit:
+            if topic == "Анализ идеи":
+                final_user_prompt += "\n\n[СИСТЕМНОЕ СООБЩЕНИЕ]: ЛИМИТ ВОПРОСОВ КЛИЕНТУ ИСЧЕРПАН. СЕЙЧАС ЖЕ ВЫДАЙ ФИНАЛЬНЫЙ JSON АНАЛИЗ ОТ 0 ДО 100 БЕЗ КАКИХ-ЛИБО ВОПРОСОВ. НИЧЕГО КРОМЕ JSON СТРОКИ НЕ ВЫВОДИ."
+            else:
+                final_user_prompt += "\n\n[СИСТЕМНОЕ СООБЩЕНИЕ]: ЛИМИТ ВОПРОСОВ КЛИЕНТУ ИСЧЕРПАН. СЕЙЧАС ЖЕ ВЫДАЙ ФИНАЛЬНОЕ ПОДРОБНОЕ РЕЗЮМЕ/СОВЕТЫ ПО ТЕМЕ БЕЗ КАКИХ-ЛИБО ВОПРОСОВ."
+
+    return system_prompt_final, final_user_prompt, topic, history_text
+
+
+def _finalize_interviewer_response(
+    session: ChatSession, db: Session, topic: str, history_text: str, raw_response: str
+) -> str:
+    """Turn the raw model reply into the assistant message, saving an Analysis if one was produced."""
+    # Check if JSON
+    clean_text = raw_response.strip()
+    if topic == "Анализ идеи" and "{" in clean_text and "}" in clean_text:
+        # Try parse
+        try:
+            data = extract_json(clean_text)
+            # It is analysis!
+            # Validate fields
+            if "investment_score" in data:
+                # Create Analysis
+                normalized = _normalize_analyze_data(data)
+
+                # Create Analysis entity
+                analysis = Analysis(
+                    user_id=session.user_id,
+                    payload_text=history_text,  # Save chat history as source
+                    investment_score=normalized["investment_score"],
+                    strengths=normalized["strengths"],
+                    weaknesses=normalized["weaknesses"],
+                    recommendations=normalized["recommendations"],
+                    market_summary=normalized["market_summary"],
+                )
+                db.add(analysis)
+                db.commit()
+                db.refresh(analysis)
+
+                # Link to Session
+                session.analysis_id = analysis.id
+                db.commit()
+                db.refresh(session)
+
+                return (
+                    f"Анализ готов! \n\n**Резюме:** {analysis.market_summary}\n\n"
+                    f"**Оценка:** {analysis.investment_score}/100. \n\n"
+                    "Вы можете увидеть полную версию в дашборде."
+                )
+        except Exception:
+            # Failed to parse, return raw text (maybe it was just a question with quotes)
+            pass
+
+    return clean_text
+
+
+def _interviewer_error_reply(exc: Exception) -> str:
+    if isinstance(exc, YandexGPTError) and exc.code in INTERVIEWER_UNAVAILABLE_CODES:
+        return INTERVIEWER_UNAVAILABLE_REPLY
+    return INTERVIEWER_FALLBACK_REPLY
 
 
-        raw_response, usage = call_yandex_gpt(system_prompt_final, final_user_prompt)
+async def _generate_interviewer_response(session_id: int, history_msgs: list[DbChatMessage], db: Session) -> str:
+    try:
+        system_prompt, user_prompt, topic, history_text = await _prepare_interviewer_prompt(history_msgs)
+
+        # Call LLM
+        raw_response, usage = await acall_yandex_gpt(system_prompt, user_prompt)
         logger.info(f"YandexGPT token usage (background summary): {usage}")
 
-        # Check if JSON
-        clean_text = raw_response.strip()
-        if topic == "Анализ идеи" and "{" in clean_text and "}" in clean_text:
-            # Try parse
-            try:
-                data = extract_json(clean_text)
-                # It is analysis!
-                # Validate fields
-                if "investment_score" in data:
-                    # Create Analysis
-                    normalized = _normalize_analyze_data(data)
-
-                    # Create Analysis entity
-                    analysis = Analysis(
-                        user_id=session.user_id,
-                        payload_text=history_text,  # Save chat history as source
-                        investment_score=normalized["investment_score"],
-                        strengths=normalized["strengths"],
-                        weaknesses=normalized["weaknesses"],
-                        recommendations=normalized["recommendations"],
-                        market_summary=normalized["market_summary"],
-                    )
-                    db.add(analysis)
-                    db.commit()
-                    db.refresh(analysis)
-
-                    # Link to Session
-                    session.analysis_id = analysis.id
-                    db.commit()
-                    db.refresh(session)
-
-                    return (
-                        f"Анализ готов! \n\n**Резюме:** {analysis.market_summary}\n\n"
-                        f"**Оценка:** {analysis.investment_score}/100. \n\n"
-                        "Вы можете увидеть полную версию в дашборде."
-                    )
-            except Exception:
-                # Failed to parse, return raw text (maybe it was just a question with quotes)
-                pass
+        def _finalize() -> str:
+            session = db.get(ChatSession, session_id)
+            return _finalize_interviewer_response(session, db, topic, history_text, raw_response)
 
-        return clean_text
+        return await run_in_threadpool(_finalize)
 
+    except YandexGPTError as e:
+        logger.error(f"Interviewer Error: {e.message}")
+        return _interviewer_error_reply(e)
     except Exception as e:
         logger.error(f"Interviewer Error: {e}")
-        return "Извините, я задумался. Можете повторить?"
+        return INTERVIEWER_FALLBACK_REPLY
@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 REQUEST_COUNT = Counter(
     "http_requests_total",
@@ -17,3 +17,114 @@ ERROR_COUNT = Counter(
     "Total HTTP error responses",
     ["method", "path", "status"],
 )
+
+RESPONSE_CACHE_HITS = Counter(
+    "llm_response_cache_hits_total",
+    "LLM response cache hits",
+    ["endpoint", "tier"],
+)
+
+RESPONSE_CACHE_MISSES = Counter(
+    "llm_response_cache_misses_total",
+    "LLM response cache misses",
+    ["endpoint"],
+)
+
+EMBEDDING_CACHE_HITS = Counter(
+    "embedding_query_cache_hits_total",
+    "Query embedding cache hits",
+    ["tier"],
+)
+
+EMBEDDING_CACHE_MISSES = Counter(
+    "embedding_query_cache_misses_total",
+    "Query embedding cache misses",
+)
+
+EMBEDDING_ENCODE_LATENCY = Histogram(
+    "embedding_encode_duration_seconds",
+    "Embedding model encode latency in seconds",
+    ["kind"],
+)
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_query_batch_size",
+    "Number of queries encoded per micro-batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+RAG_STATE = Gauge(
+    "rag_state",
+    "Current RAG readiness state (1 for the active state)",
+    ["state"],
+)
+
+RAG_STARTUP_PHASE_SECONDS = Gauge(
+    "rag_startup_phase_seconds",
+    "Duration of each RAG init phase in seconds (last run)",
+    ["phase"],
+)
+
+RAG_DEGRADED_REQUESTS = Counter(
+    "rag_degraded_requests_total",
+    "Retrievals answered without context because RAG was not ready",
+)
+
+RAG_NEAR_DUPLICATES = Counter(
+    "rag_near_duplicate_chunks_total",
+    "Chunks skipped at ingest as near-duplicates of stored chunks",
+)
+
+RAG_RESULT_CACHE_HITS = Counter(
+    "rag_result_cache_hits_total",
+    "Retrievals answered from the result cache",
+    ["tier"],
+)
+
+RAG_RESULT_CACHE_MISSES = Counter(
+    "rag_result_cache_misses_total",
+    "Retrievals not found in the result cache",
+)
+
+RAG_STAGE_LATENCY = Histogram(
+    "rag_retrieval_stage_duration_seconds",
+    "RAG retrieval latency per stage in seconds",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+RAG_CONTEXT_TOKENS = Histogram(
+    "rag_context_tokens",
+    "Estimated tokens of retrieved context put into a prompt",
+    ["endpoint"],
+    buckets=(50, 100, 200, 300, 400, 500, 600, 800, 1000, 1500, 2000),
+)
+
+YANDEX_GPT_RETRIES = Counter(
+    "yandex_gpt_retries_total",
+    "YandexGPT calls retried after a retryable failure",
+    ["reason"],
+)
+
+YANDEX_GPT_BREAKER_STATE = Gauge(
+    "yandex_gpt_circuit_breaker_state",
+    "YandexGPT circuit breaker state: 0 closed, 1 half-open, 2 open",
+)
+
+YANDEX_GPT_BREAKER_REJECTIONS = Counter(
+    "yandex_gpt_circuit_breaker_rejections_total",
+    "YandexGPT calls failed fast because the circuit breaker was open",
+)
+
+LLM_RATE_LIMIT_WAIT = Histogram(
+    "llm_rate_limit_wait_seconds",
+    "Time LLM calls queued for the cluster-wide rate limiter",
+    ["limiter"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+
+LLM_RATE_LIMIT_REJECTIONS = Counter(
+    "llm_rate_limit_rejections_total",
+    "LLM calls rejected because the rate limiter could not serve them before the deadline",
+    ["limiter"],
+)
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Mapping
+
+import numpy as np
+
+FINGERPRINT_BITS = 64
+_BIT_SHIFTS = np.arange(FINGERPRINT_BITS, dtype=np.uint64)
+_TERM_HASHES: Dict[str, int] = {}
+
+
+def _term_hash(term: str) -> int:
+    value = _TERM_HASHES.get(term)
+    if value is None:
+        value = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+        _TERM_HASHES[term] = value
+    return value
+
+
+def simhash(term_freqs: Mapping[str, int]) -> int:
+    """64-bit SimHash of a bag of tokens weighted by term frequency."""
+    if not term_freqs:
+        return 0
+    hashes = np.fromiter((_term_hash(t) for t in term_freqs), dtype=np.uint64, count=len(term_freqs))
+    weights = np.fromiter(term_freqs.values(), dtype=np.float32, count=len(term_freqs))
+    bits = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).astype(np.float32)
+    votes = weights @ (2 * bits - 1)
+    return int(np.sum(np.left_shift(np.uint64(1), _BIT_SHIFTS[votes > 0])))
+
+
+class SimHashIndex:
+    """SimHash fingerprints of stored chunks with banded near-duplicate lookup.
+
+    Two chunks are near-duplicates when their fingerprints differ in at most
+    `max_distance` bits. Fingerprints are split into `max_distance + 1` bands,
+    so any such pair agrees exactly on at least one band and a lookup only
+    compares against chunks sharing a band. Chunks shorter than `min_tokens`
+    are never matched.
+    """
+
+    def __init__(self, max_distance: int = 3, min_tokens: int = 10):
+        self.max_distance = max_distance
+        self.min_tokens = min_tokens
+        self._lock = threading.RLock()
+        self._band_count = max_distance + 1
+        self._band_bits = FINGERPRINT_BITS // self._band_count
+        self._fingerprints: Dict[str, int] = {}
+        self._bands: List[Dict[int, set[str]]] = [{} for _ in range(self._band_count)]
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._fingerprints
+
+    def _band_keys(self, fingerprint: int) -> List[int]:
+        mask = (1 << self._band_bits) - 1
+        return [(fingerprint >> (i * self._band_bits)) & mask for i in range(self._band_count)]
+
+    def add(self, doc_id: str, term_freqs: Mapping[str, int]) -> None:
+        if sum(term_freqs.values()) < self.min_tokens:
+            return
+        fingerprint = simhash(term_freqs)
+        with self._lock:
+            if doc_id in self._fingerprints:
+                self._remove_one(doc_id)
+            self._fingerprints[doc_id] = fingerprint
+            for band, key in zip(self._bands, self._band_keys(fingerprint)):
+                band.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in doc_ids:
+                if doc_id in self._fingerprints:
+                    self._remove_one(doc_id)
+
+    def _remove_one(self, doc_id: str) -> None:
+        fingerprint = self._fingerprints.pop(doc_id)
+        for band, key in zip(self._bands, self._band_keys(fingerprint)):
+            members = band.get(key)
+            if members is not None:
+                members.discard(doc_id)
+                if not members:
+                    del band[key]
+
+    def find(self, term_freqs: Mapping[str, int]) -> str | None:
+        """Id of a stored chunk within `max_distance` bits, if any."""
+        if sum(term_freqs.values()) < self.min_tokens:
+            return None
+        fingerprint = simhash(term_freqs)
+        with self._lock:
+            for band, key in zip(self._bands, self._band_keys(fingerprint)):
+                for doc_id in band.get(key, ()):
+                    if (self._fingerprints[doc_id] ^ fingerprint).bit_count() <= self.max_distance:
+                        return doc_id
+        return None
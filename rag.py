@@ -1,10 +1,19 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+import base64
+import hashlib
+import json
 import os
 import re
+import threading
+import time
+import uuid
 
 # Workaround for pydantic v1 config error in chromadb
 os.environ["CHROMA_SERVER_NOFILE"] = "65535"
@@ -14,6 +23,28 @@ from chromadb.api.models.Collection import Collection  # noqa: E402
 from chromadb.api.types import Documents, EmbeddingFunction, Embeddings  # noqa: E402
 from sentence_transformers import SentenceTransformer  # noqa: E402
 from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+import numpy as np  # noqa: E402
+import redis  # noqa: E402
+
+from bulk_embedding import BulkEmbedder  # noqa: E402
+from embedding_batcher import MicroBatcher  # noqa: E402
+from lexical_index import BM25Index, normalize_scores, reciprocal_rank_fusion, tokenize  # noqa: E402
+from local_cache import LocalLRUCache  # noqa: E402
+from metrics import (  # noqa: E402
+    EMBEDDING_CACHE_HITS,
+    EMBEDDING_CACHE_MISSES,
+    EMBEDDING_ENCODE_LATENCY,
+    RAG_DEGRADED_REQUESTS,
+    RAG_NEAR_DUPLICATES,
+    RAG_RESULT_CACHE_HITS,
+    RAG_RESULT_CACHE_MISSES,
+    RAG_STARTUP_PHASE_SECONDS,
+    RAG_STAGE_LATENCY,
+    RAG_STATE,
+)
+from near_duplicates import SimHashIndex  # noqa: E402
+from redis_client import get_redis  # noqa: E402
+from vector_store import ChromaVectorStore, NumpyVectorStore, PQVectorStore  # noqa: E402
 
 
 DOCS_DIR = Path(os.getenv("CHROMA_DOCS_DIR", "sample_docs"))
@@ -21,31 +52,273 @@ DB_DIR = os.getenv("CHROMA_PERSIST_DIR", "chroma_db")
 COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "startup_docs")
 CHROMA_HTTP_HOST = os.getenv("CHROMA_HTTP_HOST")
 CHROMA_HTTP_PORT = int(os.getenv("CHROMA_HTTP_PORT", "8000"))
+# Per-file content hashes and chunk ids of what has been ingested from DOCS_DIR
+# Manifest, BM25 and NumPy mirror files. They must outlive the container, so
+# with a remote Chroma (CHROMA_HTTP_HOST) point this at a mounted volume.
+RAG_DATA_DIR = Path(os.getenv("RAG_DATA_DIR", DB_DIR))
+MANIFEST_PATH = Path(os.getenv("CHROMA_MANIFEST_PATH", str(RAG_DATA_DIR / "docs_manifest.json")))
+UPSERT_BATCH_SIZE = int(os.getenv("CHROMA_UPSERT_BATCH_SIZE", "256"))
+# Collection whose metadata records which physical collection is live
+ALIAS_COLLECTION_NAME = f"{COLLECTION_NAME}__alias"
+# Model migration: chunks copied per page and the resume checkpoint
+MIGRATION_PAGE_SIZE = int(os.getenv("RAG_MIGRATION_PAGE_SIZE", "2048"))
+MIGRATION_CHECKPOINT_PATH = Path(
+    os.getenv("RAG_MIGRATION_CHECKPOINT_PATH", str(RAG_DATA_DIR / f"{COLLECTION_NAME}_migration.json"))
+)
+# Written once the collection is known to match the model, so later boots skip the check
+MIGRATION_MARKER_PATH = Path(os.getenv("RAG_MIGRATION_MARKER_PATH", "/tmp/.rag_migration_done"))
+# Keep the previous collection after a reindex so it can be pointed back to
+REINDEX_KEEP_PREVIOUS = os.getenv("RAG_REINDEX_KEEP_PREVIOUS", "true").lower() == "true"
+# Every worker re-reads the alias and re-registers the collection it serves
+# this often; a reindex never drops a collection registered within 3 periods
+SERVING_HEARTBEAT_SECONDS = float(os.getenv("RAG_SERVING_HEARTBEAT_SECONDS", "30"))
+# Bulk mode: this many new chunks or more are embedded on a process pool and
+# upserted with precomputed vectors. Off by default (1 worker): every worker
+# holds its own model copy, so it is enabled only where the memory is spare.
+BULK_EMBED_WORKERS = max(1, int(os.getenv("RAG_BULK_EMBED_WORKERS", "1")))
+BULK_EMBED_THREADS = int(os.getenv("RAG_BULK_EMBED_THREADS", "0")) or max(
+    1, (os.cpu_count() or 1) // BULK_EMBED_WORKERS
+)
+BULK_EMBED_MIN_CHUNKS = int(os.getenv("RAG_BULK_EMBED_MIN_CHUNKS", "1000"))
+BULK_UPSERT_BATCH_SIZE = int(os.getenv("RAG_BULK_UPSERT_BATCH_SIZE", "2048"))
+# Text buffered before chunking during streaming ingestion (large PDFs)
+STREAM_WINDOW_CHARS = int(os.getenv("RAG_STREAM_WINDOW_CHARS", "20000"))
+LEXICAL_INDEX_PATH = Path(
+    os.getenv("RAG_LEXICAL_INDEX_PATH", str(RAG_DATA_DIR / f"{COLLECTION_NAME}_bm25.json"))
+)
+# Ingests save the BM25 file at most once per this many seconds
+LEXICAL_SAVE_DELAY_SECONDS = float(os.getenv("RAG_LEXICAL_SAVE_DELAY_SECONDS", "5"))
+# Near-duplicate filter: chunks whose SimHash is within this many bits (of 64)
+# of a stored chunk are not ingested
+DEDUP_ENABLED = os.getenv("RAG_DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_MAX_HAMMING = int(os.getenv("RAG_DEDUP_MAX_HAMMING", "3"))
+DEDUP_MIN_TOKENS = int(os.getenv("RAG_DEDUP_MIN_TOKENS", "10"))
+# Vector search backend: "chroma" (HNSW, possibly remote) or "numpy" (exact
+# search over a local memmap mirror of the collection, for small corpora)
+VECTOR_STORE = os.getenv("RAG_VECTOR_STORE", "chroma").lower()
+NUMPY_STORE_PATH = Path(os.getenv("RAG_NUMPY_STORE_PATH", str(RAG_DATA_DIR / f"{COLLECTION_NAME}_vectors")))
+# "float32", "float16" or "pq" (product-quantized codes, refined from local float16 rows)
+NUMPY_STORE_DTYPE = os.getenv("RAG_NUMPY_STORE_DTYPE", "float32").lower()
+PQ_SUBVECTORS = int(os.getenv("RAG_PQ_SUBVECTORS", "48"))
+PQ_REFINE = int(os.getenv("RAG_PQ_REFINE", "4"))
+# The PQ codebook is trained once this many chunks are mirrored; search is exact before
+PQ_MIN_TRAIN_SIZE = int(os.getenv("RAG_PQ_MIN_TRAIN_SIZE", "4096"))
+# HNSW graph of new collections (Chroma defaults 16 / 100 / 10). They are fixed
+# when a collection is created, so changing them takes a reindex
+HNSW_M = int(os.getenv("RAG_HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("RAG_HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("RAG_HNSW_SEARCH_EF", "10"))
+# Reranking: combined = w * vector similarity + (1 - w) * normalized BM25
+RERANK_VECTOR_WEIGHT = float(os.getenv("RAG_RERANK_VECTOR_WEIGHT", "0.7"))
+# Without hybrid retrieval: rerank vector candidates (false = plain vector order)
+RERANK_ENABLED = os.getenv("RAG_RERANK_ENABLED", "true").lower() == "true"
+# Candidates fetched for reranking: min(top_k * multiplier, max)
+FETCH_K_MULTIPLIER = int(os.getenv("RAG_FETCH_K_MULTIPLIER", "3"))
+FETCH_K_MAX = int(os.getenv("RAG_FETCH_K_MAX", "15"))
+# Hybrid retrieval: BM25 over all chunks runs alongside the vector query and
+# both rankings are merged with reciprocal-rank fusion
+HYBRID_RETRIEVAL = os.getenv("RAG_HYBRID_RETRIEVAL", "true").lower() == "true"
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# p95 latency target for StartupRAG.query, checked by bench_retrieval.py
+RETRIEVAL_BUDGET_MS = float(os.getenv("RAG_RETRIEVAL_BUDGET_MS", "150"))
+# How long a request waits for a still-loading RAG before giving up
+RAG_READY_WAIT_SECONDS = float(os.getenv("RAG_READY_WAIT_SECONDS", "2"))
+# Answer without retrieved context while RAG is unavailable instead of failing
+RAG_DEGRADED_MODE = os.getenv("RAG_DEGRADED_MODE", "true").lower() == "true"
 
 # --- Model Configuration ---
 EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-small"
+# Local copy written by download_model.py (or the image build); the hub is
+# only used when it is missing
+EMBEDDING_MODEL_DIR = Path(os.getenv("EMBEDDING_MODEL_DIR", "model_data/multilingual-e5-small"))
+# Dummy batch encoded during init so the first request does not pay lazy-init costs
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+EMBEDDING_WARMUP_BATCH = int(os.getenv("EMBEDDING_WARMUP_BATCH", "8"))
 # Metadata key to track which model was used for embeddings
 MODEL_META_KEY = "embedding_model"
+# "torch" (SentenceTransformers default), "onnx" or "onnx-int8" (dynamically quantized ONNX)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = Path(os.getenv("EMBEDDING_ONNX_DIR", "model_data/multilingual-e5-small-onnx"))
+# Instruction set the int8 kernels are tuned for: avx2, avx512, avx512_vnni or arm64
+EMBEDDING_ONNX_QUANT_CONFIG = os.getenv("EMBEDDING_ONNX_QUANT_CONFIG", "avx2")
+
+# --- Query embedding cache ---
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "false").lower() == "true"
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+
+# --- Retrieval result cache ---
+# Final ranked chunks keyed by (normalized query, top_k, collection version)
+RESULT_CACHE_ENABLED = os.getenv("RAG_RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_REDIS = os.getenv("RAG_RESULT_CACHE_REDIS", "false").lower() == "true"
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RAG_RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# --- Query micro-batching ---
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "true").lower() == "true"
+EMBEDDING_BATCH_MAX = int(os.getenv("EMBEDDING_BATCH_MAX", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+
+
+def _normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _embedding_redis_key(normalized: str, backend: str) -> str:
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+    return f"emb:{EMBEDDING_MODEL_NAME}:{backend}:{digest}"
+
+
+def _model_source() -> Tuple[str, bool]:
+    """`(name_or_path, is_local)`: EMBEDDING_MODEL_DIR if it holds the weights, else the hub name."""
+    if (EMBEDDING_MODEL_DIR / "config.json").exists() and (EMBEDDING_MODEL_DIR / "model.safetensors").exists():
+        return str(EMBEDDING_MODEL_DIR), True
+    return EMBEDDING_MODEL_NAME, False
+
+
+def _load_embedding_model(backend: str) -> SentenceTransformer:
+    source, local = _model_source()
+    if backend == "torch":
+        # safetensors are memory-mapped and copied straight into the module
+        # instead of initializing random weights first
+        model_kwargs = {"low_cpu_mem_usage": True}
+        if local:
+            model_kwargs["use_safetensors"] = True
+        return SentenceTransformer(source, local_files_only=local, model_kwargs=model_kwargs)
+    if backend == "onnx":
+        return SentenceTransformer(source, backend="onnx", local_files_only=local)
+    if backend == "onnx-int8":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        file_name = f"onnx/model_qint8_{EMBEDDING_ONNX_QUANT_CONFIG}.onnx"
+        if not (EMBEDDING_ONNX_DIR / file_name).exists():
+            # One-off export; later boots load the quantized file directly.
+            print(f"Exporting int8 ONNX model to {EMBEDDING_ONNX_DIR}...")
+            onnx_model = SentenceTransformer(source, backend="onnx", local_files_only=local)
+            onnx_model.save(str(EMBEDDING_ONNX_DIR))
+            export_dynamic_quantized_onnx_model(
+                onnx_model, EMBEDDING_ONNX_QUANT_CONFIG, str(EMBEDDING_ONNX_DIR)
+            )
+        return SentenceTransformer(
+            str(EMBEDDING_ONNX_DIR), backend="onnx", model_kwargs={"file_name": file_name}
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
 
 
 class E5EmbeddingFunction(EmbeddingFunction):
     """Embedding function using multilingual-e5-small.
     E5 models require 'query: ' prefix for queries and 'passage: ' for documents.
     """
-    def __init__(self):
-        print(f"Loading embedding model {EMBEDDING_MODEL_NAME}...")
-        self.model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    def __init__(self, backend: str = EMBEDDING_BACKEND):
+        print(f"Loading embedding model {_model_source()[0]} ({backend})...")
+        self.backend = backend
+        self.model = _load_embedding_model(backend)
+        self._query_cache = LocalLRUCache(EMBEDDING_CACHE_SIZE)
+        self._batcher = (
+            MicroBatcher(self._encode_queries, EMBEDDING_BATCH_MAX, EMBEDDING_BATCH_WAIT_MS)
+            if EMBEDDING_BATCHING
+            else None
+        )
 
     def __call__(self, input: Documents) -> Embeddings:
         # E5 models expect prefixed input; for ChromaDB add/upsert we use passage prefix
         prefixed = [f"passage: {text}" for text in input]
-        embeddings = self.model.encode(prefixed, normalize_embeddings=True)
+        with EMBEDDING_ENCODE_LATENCY.labels(kind="passage").time():
+            embeddings = self.model.encode(prefixed, normalize_embeddings=True)
         return [e.tolist() for e in embeddings]
 
+    def warmup(self, batch_size: int = EMBEDDING_WARMUP_BATCH) -> None:
+        """Encode dummy inputs so kernels, allocator and tokenizer are initialized."""
+        self.model.encode(["query: warmup"], normalize_embeddings=True)
+        self.model.encode(["passage: warmup"] * batch_size, normalize_embeddings=True, batch_size=batch_size)
+
+    def _encode_queries(self, texts: List[str]) -> List[List[float]]:
+        prefixed = [f"query: {text}" for text in texts]
+        embeddings = self.model.encode(prefixed, normalize_embeddings=True, batch_size=len(prefixed))
+        return [e.tolist() for e in embeddings]
+
+    def _get_shared(self, normalized: str) -> list[float] | None:
+        client = get_redis() if EMBEDDING_CACHE_REDIS else None
+        if not client:
+            return None
+        try:
+            raw = client.get(_embedding_redis_key(normalized, self.backend))
+        except redis.RedisError:
+            return None
+        if not raw:
+            return None
+        return np.frombuffer(base64.b64decode(raw), dtype=np.float32).tolist()
+
+    def _set_shared(self, normalized: str, embedding: list[float]) -> None:
+        client = get_redis() if EMBEDDING_CACHE_REDIS else None
+        if not client:
+            return
+        raw = base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode("ascii")
+        try:
+            client.setex(_embedding_redis_key(normalized, self.backend), EMBEDDING_CACHE_TTL_SECONDS, raw)
+        except redis.RedisError:
+            pass
+
+    def _get_cached(self, normalized: str) -> list[float] | None:
+        cached = self._query_cache.get(normalized)
+        if cached is not None:
+            EMBEDDING_CACHE_HITS.labels(tier="local").inc()
+            return list(cached)
+
+        shared = self._get_shared(normalized)
+        if shared is not None:
+            EMBEDDING_CACHE_HITS.labels(tier="redis").inc()
+            self._query_cache.set(normalized, shared)
+            return list(shared)
+        return None
+
     def encode_query(self, text: str) -> list[float]:
-        """Encode a search query with 'query: ' prefix for better retrieval."""
-        embedding = self.model.encode(f"query: {text}", normalize_embeddings=True)
-        return embedding.tolist()
+        """Encode a search query with 'query: ' prefix for better retrieval.
+
+        Results are cached by normalized text in-process and, with
+        EMBEDDING_CACHE_REDIS enabled, in Redis so all workers share them.
+        """
+        normalized = _normalize_query(text)
+        cached = self._get_cached(normalized)
+        if cached is not None:
+            return cached
+
+        EMBEDDING_CACHE_MISSES.inc()
+        start = time.perf_counter()
+        if self._batcher is not None:
+            embedding = self._batcher.submit(text)
+        else:
+            embedding = self._encode_queries([text])[0]
+        EMBEDDING_ENCODE_LATENCY.labels(kind="query").observe(time.perf_counter() - start)
+
+        self._query_cache.set(normalized, embedding)
+        self._set_shared(normalized, embedding)
+        return list(embedding)
+
+    def encode_queries(self, texts: List[str]) -> List[list[float]]:
+        """Like `encode_query` for many queries; cache misses are encoded in one batch."""
+        normalized = [_normalize_query(text) for text in texts]
+        embeddings: Dict[str, list[float]] = {}
+        misses: Dict[str, str] = {}
+        for text, key in zip(texts, normalized):
+            if key in embeddings or key in misses:
+                continue
+            cached = self._get_cached(key)
+            if cached is not None:
+                embeddings[key] = cached
+            else:
+                misses[key] = text
+
+        if misses:
+            EMBEDDING_CACHE_MISSES.inc(len(misses))
+            start = time.perf_counter()
+            encoded = self._encode_queries(list(misses.values()))
+            EMBEDDING_ENCODE_LATENCY.labels(kind="query").observe(time.perf_counter() - start)
+            for key, embedding in zip(misses, encoded):
+                self._query_cache.set(key, embedding)
+                self._set_shared(key, embedding)
+                embeddings[key] = embedding
+        return [list(embeddings[key]) for key in normalized]
 
 
 def _chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
@@ -71,6 +344,8 @@ def _load_documents() -> List[str]:
 
 def _build_client() -> chromadb.ClientAPI:
     if CHROMA_HTTP_HOST:
+        if "RAG_DATA_DIR" not in os.environ:
+            print(f"[RAG] RAG_DATA_DIR is not set; index files under {RAG_DATA_DIR} are lost on redeploy.")
         return chromadb.HttpClient(host=CHROMA_HTTP_HOST, port=CHROMA_HTTP_PORT)
     return chromadb.PersistentClient(path=DB_DIR)
 
@@ -79,58 +354,651 @@ def _should_reindex() -> bool:
     return os.getenv("CHROMA_REINDEX", "false").lower() == "true"
 
 
-def _seed_collection(collection: Collection, documents: List[str]):
-    if not documents:
-        return
-    ids = [f"doc_{i}" for i in range(len(documents))]
-    collection.add(documents=documents, ids=ids)
+def _chunk_id(text: str) -> str:
+    """Content-addressed id: identical chunks always map to the same id."""
+    return f"chunk_{hashlib.sha256(text.encode('utf-8')).hexdigest()[:24]}"
+
+
+def _iter_collection(
+    collection: Collection, include: List[str], page_size: int = 1000
+) -> Iterator[dict]:
+    """Page through a collection without loading it into memory at once."""
+    offset = 0
+    while True:
+        page = collection.get(include=include, limit=page_size, offset=offset)
+        if not page.get("ids"):
+            return
+        yield page
+        offset += len(page["ids"])
+
+
+def _existing_ids(collection: Collection, ids: List[str]) -> set[str]:
+    found: set[str] = set()
+    for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+        found.update(collection.get(ids=ids[i:i + UPSERT_BATCH_SIZE], include=[])["ids"])
+    return found
+
+
+def _new_bulk_embedder() -> BulkEmbedder:
+    return BulkEmbedder(BULK_EMBED_WORKERS, BULK_EMBED_THREADS, EMBEDDING_BACKEND, shard_size=UPSERT_BATCH_SIZE)
+
+
+def _add_chunks(
+    collection: Collection,
+    chunks: Dict[str, Tuple[str, str]],
+    embedder: BulkEmbedder | None = None,
+) -> int:
+    """Embed and store `{chunk_id: (text, source)}` entries that are not stored yet.
+
+    Pass a long-lived `embedder` to embed on its process pool regardless of size.
+    """
+    ids = list(chunks)
+    existing = _existing_ids(collection, ids)
+    missing = [cid for cid in ids if cid not in existing]
+    if embedder is not None and missing:
+        _bulk_add_chunks(collection, missing, chunks, embedder)
+        return len(missing)
+    if BULK_EMBED_WORKERS > 1 and len(missing) >= BULK_EMBED_MIN_CHUNKS:
+        with _new_bulk_embedder() as embedder:
+            _bulk_add_chunks(collection, missing, chunks, embedder)
+        return len(missing)
+    for i in range(0, len(missing), UPSERT_BATCH_SIZE):
+        batch = missing[i:i + UPSERT_BATCH_SIZE]
+        collection.upsert(
+            ids=batch,
+            documents=[chunks[cid][0] for cid in batch],
+            metadatas=[{"source": chunks[cid][1]} for cid in batch],
+        )
+    return len(missing)
+
+
+def _bulk_add_chunks(
+    collection: Collection,
+    ids: List[str],
+    chunks: Dict[str, Tuple[str, str]],
+    embedder: BulkEmbedder,
+) -> None:
+    """Embed `ids` on a process pool and upsert them with precomputed vectors."""
+    start = time.perf_counter()
+    texts = [chunks[cid][0] for cid in ids]
+    batch_ids: List[str] = []
+    batch_vectors: List[List[float]] = []
+    done = 0
+
+    def _flush() -> None:
+        collection.upsert(
+            ids=batch_ids,
+            embeddings=batch_vectors,
+            documents=[chunks[cid][0] for cid in batch_ids],
+            metadatas=[{"source": chunks[cid][1]} for cid in batch_ids],
+        )
+        batch_ids.clear()
+        batch_vectors.clear()
+
+    for vectors in embedder.embed(texts):
+        batch_ids.extend(ids[done:done + len(vectors)])
+        batch_vectors.extend(vectors)
+        done += len(vectors)
+        if len(batch_ids) >= BULK_UPSERT_BATCH_SIZE:
+            _flush()
+    if batch_ids:
+        _flush()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"[RAG Bulk] Embedded {len(ids)} chunks on {embedder.workers} workers x "
+        f"{embedder.threads} threads in {elapsed:.1f}s ({len(ids) / elapsed:.0f} chunks/s)."
+    )
+
+
+def _delete_ids(collection: Collection, ids: List[str]) -> None:
+    for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+        collection.delete(ids=ids[i:i + UPSERT_BATCH_SIZE])
+
+
+_RESULT_CACHE = LocalLRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+_VERSION_KEY = f"rag:collection_version:{COLLECTION_NAME}"
+_SERVING_KEY_PREFIX = f"rag:serving:{COLLECTION_NAME}:"
+_WORKER_ID = uuid.uuid4().hex
+
+
+def _collection_version() -> int | None:
+    """Version of the collection contents shared through Redis, or None without one.
+
+    Only a shared version lets every worker see the others' bumps, so without
+    Redis, or while it errors, cached retrieval results are bypassed.
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        return int(client.get(_VERSION_KEY) or 0)
+    except (redis.RedisError, ValueError):
+        return None
+
+
+def _bump_collection_version() -> None:
+    """Invalidate every cached retrieval result; call after the collection changes."""
+    _RESULT_CACHE.clear()
+    client = get_redis()
+    if client:
+        try:
+            version = int(client.incr(_VERSION_KEY))
+        except redis.RedisError as exc:
+            print(f"[RAG] Could not bump the shared collection version: {exc}")
+            return
+        if _RAG_INSTANCE is not None:
+            _RAG_INSTANCE._note_own_version(version)
+
+
+def _mirror_changes(collection: Collection, added: Iterable[str], removed: Iterable[str]) -> None:
+    """Apply one write to the serving vector store if it mirrors `collection`."""
+    instance = _RAG_INSTANCE
+    if instance is not None and instance.collection is collection:
+        instance.store.apply(list(added), list(removed))
+
+
+def _result_cache_key(text: str, top_k: int, version: int) -> str:
+    digest = hashlib.sha1(_normalize_query(text).encode("utf-8")).hexdigest()
+    return f"rag:results:{COLLECTION_NAME}:{version}:{top_k}:{digest}"
 
 
-def _rerank_chunks(query: str, documents: List[str], distances: List[float]) -> List[str]:
-    """Simple reranking based on keyword overlap + distance score.
+def _get_cached_results(key: str) -> List[str] | None:
+    cached = _RESULT_CACHE.get(key)
+    if cached is not None:
+        RAG_RESULT_CACHE_HITS.labels(tier="local").inc()
+        return list(cached)
+    client = get_redis() if RESULT_CACHE_REDIS else None
+    if client:
+        try:
+            raw = client.get(key)
+        except redis.RedisError:
+            raw = None
+        if raw:
+            chunks = json.loads(raw)
+            RAG_RESULT_CACHE_HITS.labels(tier="redis").inc()
+            _RESULT_CACHE.set(key, chunks)
+            return list(chunks)
+    RAG_RESULT_CACHE_MISSES.inc()
+    return None
+
+
+def _set_cached_results(key: str, chunks: List[str]) -> None:
+    _RESULT_CACHE.set(key, list(chunks))
+    client = get_redis() if RESULT_CACHE_REDIS else None
+    if client:
+        try:
+            client.setex(key, RESULT_CACHE_TTL_SECONDS, json.dumps(chunks, ensure_ascii=False))
+        except redis.RedisError:
+            pass
+
+
+def _new_dedup_index() -> SimHashIndex | None:
+    if not DEDUP_ENABLED:
+        return None
+    return SimHashIndex(max_distance=DEDUP_MAX_HAMMING, min_tokens=DEDUP_MIN_TOKENS)
+
+
+def _near_duplicates(chunks: Iterable[Tuple[str, str]], dedup: SimHashIndex | None) -> set[str]:
+    """Ids of `(chunk_id, text)` pairs that near-duplicate an indexed chunk.
+
+    Every other chunk is added to `dedup`, so repeats within `chunks` are
+    caught too. Chunks already in the index are kept (idempotent re-ingest).
+    """
+    if dedup is None:
+        return set()
+    dropped: set[str] = set()
+    for cid, text in chunks:
+        if cid in dedup:
+            continue
+        tf = Counter(tokenize(text))
+        if dedup.find(tf) is not None:
+            dropped.add(cid)
+        else:
+            dedup.add(cid, tf)
+    if dropped:
+        RAG_NEAR_DUPLICATES.inc(len(dropped))
+    return dropped
+
+
+# Serializes writes to the collection, the manifest and the reindex flip
+_MANIFEST_LOCK = threading.RLock()
+
+
+def _load_manifest() -> dict:
+    try:
+        manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("collection") != COLLECTION_NAME or manifest.get("model") != EMBEDDING_MODEL_NAME:
+        return {}
+    return manifest
+
+
+def _save_manifest(files: dict) -> None:
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per writer: other workers may be saving the same file
+    tmp_path = MANIFEST_PATH.with_name(f"{MANIFEST_PATH.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(
+        json.dumps({"collection": COLLECTION_NAME, "model": EMBEDDING_MODEL_NAME, "files": files}),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _file_chunks(path: Path) -> Dict[str, str]:
+    content = path.read_text(encoding="utf-8").strip()
+    if not content:
+        return {}
+    return {_chunk_id(chunk): chunk for chunk in _chunk_text(content)}
+
+
+def _adopt_legacy_chunks(collection: Collection, chunks: Dict[str, Tuple[str, str]]) -> None:
+    """Re-key chunks stored under positional/timestamp ids to content ids.
+
+    Stored embeddings are copied, so upgrading an existing collection does
+    not re-embed the corpus.
+    """
+    by_id: Dict[str, List[str]] = {}
+    for page in _iter_collection(collection, include=["documents"]):
+        for legacy_id, doc in zip(page["ids"], page["documents"]):
+            if doc is None or legacy_id.startswith("chunk_"):
+                continue
+            by_id.setdefault(_chunk_id(doc), []).append(legacy_id)
+
+    adopt = [cid for cid in chunks if cid in by_id]
+    for i in range(0, len(adopt), UPSERT_BATCH_SIZE):
+        batch = adopt[i:i + UPSERT_BATCH_SIZE]
+        legacy = collection.get(ids=[by_id[cid][0] for cid in batch], include=["embeddings"])
+        embedding_by_legacy = dict(zip(legacy["ids"], legacy["embeddings"]))
+        collection.upsert(
+            ids=batch,
+            embeddings=[embedding_by_legacy[by_id[cid][0]] for cid in batch],
+            documents=[chunks[cid][0] for cid in batch],
+            metadatas=[{"source": chunks[cid][1]} for cid in batch],
+        )
+        _delete_ids(collection, [legacy_id for cid in batch for legacy_id in by_id[cid]])
+    if adopt:
+        print(f"[RAG Sync] Re-keyed {len(adopt)} legacy chunks to content ids.")
+
+
+def _sync_documents(
+    collection: Collection,
+    full: bool = False,
+    dedup: SimHashIndex | None = None,
+    lexical: BM25Index | None = None,
+) -> None:
+    """Bring the collection in line with DOCS_DIR, embedding only new chunks.
+
+    Unchanged files (same hash as in the manifest) are not even re-chunked.
+    With `full=True` every file is re-chunked and any stored id that does not
+    belong to a current file is deleted. New chunks that near-duplicate an
+    unchanged chunk (looked up in `lexical`) or an earlier new one are skipped.
+    """
+    with _MANIFEST_LOCK:
+        manifest = _load_manifest() if not full else {}
+        if collection.count() == 0:
+            manifest = {}
+        old_files = manifest.get("files", {})
+
+        files: dict = {}
+        current_ids: set[str] = set()
+        pending: Dict[str, Tuple[str, str]] = {}
+        changed: List[str] = []
+        paths = sorted(DOCS_DIR.glob("*.txt")) if DOCS_DIR.exists() else []
+        for path in paths:
+            digest = hashlib.sha256(path.read_bytes()).hexdigest()
+            entry = old_files.get(path.name)
+            if entry and entry["sha256"] == digest:
+                files[path.name] = entry
+                current_ids.update(entry["chunk_ids"])
+                continue
+            chunks = _file_chunks(path)
+            for cid, text in chunks.items():
+                pending.setdefault(cid, (text, path.name))
+            files[path.name] = {"sha256": digest, "chunk_ids": sorted(chunks)}
+            changed.append(path.name)
+
+        if dedup is not None:
+            if lexical is not None:
+                for cid in current_ids:
+                    tf = lexical.term_freqs.get(cid)
+                    if tf:
+                        dedup.add(cid, tf)
+            dropped = _near_duplicates(((cid, text) for cid, (text, _) in pending.items()), dedup)
+            for cid in dropped:
+                del pending[cid]
+            for name in changed:
+                files[name]["chunk_ids"] = [cid for cid in files[name]["chunk_ids"] if cid not in dropped]
+        for name in changed:
+            current_ids.update(files[name]["chunk_ids"])
+
+        if not manifest and pending and collection.count() > 0:
+            _adopt_legacy_chunks(collection, pending)
+
+        added = _add_chunks(collection, pending) if pending else 0
+
+        if full:
+            stale = [
+                cid
+                for page in _iter_collection(collection, include=[])
+                for cid in page["ids"]
+                if cid not in current_ids
+            ]
+        else:
+            previous_ids = {cid for entry in old_files.values() for cid in entry["chunk_ids"]}
+            stale = sorted(previous_ids - current_ids)
+        _delete_ids(collection, stale)
+
+        _save_manifest(files)
+        if added or stale:
+            _bump_collection_version()
+        print(f"[RAG Sync] {len(files)} files, {added} chunks embedded, {len(stale)} removed.")
+
+
+def _ingest_file(
+    collection: Collection,
+    path: Path,
+    lexical: BM25Index | None = None,
+    dedup: SimHashIndex | None = None,
+) -> int:
+    """Ingest (or re-ingest) one DOCS_DIR file and record it in the manifest."""
+    with _MANIFEST_LOCK:
+        manifest = _load_manifest()
+        files = manifest.get("files", {})
+        chunks = _file_chunks(path)
+
+        previous = set(files.get(path.name, {}).get("chunk_ids", []))
+        still_used = {cid for name, entry in files.items() if name != path.name for cid in entry["chunk_ids"]}
+        stale = sorted(previous - set(chunks) - still_used)
+        if dedup is not None:
+            # The file's outdated chunks must not suppress their own revisions
+            dedup.remove(stale)
+            for cid in _near_duplicates(chunks.items(), dedup):
+                del chunks[cid]
+        _add_chunks(collection, {cid: (text, path.name) for cid, text in chunks.items()})
+        _delete_ids(collection, stale)
+        _mirror_changes(collection, chunks, stale)
+        if lexical is not None:
+            lexical.add(chunks.items())
+            lexical.remove(stale)
+            lexical.save_soon(LEXICAL_SAVE_DELAY_SECONDS)
+
+        files[path.name] = {
+            "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+            "chunk_ids": sorted(chunks),
+        }
+        _save_manifest(files)
+        _bump_collection_version()
+        return len(chunks)
+
+
+def _ingest_stream(
+    collection: Collection,
+    lexical: BM25Index,
+    segments: Iterable[str],
+    path: Path,
+    header: str = "",
+    progress: Callable[[int, int], None] | None = None,
+    dedup: SimHashIndex | None = None,
+) -> int:
+    """Write `segments` (e.g. PDF pages) to `path` while chunking and embedding them.
+
+    Only a window of text and one upsert batch are held in memory. The last
+    chunk of every window is carried over so chunks are not cut at window
+    boundaries. `progress(segments_done, chunks_done)` is called per segment.
+
+    The text goes to a hidden temp file that replaces `path` only once every
+    chunk is stored, so DOCS_DIR never holds a partial file. On failure, or
+    when no text was extracted, the temp file and the chunks stored so far
+    are dropped.
+    """
+    if dedup is not None:
+        with _MANIFEST_LOCK:
+            files = _load_manifest().get("files", {})
+            still_used = {cid for name, entry in files.items() if name != path.name for cid in entry["chunk_ids"]}
+            dedup.remove(set(files.get(path.name, {}).get("chunk_ids", [])) - still_used)
+
+    chunk_ids: List[str] = []
+    pending: Dict[str, Tuple[str, str]] = {}
+
+    def _flush() -> None:
+        _add_chunks(collection, pending)
+        _mirror_changes(collection, pending, [])
+        lexical.add((cid, text) for cid, (text, _) in pending.items())
+        pending.clear()
+
+    def _queue(chunks: List[str]) -> None:
+        for chunk in chunks:
+            cid = _chunk_id(chunk)
+            if cid not in pending and not _near_duplicates([(cid, chunk)], dedup):
+                chunk_ids.append(cid)
+                pending[cid] = (chunk, path.name)
+        if len(pending) >= UPSERT_BATCH_SIZE:
+            _flush()
+
+    def _discard() -> None:
+        tmp_path.unlink(missing_ok=True)
+        with _MANIFEST_LOCK:
+            files = _load_manifest().get("files", {})
+            used = {cid for entry in files.values() for cid in entry["chunk_ids"]}
+            orphans = sorted(set(chunk_ids) - used)
+            _delete_ids(collection, orphans)
+            _mirror_changes(collection, [], orphans)
+            lexical.remove(orphans)
+            if dedup is not None:
+                dedup.remove(orphans)
+
+    # Hidden and not *.txt, so a boot sync never picks up a half-written file
+    tmp_path = path.with_name(f".{path.name}.part")
+    buffer = header
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write(header)
+            for done, segment in enumerate(segments, start=1):
+                if segment:
+                    out.write(segment + "\n\n")
+                    buffer += segment + "\n\n"
+                if len(buffer) >= STREAM_WINDOW_CHARS:
+                    chunks = _chunk_text(buffer)
+                    _queue(chunks[:-1])
+                    buffer = chunks[-1]
+                if progress:
+                    progress(done, len(chunk_ids))
+        if buffer.strip() != header.strip():
+            _queue(_chunk_text(buffer.strip()))
+        _flush()
+    except BaseException:
+        pending.clear()
+        _discard()
+        raise
+    if not chunk_ids:
+        _discard()
+        return 0
+    lexical.save_soon(LEXICAL_SAVE_DELAY_SECONDS)
+
+    with _MANIFEST_LOCK:
+        os.replace(tmp_path, path)
+        files = _load_manifest().get("files", {})
+        previous = set(files.get(path.name, {}).get("chunk_ids", []))
+        still_used = {cid for name, entry in files.items() if name != path.name for cid in entry["chunk_ids"]}
+        stale = sorted(previous - set(chunk_ids) - still_used)
+        _delete_ids(collection, stale)
+        _mirror_changes(collection, [], stale)
+        lexical.remove(stale)
+        files[path.name] = {
+            "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+            "chunk_ids": sorted(set(chunk_ids)),
+        }
+        _save_manifest(files)
+    _bump_collection_version()
+    return len(set(chunk_ids))
+
+
+def _sync_lexical_index(lexical: BM25Index, collection: Collection) -> None:
+    """Reconcile a loaded BM25 index with the collection's ids."""
+    stored = {cid for page in _iter_collection(collection, include=[]) for cid in page["ids"]}
+    indexed = set(lexical.ids())
+    extra = indexed - stored
+    missing = sorted(stored - indexed)
+    lexical.remove(extra)
+    for i in range(0, len(missing), UPSERT_BATCH_SIZE):
+        page = collection.get(ids=missing[i:i + UPSERT_BATCH_SIZE], include=["documents"])
+        lexical.add((cid, doc) for cid, doc in zip(page["ids"], page["documents"]) if doc)
+    if extra or missing:
+        lexical.save()
+        print(f"[RAG Lexical] Indexed {len(missing)} chunks, dropped {len(extra)}.")
+
+
+def _rerank_chunks(
+    query: str,
+    ids: List[str],
+    documents: List[str],
+    distances: List[float],
+    lexical: BM25Index,
+    vector_weight: float = RERANK_VECTOR_WEIGHT,
+) -> List[str]:
+    """Rerank candidates by embedding similarity blended with BM25.
     Returns documents sorted by combined relevance.
     """
     if not documents:
         return []
 
-    query_words = set(re.findall(r'\w{3,}', query.lower()))
+    # Chunks written by another process are not in this worker's index yet
+    unknown = [(cid, doc) for cid, doc in zip(ids, documents) if doc and cid not in lexical]
+    if unknown:
+        lexical.add(unknown)
+
+    # Skip very short or garbage chunks
+    char_lens = np.array([lexical.char_lens.get(cid, 0) for cid in ids])
+    keep = char_lens >= 50
+
+    # ChromaDB cosine distance (lower = more similar, range 0-2)
+    # Convert to similarity (0 to 1)
+    similarity = np.clip(1 - np.asarray(distances, dtype=np.float32), 0, None)
+    lexical_scores = normalize_scores(lexical.score(query, ids))
+
+    combined = vector_weight * similarity + (1 - vector_weight) * lexical_scores
+    order = np.argsort(-combined, kind="stable")
+    return [documents[i] for i in order if keep[i]]
+
+
+_HNSW_KEYS = {"m": "hnsw:M", "construction_ef": "hnsw:construction_ef", "search_ef": "hnsw:search_ef"}
+_CHROMA_HNSW_DEFAULTS = {"m": 16, "construction_ef": 100, "search_ef": 10}
+# Parameters for collections created from now on; the admin endpoint changes them
+_HNSW_PARAMS = {"m": HNSW_M, "construction_ef": HNSW_CONSTRUCTION_EF, "search_ef": HNSW_SEARCH_EF}
+
+
+def _collection_metadata(model: str = EMBEDDING_MODEL_NAME) -> dict:
+    """Metadata of a new chunk collection: cosine space, HNSW parameters, model marker."""
+    metadata = {"hnsw:space": "cosine", MODEL_META_KEY: model}
+    metadata.update({_HNSW_KEYS[key]: value for key, value in _HNSW_PARAMS.items()})
+    return metadata
+
+
+def hnsw_params() -> dict:
+    """HNSW parameters of the live collection and the ones the next reindex uses."""
+    collection = _RAG_INSTANCE.collection if _RAG_INSTANCE is not None else None
+    metadata = (collection.metadata or {}) if collection is not None else {}
+    return {
+        "collection": collection.name if collection is not None else None,
+        "live": {
+            key: metadata.get(meta_key, _CHROMA_HNSW_DEFAULTS[key]) for key, meta_key in _HNSW_KEYS.items()
+        },
+        "configured": dict(_HNSW_PARAMS),
+    }
 
-    scored = []
-    for doc, dist in zip(documents, distances):
-        # Skip very short or garbage chunks
-        if len(doc.strip()) < 50:
+
+def set_hnsw_params(m: int | None = None, construction_ef: int | None = None, search_ef: int | None = None) -> dict:
+    """Set HNSW parameters for new collections in this process; a reindex applies them."""
+    for key, value in (("m", m), ("construction_ef", construction_ef), ("search_ef", search_ef)):
+        if value is None:
             continue
+        if value < 1:
+            raise ValueError(f"{key} must be positive")
+        _HNSW_PARAMS[key] = value
+    return dict(_HNSW_PARAMS)
+
+
+def _active_collection_name(client: chromadb.ClientAPI) -> str:
+    """Physical collection currently serving COLLECTION_NAME (see `_set_active_collection`)."""
+    try:
+        alias = client.get_collection(name=ALIAS_COLLECTION_NAME)
+    except Exception:
+        return COLLECTION_NAME
+    return (alias.metadata or {}).get("active", COLLECTION_NAME)
+
+
+def _set_active_collection(client: chromadb.ClientAPI, name: str) -> None:
+    """Point COLLECTION_NAME at `name`.
+
+    The pointer is the metadata of a small alias collection stored in Chroma
+    next to the data, so every worker sees the flip, and a single metadata
+    write makes it atomic.
+    """
+    alias = client.get_or_create_collection(name=ALIAS_COLLECTION_NAME, metadata={"active": name})
+    alias.modify(metadata={"active": name})
+
+
+def _register_serving(name: str) -> None:
+    """Record in Redis that this worker serves `name`; expires unless renewed."""
+    client = get_redis()
+    if client:
+        try:
+            client.setex(_SERVING_KEY_PREFIX + _WORKER_ID, int(SERVING_HEARTBEAT_SECONDS * 3), name)
+        except redis.RedisError:
+            pass
 
-        doc_words = set(re.findall(r'\w{3,}', doc.lower()))
-        # Keyword overlap ratio (0 to 1)
-        overlap = len(query_words & doc_words) / max(len(query_words), 1)
 
-        # ChromaDB cosine distance (lower = more similar, range 0-2)
-        # Convert to similarity (0 to 1)
-        similarity = max(0, 1 - dist)
+def _served_collections() -> set[str] | None:
+    """Collections some worker registered as serving, or None when Redis cannot tell."""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        keys = list(client.scan_iter(match=_SERVING_KEY_PREFIX + "*"))
+        return {name for name in client.mget(keys) if name} if keys else set()
+    except redis.RedisError:
+        return None
 
-        # Combined score: 70% embedding similarity + 30% keyword overlap
-        combined = 0.7 * similarity + 0.3 * overlap
-        scored.append((doc, combined))
 
-    # Sort by combined score descending
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return [doc for doc, _ in scored]
+def _load_migration_checkpoint(source: str, target: str) -> int:
+    try:
+        checkpoint = json.loads(MIGRATION_CHECKPOINT_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get("source") != source or checkpoint.get("target") != target:
+        return 0
+    return int(checkpoint.get("offset", 0))
+
+
+def _save_migration_checkpoint(source: str, target: str, offset: int) -> None:
+    MIGRATION_CHECKPOINT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MIGRATION_CHECKPOINT_PATH.with_name(f"{MIGRATION_CHECKPOINT_PATH.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps({"source": source, "target": target, "offset": offset}), encoding="utf-8")
+    os.replace(tmp_path, MIGRATION_CHECKPOINT_PATH)
 
 
 def _migrate_collection_if_needed(client: chromadb.ClientAPI, embedding_fn: E5EmbeddingFunction) -> Collection:
     """Auto-migrate: if the collection was built with a different model, re-embed all documents.
-    Uses a marker file to ensure migration only runs ONCE.
+
+    Chunks are copied page by page into a new collection named after the
+    model, which is swapped in by `_set_active_collection` only once it is
+    complete. The old collection keeps its data until then. A checkpoint
+    records the last copied page so a restarted migration resumes there, and
+    chunks already in the target are never re-embedded.
+    Uses a marker file to ensure an untagged collection is only checked ONCE.
     """
     # Check marker file — if it exists with current model name, skip migration entirely
-    marker_path = Path("/tmp/.rag_migration_done")
+    marker_path = MIGRATION_MARKER_PATH
     if marker_path.exists():
         stored = marker_path.read_text().strip()
         if stored == EMBEDDING_MODEL_NAME:
             return None
 
+    source_name = _active_collection_name(client)
     try:
-        old_collection = client.get_collection(name=COLLECTION_NAME)
+        old_collection = client.get_collection(name=source_name)
     except Exception:
         # Collection doesn't exist, nothing to migrate
         marker_path.write_text(EMBEDDING_MODEL_NAME)
@@ -145,58 +1013,211 @@ def _migrate_collection_if_needed(client: chromadb.ClientAPI, embedding_fn: E5Em
         marker_path.write_text(EMBEDDING_MODEL_NAME)
         return None
 
-    # If metadata key is missing but collection has many documents, 
+    # If metadata key is missing but collection has many documents,
     # it was likely already migrated — just update metadata, don't delete!
     if stored_model is None and old_collection.count() > 10:
-        print(f"[RAG Migration] Collection has {old_collection.count()} docs but no model tag. Tagging as current model (skipping re-embed).")
+        print(
+            f"[RAG Migration] Collection has {old_collection.count()} docs but no model tag. "
+            "Tagging as current model (skipping re-embed)."
+        )
         # We can't update metadata on existing collection easily in ChromaDB,
         # so just write the marker file to prevent future migration attempts
         marker_path.write_text(EMBEDDING_MODEL_NAME)
         return None
 
     # Only migrate if explicitly a DIFFERENT model (not just missing metadata)
-    if stored_model is not None and stored_model != EMBEDDING_MODEL_NAME:
-        print(f"[RAG Migration] Model changed: '{stored_model}' → '{EMBEDDING_MODEL_NAME}'")
-        print(f"[RAG Migration] Exporting {old_collection.count()} documents...")
-
-        # Export all documents
-        all_data = old_collection.get(include=["documents"])
-        all_docs = all_data.get("documents", [])
-        all_ids = all_data.get("ids", [])
-
-        if not all_docs:
-            print("[RAG Migration] No documents to migrate.")
-            client.delete_collection(COLLECTION_NAME)
-            marker_path.write_text(EMBEDDING_MODEL_NAME)
-            return None
+    if stored_model is None:
+        marker_path.write_text(EMBEDDING_MODEL_NAME)
+        return None
 
-        print(f"[RAG Migration] Exported {len(all_docs)} chunks. Recreating collection...")
+    target_name = f"{COLLECTION_NAME}__{re.sub(r'[^A-Za-z0-9_-]+', '-', EMBEDDING_MODEL_NAME)}"
+    total = old_collection.count()
+    print(f"[RAG Migration] Model changed: '{stored_model}' → '{EMBEDDING_MODEL_NAME}'")
+    new_collection = client.get_or_create_collection(
+        name=target_name,
+        embedding_function=embedding_fn,
+        metadata=_collection_metadata(),
+    )
+
+    offset = _load_migration_checkpoint(source_name, target_name)
+    if offset:
+        print(f"[RAG Migration] Resuming at {offset}/{total} chunks.")
+    embedder = _new_bulk_embedder() if BULK_EMBED_WORKERS > 1 else None
+    try:
+        while True:
+            page = old_collection.get(
+                include=["documents", "metadatas"], limit=MIGRATION_PAGE_SIZE, offset=offset
+            )
+            if not page.get("ids"):
+                break
+            chunks = {
+                cid: (doc, (metadata or {}).get("source", ""))
+                for cid, doc, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+                if doc
+            }
+            _add_chunks(new_collection, chunks, embedder)
+            offset += len(page["ids"])
+            _save_migration_checkpoint(source_name, target_name, offset)
+            print(f"[RAG Migration] Re-embedded {offset}/{total} chunks...")
+    finally:
+        if embedder is not None:
+            embedder.close()
+
+    # Swap in the complete collection, then drop the old one
+    _set_active_collection(client, target_name)
+    MIGRATION_CHECKPOINT_PATH.unlink(missing_ok=True)
+    if source_name != target_name:
+        client.delete_collection(source_name)
+    print(f"[RAG Migration] ✅ Migration complete! {new_collection.count()} chunks in {target_name}.")
+    marker_path.write_text(EMBEDDING_MODEL_NAME)
+    _bump_collection_version()
+    return new_collection
 
-        # Delete old collection
-        client.delete_collection(COLLECTION_NAME)
 
-        # Create new collection with new embedding function
-        new_collection = client.create_collection(
-            name=COLLECTION_NAME,
-            embedding_function=embedding_fn,
-            metadata={"hnsw:space": "cosine", MODEL_META_KEY: EMBEDDING_MODEL_NAME},
+def _copy_embeddings(source: Collection, target: Collection, chunks: Dict[str, Tuple[str, str]]) -> None:
+    """Upsert into `target` the chunks whose vectors `source` already stores."""
+    ids = list(chunks)
+    for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+        stored = source.get(ids=ids[i:i + UPSERT_BATCH_SIZE], include=["embeddings"])
+        if not stored["ids"]:
+            continue
+        target.upsert(
+            ids=stored["ids"],
+            embeddings=stored["embeddings"],
+            documents=[chunks[cid][0] for cid in stored["ids"]],
+            metadatas=[{"source": chunks[cid][1]} for cid in stored["ids"]],
         )
 
-        # Re-add documents in batches
-        batch_size = 100
-        for i in range(0, len(all_docs), batch_size):
-            batch_docs = all_docs[i:i + batch_size]
-            batch_ids = all_ids[i:i + batch_size]
-            new_collection.add(documents=batch_docs, ids=batch_ids)
-            print(f"[RAG Migration] Re-embedded {min(i + batch_size, len(all_docs))}/{len(all_docs)} chunks...")
 
-        print(f"[RAG Migration] ✅ Migration complete! {len(all_docs)} chunks re-embedded.")
-        marker_path.write_text(EMBEDDING_MODEL_NAME)
-        return new_collection
+def _fill_shadow_file(
+    live: Collection,
+    shadow: Collection,
+    path: Path,
+    lexical: BM25Index,
+    dedup: SimHashIndex | None,
+    reembed: bool,
+    embedder: BulkEmbedder | None,
+) -> dict:
+    """Chunk one DOCS_DIR file into a shadow collection; returns its manifest entry."""
+    chunks = _file_chunks(path)
+    for cid in _near_duplicates(chunks.items(), dedup):
+        del chunks[cid]
+    entries = {cid: (text, path.name) for cid, text in chunks.items()}
+    if not reembed:
+        _copy_embeddings(live, shadow, entries)
+    _add_chunks(shadow, entries, embedder)
+    lexical.add(chunks.items())
+    return {"sha256": hashlib.sha256(path.read_bytes()).hexdigest(), "chunk_ids": sorted(chunks)}
+
+
+def _carry_over_chunks(
+    live: Collection,
+    shadow: Collection,
+    skip: set[str],
+    lexical: BM25Index,
+    dedup: SimHashIndex | None,
+    reembed: bool,
+    embedder: BulkEmbedder | None,
+) -> set[str]:
+    """Copy into `shadow` the live chunks no DOCS_DIR file produced, e.g. from `add_documents`.
+
+    `skip` holds every file-backed id, live or shadow. Runs under the ingest
+    lock, so writes made while the shadow was built are included.
+    """
+    extra = [cid for page in _iter_collection(live, include=[]) for cid in page["ids"] if cid not in skip]
+    carried: set[str] = set()
+    for i in range(0, len(extra), UPSERT_BATCH_SIZE):
+        page = live.get(ids=extra[i:i + UPSERT_BATCH_SIZE], include=["documents", "metadatas"])
+        entries = {
+            cid: (doc, (meta or {}).get("source", "text"))
+            for cid, doc, meta in zip(page["ids"], page["documents"], page["metadatas"])
+            if doc
+        }
+        for cid in _near_duplicates(((cid, text) for cid, (text, _) in entries.items()), dedup):
+            del entries[cid]
+        if not reembed:
+            _copy_embeddings(live, shadow, entries)
+        _add_chunks(shadow, entries, embedder)
+        lexical.add((cid, text) for cid, (text, _) in entries.items())
+        carried.update(entries)
+    return carried
+
+
+def _gc_collections(client: chromadb.ClientAPI, keep: List[str]) -> None:
+    """Delete physical versions of COLLECTION_NAME other than `keep` that no worker serves."""
+    served = _served_collections()
+    if served is None:
+        print("[RAG Reindex] Keeping old collections: without Redis other workers' collections are unknown.")
+        return
+    keep = set(keep) | served
+    for item in client.list_collections():
+        # Chroma returns names or Collection objects depending on the version
+        name = getattr(item, "name", item)
+        if name in keep or name == ALIAS_COLLECTION_NAME:
+            continue
+        if name == COLLECTION_NAME or name.startswith(f"{COLLECTION_NAME}__"):
+            client.delete_collection(name)
+            print(f"[RAG Reindex] Dropped old collection {name}.")
+
+
+def _build_vector_store(
+    collection: Collection, path: Path = NUMPY_STORE_PATH
+) -> ChromaVectorStore | NumpyVectorStore:
+    if VECTOR_STORE == "chroma":
+        return ChromaVectorStore(collection)
+    if VECTOR_STORE == "numpy":
+        if NUMPY_STORE_DTYPE == "pq":
+            store = PQVectorStore(
+                path, subvectors=PQ_SUBVECTORS, refine=PQ_REFINE, min_train_size=PQ_MIN_TRAIN_SIZE
+            )
+        else:
+            store = NumpyVectorStore(path, dtype=NUMPY_STORE_DTYPE)
+        store.load()
+        store.sync(collection)
+        return store
+    raise ValueError(f"Unknown RAG_VECTOR_STORE: {VECTOR_STORE}")
 
-    # Default: no migration needed
-    marker_path.write_text(EMBEDDING_MODEL_NAME)
-    return None
+
+def _rebuild_vector_store(collection: Collection) -> NumpyVectorStore:
+    """Fresh mirror of `collection` under a scratch prefix; `move_to` publishes it.
+
+    Used after a re-embedding reindex: chunk ids are content hashes, so a
+    plain sync would keep every old vector.
+    """
+    scratch = Path(f"{NUMPY_STORE_PATH}.rebuild")
+    for leftover in scratch.parent.glob(f"{scratch.name}.*"):
+        leftover.unlink()
+    return _build_vector_store(collection, scratch)
+
+
+_LEXICAL_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-lexical")
+
+_STARTUP_TIMINGS: Dict[str, float] = {}
+
+
+@contextmanager
+def _startup_phase(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _STARTUP_TIMINGS[name] = round(elapsed, 3)
+        RAG_STARTUP_PHASE_SECONDS.labels(phase=name).set(elapsed)
+        print(f"[RAG Startup] {name}: {elapsed:.2f}s")
+
+
+@contextmanager
+def _stage(name: str, timings: Dict[str, float] | None = None) -> Iterator[None]:
+    """Time a retrieval stage into RAG_STAGE_LATENCY and, if given, `timings` (seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        RAG_STAGE_LATENCY.labels(stage=name).observe(elapsed)
+        if timings is not None:
+            timings[name] = elapsed
 
 
 @dataclass
@@ -204,110 +1225,516 @@ class StartupRAG:
     client: chromadb.ClientAPI
     collection: Collection
     embedding_fn: E5EmbeddingFunction
+    lexical: BM25Index = field(default_factory=BM25Index)
+    dedup: SimHashIndex | None = field(default_factory=_new_dedup_index)
+    store: ChromaVectorStore | NumpyVectorStore | None = None
+    _store_version: int | None = None
+    _store_sync_lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        if self.store is None:
+            self.store = ChromaVectorStore(self.collection)
 
     @classmethod
     def build(cls) -> "StartupRAG":
-        documents = _load_documents()
-
-        embedding_fn = E5EmbeddingFunction()
-        client = _build_client()
-
-        # Check if migration is needed (model changed)
-        migrated = _migrate_collection_if_needed(client, embedding_fn)
-        if migrated:
-            return cls(client=client, collection=migrated, embedding_fn=embedding_fn)
-
-        # Always recreate collection to apply new embeddings
-        if _should_reindex():
-            try:
-                client.delete_collection(COLLECTION_NAME)
-            except Exception:
-                pass
-            collection = client.create_collection(
-                name=COLLECTION_NAME,
-                embedding_function=embedding_fn,
-                metadata={"hnsw:space": "cosine", MODEL_META_KEY: EMBEDDING_MODEL_NAME},
-            )
-            if documents:
-                _seed_collection(collection, documents)
-            return cls(client=client, collection=collection, embedding_fn=embedding_fn)
-
-        # Try to get existing collection first
-        try:
-            collection = client.get_collection(
-                name=COLLECTION_NAME,
-                embedding_function=embedding_fn,
-            )
-            # If it's empty and we have docs, seed it anyway
-            if documents and collection.count() == 0:
-                print(f"Collection {COLLECTION_NAME} is empty, seeding...")
-                _seed_collection(collection, documents)
-        except Exception:
-            # Create if doesn't exist
-            collection = client.create_collection(
-                name=COLLECTION_NAME,
-                embedding_function=embedding_fn,
-                metadata={"hnsw:space": "cosine", MODEL_META_KEY: EMBEDDING_MODEL_NAME},
-            )
-            if documents:
-                _seed_collection(collection, documents)
-
-        return cls(client=client, collection=collection, embedding_fn=embedding_fn)
-
-    def query(self, text: str, top_k: int = 3) -> List[str]:
-        """Query with E5 query prefix and reranking."""
-        # Fetch more candidates for reranking
-        fetch_k = min(top_k * 3, 15)
-        query_embedding = self.embedding_fn.encode_query(text)
-        result = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=fetch_k,
-            include=["documents", "distances"],
+        with _startup_phase("model_load"):
+            embedding_fn = E5EmbeddingFunction()
+        if EMBEDDING_WARMUP:
+            with _startup_phase("warmup"):
+                embedding_fn.warmup()
+        with _startup_phase("client"):
+            client = _build_client()
+
+        with _startup_phase("collection"):
+            # Check if migration is needed (model changed)
+            collection = _migrate_collection_if_needed(client, embedding_fn)
+            if collection is None:
+                name = _active_collection_name(client)
+                try:
+                    collection = client.get_collection(
+                        name=name,
+                        embedding_function=embedding_fn,
+                    )
+                except Exception:
+                    collection = client.create_collection(
+                        name=name,
+                        embedding_function=embedding_fn,
+                        metadata=_collection_metadata(),
+                    )
+
+        with _startup_phase("sync"):
+            lexical = BM25Index(LEXICAL_INDEX_PATH)
+            lexical.load()
+            # Only new or changed chunks are embedded; CHROMA_REINDEX schedules a
+            # blue/green rebuild once the live collection is serving.
+            _sync_documents(collection, dedup=_new_dedup_index(), lexical=lexical)
+
+        with _startup_phase("lexical"):
+            _sync_lexical_index(lexical, collection)
+            dedup = _new_dedup_index()
+            if dedup is not None:
+                for cid, tf in lexical.term_freqs.items():
+                    dedup.add(cid, tf)
+
+        with _startup_phase("vector_store"):
+            version = _collection_version()
+            store = _build_vector_store(collection)
+        return cls(
+            client=client,
+            collection=collection,
+            embedding_fn=embedding_fn,
+            lexical=lexical,
+            dedup=dedup,
+            store=store,
+            _store_version=version,
         )
-        docs = result.get("documents", [[]])[0]
-        distances = result.get("distances", [[]])[0]
 
-        # Rerank and return top_k
-        reranked = _rerank_chunks(text, docs, distances)
-        return reranked[:top_k]
+    def _note_own_version(self, version: int) -> None:
+        """Record a bump by this process; its writes are already in the mirror."""
+        if self._store_version == version - 1:
+            self._store_version = version
 
-    def add_documents(self, documents: List[str]):
-        if not documents:
+    def _refresh_store(self) -> None:
+        """Catch up in the background once another worker changed the collection.
+
+        This process's own writes reach the mirror through `_mirror_changes`;
+        only a shared version that moved past them needs the alias re-read
+        and a full reconcile. Queries keep using the current state meanwhile.
+        """
+        version = _collection_version()
+        if version is None or version == self._store_version or not self._store_sync_lock.acquire(blocking=False):
             return
+        threading.Thread(target=self._catch_up, args=(version,), name="rag-store-sync", daemon=True).start()
+
+    def _catch_up(self, version: int | None) -> None:
+        """Follow a reindex flip and, for a moved `version`, reconcile the mirror.
 
-        # We need unique IDs. Simplest way is a hash or timestamp + index.
-        import time
-        import hashlib
+        Called holding `_store_sync_lock`; the heartbeat passes no version.
+        """
+        try:
+            followed = self._follow_alias()
+            if version is not None:
+                if not followed and isinstance(self.store, NumpyVectorStore):
+                    self.store.sync(self.collection)
+                self._store_version = version
+        except Exception as exc:
+            print(f"[RAG] Catching up with the collection failed: {exc}")
+        finally:
+            self._store_sync_lock.release()
+
+    def _follow_alias(self) -> bool:
+        """Switch to the collection the alias names if another worker's reindex flipped it."""
+        if reindex_running():
+            # This worker is the one flipping; it switches itself
+            return False
+        name = _active_collection_name(self.client)
+        if name == self.collection.name:
+            return False
+        collection = self.client.get_collection(name=name, embedding_function=self.embedding_fn)
+        lexical = BM25Index(LEXICAL_INDEX_PATH)
+        lexical.load()
+        _sync_lexical_index(lexical, collection)
+        dedup = _new_dedup_index()
+        if dedup is not None:
+            for cid, tf in lexical.term_freqs.items():
+                dedup.add(cid, tf)
+        if isinstance(self.store, NumpyVectorStore):
+            # The reindexing worker may have rebuilt the mirror files
+            self.store.load()
+        self.store.sync(collection)
+        with _MANIFEST_LOCK:
+            self.collection, self.lexical, self.dedup = collection, lexical, dedup
+        _register_serving(name)
+        print(f"[RAG] Following the alias to {name}.")
+        return True
+
+    def query(self, text: str, top_k: int = 3, timings: Dict[str, float] | None = None) -> List[str]:
+        """Query with E5 query prefix, then fuse with BM25 or rerank.
 
-        ids = []
-        for doc in documents:
-            doc_hash = hashlib.md5(doc.encode('utf-8')).hexdigest()[:10]
-            ids.append(f"doc_{int(time.time())}_{doc_hash}")
+        `timings`, if given, receives the seconds spent in each stage.
+        """
+        with _stage("total", timings):
+            # Fetch more candidates for reranking
+            fetch_k = min(top_k * FETCH_K_MULTIPLIER, FETCH_K_MAX)
+            lexical_future = (
+                _LEXICAL_EXECUTOR.submit(self._lexical_search, text, fetch_k, timings) if HYBRID_RETRIEVAL else None
+            )
+
+            self._refresh_store()
+            with _stage("encode", timings):
+                query_embedding = self.embedding_fn.encode_query(text)
+            with _stage("vector", timings):
+                result_ids, result_docs, result_distances = self.store.search([query_embedding], fetch_k)
+            ids = result_ids[0] if result_ids else []
+            docs = result_docs[0] if result_docs else []
+            distances = result_distances[0] if result_distances else []
+
+            if lexical_future is not None:
+                lexical_ids = lexical_future.result()
+                with _stage("fuse", timings):
+                    ranked = self._fuse(ids, docs, lexical_ids)
+            elif RERANK_ENABLED:
+                # Rerank and return top_k
+                with _stage("rerank", timings):
+                    ranked = _rerank_chunks(text, ids, docs, distances, self.lexical)
+            else:
+                ranked = [doc for doc in docs if doc and len(doc.strip()) >= 50]
+        return ranked[:top_k]
+
+    def query_many(self, texts: List[str], top_k: int = 3) -> List[List[str]]:
+        """`query` for several texts with one batched encode and one vector search call."""
+        if not texts:
+            return []
+        start = time.perf_counter()
+        fetch_k = min(top_k * FETCH_K_MULTIPLIER, FETCH_K_MAX)
+        lexical_futures = [
+            _LEXICAL_EXECUTOR.submit(self._lexical_search, text, fetch_k) if HYBRID_RETRIEVAL else None
+            for text in texts
+        ]
+
+        self._refresh_store()
+        with _stage("encode"):
+            query_embeddings = self.embedding_fn.encode_queries(texts)
+        with _stage("vector"):
+            result_ids, result_docs, result_distances = self.store.search(query_embeddings, fetch_k)
+
+        if HYBRID_RETRIEVAL:
+            lexical_ids = [future.result() for future in lexical_futures]
+            # Texts of BM25-only hits for every query in a single fetch
+            texts_by_id: Dict[str, str] = {}
+            for ids, docs in zip(result_ids, result_docs):
+                texts_by_id.update(zip(ids, docs))
+            missing = sorted({cid for ranking in lexical_ids for cid in ranking} - texts_by_id.keys())
+            texts_by_id.update(self.store.documents(missing))
+            with _stage("fuse"):
+                ranked = [
+                    self._fuse(ids, docs, lexical, texts_by_id)
+                    for ids, docs, lexical in zip(result_ids, result_docs, lexical_ids)
+                ]
+        elif RERANK_ENABLED:
+            with _stage("rerank"):
+                ranked = [
+                    _rerank_chunks(text, ids, docs, distances, self.lexical)
+                    for text, ids, docs, distances in zip(texts, result_ids, result_docs, result_distances)
+                ]
+        else:
+            ranked = [[doc for doc in docs if doc and len(doc.strip()) >= 50] for docs in result_docs]
+        RAG_STAGE_LATENCY.labels(stage="total").observe(time.perf_counter() - start)
+        return [chunks[:top_k] for chunks in ranked]
+
+    def _lexical_search(self, text: str, k: int, timings: Dict[str, float] | None = None) -> List[str]:
+        with _stage("lexical", timings):
+            return [cid for cid, _ in self.lexical.search(text, k)]
+
+    def _fuse(
+        self,
+        vector_ids: List[str],
+        vector_docs: List[str],
+        lexical_ids: List[str],
+        known_texts: Dict[str, str] | None = None,
+    ) -> List[str]:
+        """Merge vector and BM25 rankings with RRF, skipping very short chunks."""
+        texts = known_texts if known_texts is not None else {}
+        texts.update(zip(vector_ids, vector_docs))
+        fused = [cid for cid, _ in reciprocal_rank_fusion([vector_ids, lexical_ids], k=RRF_K)]
+        missing = [cid for cid in fused if cid not in texts]
+        if missing:
+            texts.update(self.store.documents(missing))
+
+        ranked = []
+        for cid in fused:
+            doc = texts.get(cid)
+            if doc and len(doc.strip()) >= 50:
+                ranked.append(doc)
+        return ranked
+
+    def add_documents(self, documents: List[str], source: str = "text") -> int:
+        """Upsert chunks under content ids, skipping exact and near duplicates."""
+        if not documents:
+            return 0
 
-        self.collection.add(documents=documents, ids=ids)
-        print(f"Added {len(documents)} new chunks to RAG collection.")
+        chunks = {_chunk_id(doc): doc for doc in documents}
+        with _MANIFEST_LOCK:
+            for cid in _near_duplicates(chunks.items(), self.dedup):
+                del chunks[cid]
+            added = _add_chunks(self.collection, {cid: (doc, source) for cid, doc in chunks.items()})
+            self.store.apply(list(chunks), [])
+            self.lexical.add(chunks.items())
+            self.lexical.save_soon(LEXICAL_SAVE_DELAY_SECONDS)
+        _bump_collection_version()
+        print(f"Added {added} new chunks to RAG collection ({len(documents) - len(chunks)} duplicates skipped).")
+        return added
 
 
 _RAG_INSTANCE: StartupRAG | None = None
 
+# Readiness state machine: not_started -> loading -> ready | failed
+RAG_STATES = ("not_started", "loading", "ready", "failed")
+_RAG_STATE = "not_started"
+_RAG_INIT_DONE = threading.Event()
+
+
+def _set_state(state: str) -> None:
+    global _RAG_STATE
+    _RAG_STATE = state
+    for name in RAG_STATES:
+        RAG_STATE.labels(state=name).set(1 if name == state else 0)
+
 
 def init_rag() -> None:
     global _RAG_INSTANCE
-    _RAG_INSTANCE = StartupRAG.build()
+    _RAG_INIT_DONE.clear()
+    _set_state("loading")
+    try:
+        with _startup_phase("total"):
+            _RAG_INSTANCE = StartupRAG.build()
+    except Exception:
+        _set_state("failed")
+        raise
+    finally:
+        _RAG_INIT_DONE.set()
+    _set_state("ready")
+    _register_serving(_RAG_INSTANCE.collection.name)
+    threading.Thread(target=_serving_heartbeat, name="rag-heartbeat", daemon=True).start()
+
+    if _should_reindex():
+        threading.Thread(target=_reindex_in_background, name="rag-reindex", daemon=True).start()
+
+
+def _serving_heartbeat() -> None:
+    """Periodically follow reindex flips and renew this worker's serving registration.
+
+    Covers workers that get no queries, whose version check never runs.
+    """
+    while True:
+        time.sleep(SERVING_HEARTBEAT_SECONDS)
+        instance = _RAG_INSTANCE
+        if instance is None:
+            continue
+        if instance._store_sync_lock.acquire(blocking=False):
+            instance._catch_up(None)
+        _register_serving(instance.collection.name)
+
+
+def _reindex_in_background() -> None:
+    try:
+        reindex_rag()
+    except Exception as exc:
+        print(f"[RAG Reindex] Failed: {exc}")
+
+
+def status() -> str:
+    return _RAG_STATE
+
+
+def startup_timings() -> Dict[str, float]:
+    """Seconds spent in each init phase of the last `init_rag` run."""
+    return dict(_STARTUP_TIMINGS)
+
+
+def is_ready() -> bool:
+    return _RAG_INSTANCE is not None
+
+
+def wait_until_ready(timeout: float = RAG_READY_WAIT_SECONDS) -> bool:
+    """Block up to `timeout` seconds for a loading RAG; returns readiness."""
+    if _RAG_INSTANCE is None and _RAG_STATE == "loading":
+        _RAG_INIT_DONE.wait(timeout)
+    return _RAG_INSTANCE is not None
 
 
 def get_relevant_chunks(text: str, top_k: int = 3) -> List[str]:
+    if not wait_until_ready():
+        if RAG_DEGRADED_MODE:
+            RAG_DEGRADED_REQUESTS.inc()
+            return []
+        raise RuntimeError("RAG is not initialized")
+    version = _collection_version() if RESULT_CACHE_ENABLED else None
+    if version is None:
+        return _RAG_INSTANCE.query(text, top_k=top_k)
+
+    key = _result_cache_key(text, top_k, version)
+    chunks = _get_cached_results(key)
+    if chunks is None:
+        chunks = _RAG_INSTANCE.query(text, top_k=top_k)
+        _set_cached_results(key, chunks)
+    return chunks
+
+
+def get_relevant_chunks_many(queries: List[str], top_k: int = 3) -> List[List[str]]:
+    """Retrieve for several queries at once; results are in the order of `queries`."""
+    if not wait_until_ready():
+        if RAG_DEGRADED_MODE:
+            RAG_DEGRADED_REQUESTS.inc(len(queries))
+            return [[] for _ in queries]
+        raise RuntimeError("RAG is not initialized")
+    version = _collection_version() if RESULT_CACHE_ENABLED else None
+    if version is None:
+        return _RAG_INSTANCE.query_many(queries, top_k=top_k)
+
+    keys = [_result_cache_key(text, top_k, version) for text in queries]
+    results = [_get_cached_results(key) for key in keys]
+    misses = [i for i, chunks in enumerate(results) if chunks is None]
+    if misses:
+        fresh = _RAG_INSTANCE.query_many([queries[i] for i in misses], top_k=top_k)
+        for i, chunks in zip(misses, fresh):
+            results[i] = chunks
+            _set_cached_results(keys[i], chunks)
+    return results
+
+
+def encode_query(text: str) -> list[float]:
+    if _RAG_INSTANCE is None:
+        raise RuntimeError("RAG is not initialized")
+    return _RAG_INSTANCE.embedding_fn.encode_query(text)
+
+
+def add_file_to_rag(path: str | Path) -> int:
+    """Ingest a file saved under DOCS_DIR so the next boot sees it as up to date."""
     if _RAG_INSTANCE is None:
         raise RuntimeError("RAG is not initialized")
-    return _RAG_INSTANCE.query(text, top_k=top_k)
+    # Resolve the collection under the lock so a reindex flip cannot slip in between
+    with _MANIFEST_LOCK:
+        return _ingest_file(_RAG_INSTANCE.collection, Path(path), _RAG_INSTANCE.lexical, _RAG_INSTANCE.dedup)
+
+
+def add_stream_to_rag(
+    segments: Iterable[str],
+    path: str | Path,
+    header: str = "",
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """Stream text segments into DOCS_DIR/`path` and the collection with bounded memory."""
+    if _RAG_INSTANCE is None:
+        raise RuntimeError("RAG is not initialized")
+    collection = _RAG_INSTANCE.collection
+    added = _ingest_stream(
+        collection,
+        _RAG_INSTANCE.lexical,
+        segments,
+        Path(path),
+        header,
+        progress,
+        _RAG_INSTANCE.dedup,
+    )
+    with _MANIFEST_LOCK:
+        if _RAG_INSTANCE.collection is not collection:
+            # A reindex flipped collections while streaming; the file is complete now
+            return add_file_to_rag(path)
+    return added
+
 
 def add_text_to_rag(text: str) -> int:
     if _RAG_INSTANCE is None:
         raise RuntimeError("RAG is not initialized")
-    chunks = _chunk_text(text)
-    if chunks:
-        _RAG_INSTANCE.add_documents(chunks)
-    return len(chunks)
+    return _RAG_INSTANCE.add_documents(_chunk_text(text))
+
+
+_REINDEX_LOCK = threading.Lock()
+
+
+def reindex_running() -> bool:
+    return _REINDEX_LOCK.locked()
+
+
+def reindex_rag(reembed: bool = False, progress: Callable[[int, int], None] | None = None) -> str:
+    """Blue/green rebuild of the collection from DOCS_DIR; returns the new collection name.
+
+    A versioned shadow collection is filled while the live one keeps serving
+    (stored vectors are reused unless `reembed`). Under the ingest lock it
+    then catches up with files ingested meanwhile and copies chunks that no
+    file produced, such as `add_documents` writes. The alias pointer and
+    StartupRAG are flipped to it; other workers follow the alias. Older
+    versions no worker serves are garbage-collected.
+    `progress(files_done, files_total)` is called per file.
+    """
+    if _RAG_INSTANCE is None:
+        raise RuntimeError("RAG is not initialized")
+    if not _REINDEX_LOCK.acquire(blocking=False):
+        raise RuntimeError("Reindex is already running")
+    try:
+        instance = _RAG_INSTANCE
+        client = instance.client
+        previous = _active_collection_name(client)
+        name = f"{COLLECTION_NAME}__v{time.strftime('%Y%m%d%H%M%S')}"
+        print(f"[RAG Reindex] Building {name} (reembed={reembed}) while {previous} serves.")
+        shadow = client.create_collection(
+            name=name,
+            embedding_function=instance.embedding_fn,
+            metadata=_collection_metadata(),
+        )
+        lexical = BM25Index(LEXICAL_INDEX_PATH)
+        dedup = _new_dedup_index()
+        files: dict = {}
+        embedder = _new_bulk_embedder() if reembed and BULK_EMBED_WORKERS > 1 else None
+        try:
+            paths = sorted(DOCS_DIR.glob("*.txt")) if DOCS_DIR.exists() else []
+            for done, path in enumerate(paths, start=1):
+                files[path.name] = _fill_shadow_file(
+                    instance.collection, shadow, path, lexical, dedup, reembed, embedder
+                )
+                if progress:
+                    progress(done, len(paths))
+            # Re-embedded vectors share ids with the old ones, so the mirror is rebuilt
+            store = _rebuild_vector_store(shadow) if reembed and isinstance(instance.store, NumpyVectorStore) else None
+
+            with _MANIFEST_LOCK:
+                # Catch up with files added or changed while the shadow was built
+                paths = sorted(DOCS_DIR.glob("*.txt")) if DOCS_DIR.exists() else []
+                for path in paths:
+                    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+                    if files.get(path.name, {}).get("sha256") != digest:
+                        files[path.name] = _fill_shadow_file(
+                            instance.collection, shadow, path, lexical, dedup, reembed, embedder
+                        )
+                current = {path.name for path in paths}
+                files = {file_name: entry for file_name, entry in files.items() if file_name in current}
+                keep_ids = {cid for entry in files.values() for cid in entry["chunk_ids"]}
+                live_files = _load_manifest().get("files", {}).values()
+                live_file_ids = {cid for entry in live_files for cid in entry["chunk_ids"]}
+                keep_ids |= _carry_over_chunks(
+                    instance.collection, shadow, keep_ids | live_file_ids, lexical, dedup, reembed, embedder
+                )
+                stale = [cid for cid in lexical.ids() if cid not in keep_ids]
+                _delete_ids(shadow, stale)
+                lexical.remove(stale)
+                if dedup is not None:
+                    dedup.remove(stale)
+
+                if store is not None:
+                    store.sync(shadow)
+                    store.move_to(NUMPY_STORE_PATH)
+                    instance.store = store
+                else:
+                    instance.store.sync(shadow)
+                _set_active_collection(client, name)
+                _register_serving(name)
+                instance.collection = shadow
+                instance.lexical = lexical
+                instance.dedup = dedup
+                lexical.save()
+                _save_manifest(files)
+            _bump_collection_version()
+        except Exception:
+            if instance.collection is not shadow:
+                client.delete_collection(name)
+            raise
+        finally:
+            if embedder is not None:
+                embedder.close()
+
+        print(f"[RAG Reindex] Now serving {name} ({shadow.count()} chunks).")
+        _gc_collections(client, keep=[name, previous] if REINDEX_KEEP_PREVIOUS else [name])
+        return name
+    finally:
+        _REINDEX_LOCK.release()
+
+
+def flush_indexes() -> None:
+    """Write index state whose save is still pending; call on shutdown."""
+    if _RAG_INSTANCE is not None:
+        _RAG_INSTANCE.lexical.save()
+
 
 def healthcheck() -> bool:
     if _RAG_INSTANCE is None:
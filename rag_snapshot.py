@@ -0,0 +1,141 @@
+"""Export the RAG collection to a snapshot and import it without running the model.
+
+A snapshot is a directory with:
+
+    vectors.npy     float32 (n, dim) matrix, written and read as a memmap
+    chunks.jsonl    one {"id", "document", "metadata"} line per vector row
+    meta.json       model, dimension, row count, source collection
+    manifest.json   DOCS_DIR manifest, so the next boot does not re-chunk (optional)
+    bm25.json       BM25 index, so it is not rebuilt (optional)
+
+    python rag_snapshot.py export --out snapshots/2026-10-17
+    python rag_snapshot.py import --src snapshots/2026-10-17
+
+Import loads the rows into a new versioned collection and points the alias at
+it (use --no-activate to only load it). Running backends pick it up on restart.
+"""
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import rag
+
+
+def export_snapshot(out_dir: Path) -> dict:
+    client = rag._build_client()
+    name = rag._active_collection_name(client)
+    collection = client.get_collection(name=name, embedding_function=None)
+    total = collection.count()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    vectors = None
+    rows = 0
+    with open(out_dir / "chunks.jsonl", "w", encoding="utf-8") as sidecar:
+        for page in rag._iter_collection(
+            collection, include=["embeddings", "documents", "metadatas"], page_size=rag.UPSERT_BATCH_SIZE * 4
+        ):
+            page_vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    out_dir / "vectors.npy", mode="w+", dtype=np.float32, shape=(total, page_vectors.shape[1])
+                )
+            # The collection may grow while exporting; meta.json records the rows written
+            take = min(len(page_vectors), total - rows)
+            vectors[rows:rows + take] = page_vectors[:take]
+            for cid, doc, metadata in zip(page["ids"][:take], page["documents"], page["metadatas"]):
+                sidecar.write(json.dumps({"id": cid, "document": doc, "metadata": metadata}, ensure_ascii=False) + "\n")
+            rows += take
+            if rows >= total:
+                break
+    if vectors is None:
+        raise SystemExit(f"Collection {name} is empty, nothing to export")
+    vectors.flush()
+
+    meta = {
+        "model": rag.EMBEDDING_MODEL_NAME,
+        "dim": int(vectors.shape[1]),
+        "rows": rows,
+        "collection": name,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    (out_dir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    if rag.MANIFEST_PATH.exists():
+        shutil.copyfile(rag.MANIFEST_PATH, out_dir / "manifest.json")
+    if rag.LEXICAL_INDEX_PATH.exists():
+        shutil.copyfile(rag.LEXICAL_INDEX_PATH, out_dir / "bm25.json")
+    return meta
+
+
+def import_snapshot(src_dir: Path, activate: bool = True, force: bool = False) -> str:
+    meta = json.loads((src_dir / "meta.json").read_text(encoding="utf-8"))
+    if meta["model"] != rag.EMBEDDING_MODEL_NAME and not force:
+        raise SystemExit(
+            f"Snapshot was embedded with {meta['model']}, current model is {rag.EMBEDDING_MODEL_NAME} "
+            "(use --force to import anyway)"
+        )
+    vectors = np.load(src_dir / "vectors.npy", mmap_mode="r")
+    rows = meta["rows"]
+
+    client = rag._build_client()
+    name = f"{rag.COLLECTION_NAME}__v{time.strftime('%Y%m%d%H%M%S')}"
+    collection = client.create_collection(
+        name=name,
+        embedding_function=None,
+        metadata=rag._collection_metadata(meta["model"]),
+    )
+
+    batch_size = rag.BULK_UPSERT_BATCH_SIZE
+    with open(src_dir / "chunks.jsonl", encoding="utf-8") as sidecar:
+        row = 0
+        while row < rows:
+            lines = [json.loads(sidecar.readline()) for _ in range(min(batch_size, rows - row))]
+            collection.upsert(
+                ids=[item["id"] for item in lines],
+                embeddings=vectors[row:row + len(lines)].tolist(),
+                documents=[item["document"] for item in lines],
+                metadatas=[item["metadata"] or {"source": ""} for item in lines],
+            )
+            row += len(lines)
+            print(f"Imported {row}/{rows} chunks...")
+
+    if activate:
+        rag.MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+        if (src_dir / "manifest.json").exists():
+            shutil.copyfile(src_dir / "manifest.json", rag.MANIFEST_PATH)
+        if (src_dir / "bm25.json").exists():
+            shutil.copyfile(src_dir / "bm25.json", rag.LEXICAL_INDEX_PATH)
+        rag._set_active_collection(client, name)
+        rag._bump_collection_version()
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG embedding snapshot export/import")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="write the live collection to a snapshot directory")
+    export_parser.add_argument("--out", type=Path, required=True)
+    import_parser = sub.add_parser("import", help="load a snapshot into a new collection")
+    import_parser.add_argument("--src", type=Path, required=True)
+    import_parser.add_argument("--no-activate", action="store_true", help="do not point the alias at it")
+    import_parser.add_argument("--force", action="store_true", help="import even if the model differs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == "export":
+        meta = export_snapshot(args.out)
+        print(f"Exported {meta['rows']} chunks ({meta['dim']}d) from {meta['collection']} to {args.out}")
+    else:
+        name = import_snapshot(args.src, activate=not args.no_activate, force=args.force)
+        state = "and activated" if not args.no_activate else "(not activated)"
+        print(f"Imported into {name} {state}")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Callable
+
+import numpy as np
+import redis
+
+from local_cache import LocalLRUCache
+from metrics import RESPONSE_CACHE_HITS, RESPONSE_CACHE_MISSES
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true"
+RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.97"))
+RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES", "256"))
+
+
+def normalize_prompt(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(value: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+
+
+class ResponseCache:
+    """Cache of final LLM results keyed on a hash of the normalized prompt.
+
+    The exact tier matches identical prompts. The optional semantic tier
+    compares E5 query embeddings and reuses a stored result when cosine
+    similarity is at least `semantic_threshold`. Redis is used when available,
+    with an in-process LRU as fallback.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        salt: str = "",
+        embed_fn: Callable[[str], list[float]] | None = None,
+        ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        semantic: bool = RESPONSE_CACHE_SEMANTIC,
+        semantic_threshold: float = RESPONSE_CACHE_SEMANTIC_THRESHOLD,
+        semantic_max_entries: int = RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES,
+    ):
+        self.namespace = namespace
+        self.salt = hashlib.sha256(salt.encode("utf-8")).hexdigest()[:12]
+        self.embed_fn = embed_fn
+        self.ttl_seconds = ttl_seconds
+        self.semantic = semantic and embed_fn is not None
+        self.semantic_threshold = semantic_threshold
+        self.semantic_max_entries = semantic_max_entries
+        self._local = LocalLRUCache(max_entries, ttl_seconds)
+        self._local_vectors = LocalLRUCache(semantic_max_entries, ttl_seconds)
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_prompt(text).encode("utf-8")).hexdigest()
+        return f"{self.salt}:{digest}"
+
+    def _redis_key(self, key: str) -> str:
+        return f"llm_cache:{self.namespace}:{key}"
+
+    def _redis_index_key(self) -> str:
+        return f"llm_cache:{self.namespace}:{self.salt}:semantic"
+
+    def _embed(self, text: str) -> np.ndarray | None:
+        if not self.semantic:
+            return None
+        try:
+            return np.asarray(self.embed_fn(text), dtype=np.float32)
+        except Exception as exc:
+            # RAG may still be loading; the exact tier keeps working without it.
+            logger.debug(f"Response cache embedding skipped: {exc}")
+            return None
+
+    def _get_value(self, key: str) -> Any | None:
+        client = get_redis()
+        if client:
+            try:
+                raw = client.get(self._redis_key(key))
+                return json.loads(raw) if raw else None
+            except redis.RedisError:
+                pass
+        return self._local.get(key)
+
+    def _nearest_key(self, embedding: np.ndarray) -> str | None:
+        entries: list[tuple[str, np.ndarray]] = []
+        client = get_redis()
+        if client:
+            try:
+                for raw in client.lrange(self._redis_index_key(), 0, -1):
+                    item = json.loads(raw)
+                    entries.append((item["key"], _decode_vector(item["vec"])))
+            except (redis.RedisError, ValueError, KeyError):
+                entries = []
+        if not entries:
+            entries = self._local_vectors.items()
+        if not entries:
+            return None
+
+        matrix = np.vstack([vec for _, vec in entries])
+        # E5 embeddings are normalized, so the dot product is cosine similarity.
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        return entries[best][0]
+
+    def lookup(self, endpoint: str, text: str) -> tuple[Any | None, np.ndarray | None]:
+        """Return `(value, embedding)`; pass the embedding back to `store` on a miss."""
+        if not RESPONSE_CACHE_ENABLED:
+            return None, None
+
+        key = self._key(text)
+        value = self._get_value(key)
+        if value is not None:
+            RESPONSE_CACHE_HITS.labels(endpoint=endpoint, tier="exact").inc()
+            return value, None
+
+        embedding = self._embed(text)
+        if embedding is not None:
+            near_key = self._nearest_key(embedding)
+            if near_key is not None:
+                value = self._get_value(near_key)
+                if value is not None:
+                    RESPONSE_CACHE_HITS.labels(endpoint=endpoint, tier="semantic").inc()
+                    return value, embedding
+
+        RESPONSE_CACHE_MISSES.labels(endpoint=endpoint).inc()
+        return None, embedding
+
+    def store(self, text: str, value: Any, embedding: np.ndarray | None = None) -> None:
+        if not RESPONSE_CACHE_ENABLED:
+            return
+
+        key = self._key(text)
+        self._local.set(key, value)
+        if embedding is not None:
+            self._local_vectors.set(key, embedding)
+
+        client = get_redis()
+        if not client:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.setex(self._redis_key(key), self.ttl_seconds, json.dumps(value, ensure_ascii=False))
+            if embedding is not None:
+                index_key = self._redis_index_key()
+                pipe.lpush(index_key, json.dumps({"key": key, "vec": _encode_vector(embedding)}))
+                pipe.ltrim(index_key, 0, self.semantic_max_entries - 1)
+                pipe.expire(index_key, self.ttl_seconds)
+            pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning(f"Response cache write to Redis failed: {exc}")
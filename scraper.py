@@ -2,6 +2,7 @@ import requests
 from bs4 import BeautifulSoup
 import os
 from pathlib import Path
+from typing import Iterator
 from urllib.parse import urlparse
 
 
@@ -79,17 +80,27 @@ def scrape_and_save(url: str) -> tuple[str | None, str | None]:
     print(f"Saved to {filepath}")
     return str(filepath), text
 
-def extract_text_from_pdf(filepath: str | Path) -> str:
+def pdf_page_count(filepath: str | Path) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(str(filepath)).pages)
+
+
+def iter_pdf_pages(filepath: str | Path) -> Iterator[str]:
+    """Yield the text of each page ("" for pages without a text layer).
+
+    Pages are parsed one at a time, so memory does not grow with the PDF size.
+    """
     from pypdf import PdfReader
-    
-    text = ""
+
+    reader = PdfReader(str(filepath))
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def extract_text_from_pdf(filepath: str | Path) -> str:
     try:
-        reader = PdfReader(str(filepath))
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n\n"
-        return text.strip()
+        return "\n\n".join(text for text in iter_pdf_pages(filepath) if text).strip()
     except Exception as e:
         print(f"Error extracting PDF: {e}")
         return ""
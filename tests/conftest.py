@@ -1,7 +1,12 @@
+import fnmatch
+import hashlib
 import os
 import sys
+import uuid
 from pathlib import Path
 
+import numpy as np
+import pytest
 from alembic import command
 from alembic.config import Config
 
@@ -30,3 +35,112 @@ def pytest_sessionstart(session):
 def pytest_sessionfinish(session, exitstatus):
     if TEST_DB_PATH.exists():
         TEST_DB_PATH.unlink()
+
+
+@pytest.fixture
+def rag_module(monkeypatch, tmp_path):
+    """A freshly imported `rag` whose docs and index files live under tmp_path.
+
+    Other tests replace `sys.modules["rag"]` with a mock, so the module is
+    re-imported here with per-test configuration.
+    """
+    pytest.importorskip("chromadb")
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    monkeypatch.setenv("CHROMA_DOCS_DIR", str(docs_dir))
+    monkeypatch.setenv("CHROMA_PERSIST_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setenv("RAG_MIGRATION_MARKER_PATH", str(tmp_path / "migration_done"))
+    monkeypatch.delenv("RAG_DATA_DIR", raising=False)
+    monkeypatch.delitem(sys.modules, "rag", raising=False)
+    import rag
+
+    return rag
+
+
+class FakeRedis:
+    """The few Redis commands rag uses, kept in a dict; TTLs are ignored."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+def _stub_embedding_function(dim: int = 32):
+    from chromadb.api.types import EmbeddingFunction
+
+    class StubEmbeddingFunction(EmbeddingFunction):
+        """Deterministic bag-of-words vectors; no model download."""
+
+        def __init__(self, dim: int = 32):
+            self.dim = dim
+
+        @staticmethod
+        def name():
+            return "stub"
+
+        def __call__(self, input):
+            vectors = []
+            for text in input:
+                vector = np.zeros(self.dim, dtype=np.float32)
+                for token in text.lower().split():
+                    vector[int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+                norm = float(np.linalg.norm(vector)) or 1.0
+                vectors.append((vector / norm).tolist())
+            return vectors
+
+        def encode_query(self, text):
+            return self([text])[0]
+
+        def encode_queries(self, texts):
+            return self(texts)
+
+    return StubEmbeddingFunction(dim)
+
+
+@pytest.fixture
+def chroma_client(rag_module):
+    """In-memory Chroma client, emptied after the test."""
+    import chromadb
+
+    client = chromadb.EphemeralClient()
+    yield client
+    for collection in client.list_collections():
+        client.delete_collection(collection.name)
+
+
+@pytest.fixture
+def stub_embedding():
+    pytest.importorskip("chromadb")
+    return _stub_embedding_function()
+
+
+@pytest.fixture
+def chroma_collection(chroma_client, stub_embedding):
+    return chroma_client.create_collection(f"test_{uuid.uuid4().hex}", embedding_function=stub_embedding)
+
+
+@pytest.fixture
+def make_stub_embedding():
+    """Factory for stub embedding functions of a given dimension."""
+    pytest.importorskip("chromadb")
+    return _stub_embedding_function
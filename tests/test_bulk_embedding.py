@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import bulk_embedding
+
+TEXTS = [f"Чанк {n}: выручка агротех-стартапа выросла в {n + 2} раза за год." for n in range(13)]
+
+
+class _StubModel:
+    """Stands in for the worker's model: the stub embedding of the unprefixed text."""
+
+    def __init__(self, embedding_fn):
+        self.embedding_fn = embedding_fn
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=64):
+        # Later shards finish first, so results arrive out of order
+        time.sleep(0.02 * (len(TEXTS) - TEXTS.index(texts[0].removeprefix("passage: "))) / len(TEXTS))
+        return np.asarray(self.embedding_fn([text.removeprefix("passage: ") for text in texts]))
+
+
+class _UpsertSpy:
+    def __init__(self, collection):
+        self.collection = collection
+        self.upserts = []
+
+    def upsert(self, **kwargs):
+        # The caller reuses its batch lists after the call
+        self.upserts.append({key: list(value) for key, value in kwargs.items()})
+        return self.collection.upsert(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+@pytest.fixture
+def thread_pool_workers(monkeypatch, stub_embedding):
+    """Two in-process workers sharing a stub model instead of spawned model processes."""
+    monkeypatch.setattr(
+        bulk_embedding,
+        "ProcessPoolExecutor",
+        lambda max_workers, mp_context, initializer, initargs: ThreadPoolExecutor(max_workers),
+    )
+    monkeypatch.setattr(bulk_embedding, "_MODEL", _StubModel(stub_embedding))
+
+
+def _stored(collection):
+    page = collection.get(include=["embeddings", "documents", "metadatas"])
+    return {
+        cid: (doc, meta, np.asarray(vector))
+        for cid, doc, meta, vector in zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"])
+    }
+
+
+def test_bulk_ingest_matches_the_serial_path(
+    rag_module, thread_pool_workers, chroma_client, stub_embedding, monkeypatch
+):
+    monkeypatch.setattr(rag_module, "BULK_EMBED_WORKERS", 2)
+    monkeypatch.setattr(rag_module, "BULK_EMBED_MIN_CHUNKS", 10)
+    monkeypatch.setattr(rag_module, "UPSERT_BATCH_SIZE", 2)
+    monkeypatch.setattr(rag_module, "BULK_UPSERT_BATCH_SIZE", 5)
+    chunks = {rag_module._chunk_id(text): (text, f"part{n % 3}.txt") for n, text in enumerate(TEXTS)}
+    serial = chroma_client.create_collection("serial", embedding_function=stub_embedding)
+    bulk = _UpsertSpy(chroma_client.create_collection("bulk", embedding_function=stub_embedding))
+
+    # Below the threshold the collection embeds the chunks itself
+    rag_module._add_chunks(serial, dict(list(chunks.items())[:9]))
+    rag_module._add_chunks(serial, dict(list(chunks.items())[9:]))
+    assert rag_module._add_chunks(bulk, chunks) == len(TEXTS)
+
+    # Shards of 2 from two workers, upserted in order with precomputed vectors, 5+ rows at a time
+    assert [len(call["ids"]) for call in bulk.upserts] == [6, 6, 1]
+    assert all("embeddings" in call for call in bulk.upserts)
+    assert [cid for call in bulk.upserts for cid in call["ids"]] == list(chunks)
+    expected, stored = _stored(serial), _stored(bulk.collection)
+    assert stored.keys() == expected.keys()
+    for cid, (doc, meta, vector) in expected.items():
+        assert stored[cid][:2] == (doc, meta)
+        np.testing.assert_allclose(stored[cid][2], vector, rtol=1e-6)
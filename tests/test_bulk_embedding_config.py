@@ -0,0 +1,17 @@
+import os
+import sys
+
+
+def test_bulk_embedding_is_off_by_default(rag_module):
+    # Each bulk worker loads its own model copy, so the pool is opt-in
+    assert rag_module.BULK_EMBED_WORKERS == 1
+
+
+def test_bulk_threads_split_cores_between_workers(rag_module, monkeypatch):
+    monkeypatch.setenv("RAG_BULK_EMBED_WORKERS", "2")
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.delitem(sys.modules, "rag")
+    import rag
+
+    assert rag.BULK_EMBED_WORKERS == 2
+    assert rag.BULK_EMBED_THREADS == 4
@@ -0,0 +1,17 @@
+from context_assembly import assemble_context, estimate_tokens, merge_overlapping
+
+OVERLAP = "Акселератор принимает заявки до конца марта, отбор проходит в два этапа."
+
+
+def test_overlapping_chunks_merge_and_budget_keeps_relevant_sentences():
+    first = "Фонд выдаёт гранты на НИОКР до пяти миллионов рублей. " + OVERLAP
+    second = OVERLAP + " Финтех-стартапы получают льготную ставку на облако."
+    assert merge_overlapping([second, first, first]) == [
+        "Фонд выдаёт гранты на НИОКР до пяти миллионов рублей. " + OVERLAP
+        + " Финтех-стартапы получают льготную ставку на облако."
+    ]
+
+    filler = "Прочие условия описаны в положении о конкурсе. " * 20
+    context = assemble_context("гранты на НИОКР", [filler, first], budget_tokens=40)
+    assert context == ["Фонд выдаёт гранты на НИОКР до пяти миллионов рублей."]
+    assert sum(estimate_tokens(chunk) for chunk in context) <= 40
@@ -0,0 +1,51 @@
+import os
+import re
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    os.getenv("RUN_EMBEDDING_PARITY") != "1",
+    reason="downloads the embedding model; set RUN_EMBEDDING_PARITY=1 to run",
+)
+
+
+def _corpus_and_queries():
+    import rag
+
+    chunks = rag._load_documents()
+    queries = []
+    for idx, chunk in enumerate(chunks):
+        sentence = re.split(r"(?<=[.!?])\s+", chunk.strip())[0]
+        if len(sentence) >= 30:
+            queries.append((sentence, idx))
+    return chunks, queries
+
+
+def _top_k(embedding_fn, chunks, queries, k):
+    doc_vecs = np.asarray(embedding_fn(chunks), dtype=np.float32)
+    query_vecs = np.asarray(embedding_fn._encode_queries([q for q, _ in queries]), dtype=np.float32)
+    scores = query_vecs @ doc_vecs.T
+    return np.argsort(-scores, axis=1)[:, :k], query_vecs
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_backend_retrieval_parity(backend):
+    import rag
+
+    chunks, queries = _corpus_and_queries()
+    assert queries, "sample_docs produced no queries"
+    k = min(3, len(chunks))
+
+    reference, ref_vecs = _top_k(rag.E5EmbeddingFunction("torch"), chunks, queries, k)
+    candidate, cand_vecs = _top_k(rag.E5EmbeddingFunction(backend), chunks, queries, k)
+
+    relevant = np.array([idx for _, idx in queries])
+    ref_recall = np.mean([rel in row for rel, row in zip(relevant, reference)])
+    cand_recall = np.mean([rel in row for rel, row in zip(relevant, candidate)])
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(reference, candidate)])
+    cosine = np.mean(np.sum(ref_vecs * cand_vecs, axis=1))
+
+    assert cand_recall >= ref_recall - 0.05
+    assert overlap >= 0.8
+    assert cosine >= (0.99 if backend == "onnx" else 0.95)
@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from embedding_batcher import MicroBatcher
+
+
+def test_concurrent_submits_share_one_encode():
+    batches = []
+    release = threading.Event()
+
+    def encode(texts):
+        release.wait(5)
+        batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    batcher = MicroBatcher(encode, max_batch=8, max_wait_ms=200)
+    texts = ["a", "bb", "ccc", "dddd"]
+    with ThreadPoolExecutor(len(texts)) as pool:
+        futures = [pool.submit(batcher.submit, text, 5) for text in texts]
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == [[1.0], [2.0], [3.0], [4.0]]
+    assert sum(len(batch) for batch in batches) == len(texts)
+    assert len(batches) < len(texts)
+
+
+def test_encode_error_reaches_every_caller_and_batcher_keeps_running():
+    calls = []
+
+    def encode(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("model crashed")
+        return [[0.5] for _ in texts]
+
+    batcher = MicroBatcher(encode, max_batch=4, max_wait_ms=1)
+
+    with pytest.raises(RuntimeError, match="model crashed"):
+        batcher.submit("first", timeout=5)
+    assert batcher.submit("second", timeout=5) == [0.5]
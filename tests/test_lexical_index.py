@@ -0,0 +1,60 @@
+import os
+import time
+
+import lexical_index
+from lexical_index import BM25Index
+
+
+def test_search_tolerates_a_remove_between_tokenizing_and_scoring(monkeypatch):
+    index = BM25Index()
+    index.add([("a", "фермерские продукты доставка"), ("b", "доставка еды курьером")])
+    tokenize = lexical_index.tokenize
+
+    def tokenize_then_remove(text):
+        # Another request drops the only document holding "фермерские"
+        index.remove(["a"])
+        return tokenize(text)
+
+    monkeypatch.setattr(lexical_index, "tokenize", tokenize_then_remove)
+    assert [doc_id for doc_id, _ in index.search("фермерские доставка", k=5)] == ["b"]
+
+
+def test_save_soon_coalesces_writes(tmp_path, monkeypatch):
+    index = BM25Index(tmp_path / "bm25.json")
+    writes = []
+    save = index.save
+    monkeypatch.setattr(index, "save", lambda: (writes.append(1), save()))
+
+    for i in range(20):
+        index.add([(f"doc{i}", f"документ номер {i} про стартапы")])
+        index.save_soon(0.05)
+    deadline = time.monotonic() + 2
+    while not writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(writes) == 1
+    restored = BM25Index(tmp_path / "bm25.json")
+    assert restored.load()
+    assert len(restored) == 20
+
+
+def test_interleaved_saves_of_one_file_do_not_clobber_each_other(tmp_path, monkeypatch):
+    path = tmp_path / "bm25.json"
+    first, second = BM25Index(path), BM25Index(path)
+    first.add([("a", "фермерские продукты доставка")])
+    second.add([("b", "доставка еды курьером")])
+    replace = os.replace
+
+    def replace_after_other_worker_saves(src, dst):
+        # Another worker saves between this worker's write and its rename
+        monkeypatch.setattr(lexical_index.os, "replace", replace)
+        second.save()
+        replace(src, dst)
+
+    monkeypatch.setattr(lexical_index.os, "replace", replace_after_other_worker_saves)
+    first.save()
+
+    reloaded = BM25Index(path)
+    assert reloaded.load()
+    assert reloaded.ids() == ["a"]
+    assert [p.name for p in tmp_path.iterdir()] == ["bm25.json"]
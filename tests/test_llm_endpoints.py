@@ -0,0 +1,146 @@
+import json
+import threading
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from db import SessionLocal
+from models import ChatMessage as DbChatMessage, ChatSession, User
+
+
+@pytest.fixture
+def session_user(monkeypatch):
+    """A user with one chat session, plus auth headers; titles are not generated."""
+    monkeypatch.setattr(main, "generate_chat_title", lambda text: "Новый диалог")
+    with SessionLocal() as db:
+        user = User(email=f"test_{uuid.uuid4()}@example.com", name="Test", email_verified=True)
+        db.add(user)
+        db.commit()
+        session = ChatSession(user_id=user.id, title="Новый диалог")
+        db.add(session)
+        db.commit()
+        user_id, session_id = user.id, session.id
+    headers = {"Authorization": f"Bearer {create_access_token(user_id)}"}
+    return user_id, session_id, headers
+
+
+def test_session_message_keeps_db_work_off_the_event_loop(monkeypatch, session_user):
+    _, session_id, headers = session_user
+    threads = {}
+
+    async def fake_acall(system_prompt, user_prompt, timeout=20):
+        threads["llm"] = threading.get_ident()
+        return "Расскажите о вашей команде.", {"totalTokens": "42"}
+
+    check_limits = main._check_subscription_limits
+
+    def tracked_check_limits(*args, **kwargs):
+        threads["db"] = threading.get_ident()
+        return check_limits(*args, **kwargs)
+
+    monkeypatch.setattr(main, "acall_yandex_gpt", fake_acall)
+    monkeypatch.setattr(main, "_check_subscription_limits", tracked_check_limits)
+    monkeypatch.setattr(main.rag, "get_relevant_chunks", lambda text, top_k=3: [])
+
+    client = TestClient(main.app)
+    res = client.post(
+        f"/chat/sessions/{session_id}/messages",
+        json={"content": "Сервис доставки фермерских продуктов"},
+        headers=headers,
+    )
+
+    assert res.status_code == 200
+    assert res.json()["role"] == "assistant"
+    assert res.json()["content"] == "Расскажите о вашей команде."
+    # The LLM call runs on the event loop, the subscription check in a worker thread
+    assert threads["db"] != threads["llm"]
+
+    messages = client.get(f"/chat/sessions/{session_id}/messages", headers=headers).json()
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+
+
+def _sse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _fake_stream(deltas):
+    async def stream(system_prompt, user_prompt, timeout=20):
+        for delta in deltas:
+            yield delta, {}
+        yield "", {"totalTokens": "30"}
+
+    return stream
+
+
+def test_stream_holds_back_tokens_on_structured_topic(monkeypatch, session_user):
+    _, session_id, headers = session_user
+    analysis = ['{"investment_score": 7, "strengths": ["команда"], ', '"market_summary": "Рынок растёт"}']
+    monkeypatch.setattr(main, "astream_yandex_gpt", _fake_stream(analysis))
+    monkeypatch.setattr(main.rag, "get_relevant_chunks", lambda text, top_k=3: [])
+
+    res = TestClient(main.app).post(
+        f"/chat/sessions/{session_id}/messages/stream",
+        json={"content": "Сервис доставки фермерских продуктов"},
+        headers=headers,
+    )
+
+    events = _sse_events(res.text)
+    # The first topic is the idea analysis: no raw JSON reaches the client
+    assert [name for name, _ in events] == ["done"]
+    assert events[0][1]["content"].startswith("Анализ готов!")
+
+
+def test_stream_sends_tokens_on_free_form_topic(monkeypatch, session_user):
+    _, session_id, headers = session_user
+    with SessionLocal() as db:
+        for role, content in [("assistant", "Здравствуйте!"), ("user", "Привет"), ("user", "Другой вопрос")]:
+            db.add(DbChatMessage(session_id=session_id, role=role, content=content))
+            db.commit()
+    monkeypatch.setattr(main, "astream_yandex_gpt", _fake_stream(["Начните ", "с интервью."]))
+    monkeypatch.setattr(main.rag, "get_relevant_chunks", lambda text, top_k=3: [])
+
+    res = TestClient(main.app).post(
+        f"/chat/sessions/{session_id}/messages/stream",
+        json={"content": "Как проверить спрос?"},
+        headers=headers,
+    )
+
+    events = _sse_events(res.text)
+    assert [name for name, _ in events] == ["token", "token", "done"]
+    assert events[-1][1]["content"] == "Начните с интервью."
+
+
+@pytest.mark.parametrize("ready, chunks", [(False, []), (True, ["Рынок агротеха растёт на 12% в год."])])
+def test_analysis_without_rag_context_is_flagged_and_not_cached(monkeypatch, ready, chunks):
+    stored = []
+    analysis = json.dumps({
+        "investment_score": 6, "strengths": [], "weaknesses": [], "recommendations": [], "market_summary": "—",
+    })
+
+    async def fake_acall(system_prompt, user_prompt, timeout=20):
+        return analysis, {}
+
+    monkeypatch.setattr(main, "acall_yandex_gpt", fake_acall)
+    monkeypatch.setattr(main.rag, "is_ready", lambda: ready)
+    monkeypatch.setattr(main.rag, "get_relevant_chunks", lambda text, top_k=3: chunks)
+    monkeypatch.setattr(main.ANALYSIS_CACHE, "lookup", lambda endpoint, text: (None, None))
+    monkeypatch.setattr(main.ANALYSIS_CACHE, "store", lambda *args: stored.append(args))
+
+    res = TestClient(main.app).post("/analyze-startup", json={"description": "Сервис доставки фермерских продуктов"})
+
+    assert res.status_code == 200
+    assert res.json()["investment_score"] == 6
+    if ready:
+        assert main.RAG_DEGRADED_HEADER not in res.headers
+        assert len(stored) == 1
+    else:
+        # The context-less answer must not be served from cache after RAG warms up
+        assert res.headers[main.RAG_DEGRADED_HEADER] == "true"
+        assert stored == []
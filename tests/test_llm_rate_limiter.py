@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+import llm_rate_limiter
+from llm_rate_limiter import RateLimitExceeded, TokenBucketLimiter
+
+
+def test_local_fallback_queues_within_deadline_and_settles_tokens(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    limiter = TokenBucketLimiter("test", rps=1000, tpm=600, max_wait=0.05)
+
+    limiter.acquire(tokens=550)
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.acquire(tokens=100)
+    assert exc_info.value.retry_after > 1
+
+    # The call used far fewer tokens than estimated: the rest is available again
+    limiter.settle(estimated=550, actual=50)
+    limiter.acquire(tokens=100)
+
+
+@pytest.fixture
+def lua_redis(monkeypatch):
+    """A Lua-capable in-memory Redis shared by every limiter in the test."""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeServer()
+
+    def connect():
+        # A new connection per call, like separate worker processes
+        return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+    monkeypatch.setattr(llm_rate_limiter, "get_redis", connect)
+    return connect
+
+
+def test_redis_bucket_honors_the_burst_and_refills(lua_redis):
+    limiter = TokenBucketLimiter("burst", rps=20, burst=3)
+
+    assert [limiter.try_acquire(0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = limiter.try_acquire(0)
+    assert 0 < wait <= 0.05
+
+    time.sleep(wait + 0.01)
+    assert limiter.try_acquire(0) == 0.0
+    assert limiter.try_acquire(0) > 0
+
+
+def test_redis_tokens_are_reserved_then_refunded_by_settle(lua_redis):
+    limiter = TokenBucketLimiter("tpm", rps=100, burst=10, tpm=1000)
+
+    assert limiter.try_acquire(800) == 0.0
+    # 300 more tokens refill at 1000/min: about 6 seconds away
+    assert 5 < limiter.try_acquire(300) <= 7
+
+    limiter.settle(estimated=800, actual=100)
+    assert limiter.try_acquire(300) == 0.0
+    tokens = lua_redis().hget(limiter._keys()[1], "tokens")
+    assert 590 <= float(tokens) <= 610
+
+    # Usage above the estimate is charged afterwards
+    limiter.settle(estimated=100, actual=700)
+    assert limiter.try_acquire(100) > 0
+
+
+def test_limiters_in_different_workers_share_one_bucket(lua_redis):
+    first = TokenBucketLimiter("shared", rps=1, burst=2, tpm=0, local_share=4)
+    second = TokenBucketLimiter("shared", rps=1, burst=2, tpm=0, local_share=4)
+    other = TokenBucketLimiter("other", rps=1, burst=2)
+
+    assert first.try_acquire(0) == 0.0
+    assert second.try_acquire(0) == 0.0
+    # The whole burst is spent across both; no per-process share applies with Redis
+    assert first.try_acquire(0) > 0.5
+    assert second.try_acquire(0) > 0.5
+    assert other.try_acquire(0) == 0.0
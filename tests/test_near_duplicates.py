@@ -0,0 +1,28 @@
+from collections import Counter
+
+from lexical_index import tokenize
+from near_duplicates import SimHashIndex
+
+BOILERPLATE = (
+    "Подпишитесь на нашу рассылку, чтобы первыми узнавать о новостях рынка, "
+    "грантах для стартапов и мероприятиях акселератора. Политика "
+    "конфиденциальности. Все права защищены 2023."
+)
+
+
+def _tf(text):
+    return Counter(tokenize(text))
+
+
+def test_near_duplicate_found_and_distinct_text_kept():
+    index = SimHashIndex(max_distance=3, min_tokens=10)
+    index.add("footer", _tf(BOILERPLATE))
+
+    assert index.find(_tf(BOILERPLATE.replace("2023", "2024"))) == "footer"
+    assert index.find(_tf(
+        "Венчурный фонд инвестирует в компании на стадии seed и раунда A, "
+        "предпочитая B2B SaaS и финтех проекты с выручкой от миллиона рублей."
+    )) is None
+
+    index.remove(["footer"])
+    assert index.find(_tf(BOILERPLATE)) is None
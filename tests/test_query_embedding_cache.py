@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+
+class CountingModel:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=32):
+        self.encoded.extend(texts)
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def embedding_fn(rag_module, monkeypatch):
+    model = CountingModel()
+    monkeypatch.setattr(rag_module, "_load_embedding_model", lambda backend: model)
+    monkeypatch.setattr(rag_module, "EMBEDDING_BATCHING", False)
+    return rag_module.E5EmbeddingFunction("torch"), model
+
+
+def test_repeated_query_is_encoded_once(embedding_fn):
+    fn, model = embedding_fn
+
+    first = fn.encode_query("Как  проверить спрос?")
+    second = fn.encode_query(" как проверить СПРОС? ")
+
+    assert first == second
+    assert model.encoded == ["query: Как  проверить спрос?"]
+    # Callers may mutate what they get back without poisoning the cache
+    second.append(0.0)
+    assert fn.encode_query("как проверить спрос?") == first
+
+
+def test_batch_encode_only_runs_cache_misses(embedding_fn):
+    fn, model = embedding_fn
+    fn.encode_query("рынок")
+
+    vectors = fn.encode_queries(["Рынок", "команда", "команда "])
+
+    assert model.encoded == ["query: рынок", "query: команда"]
+    assert vectors[1] == vectors[2]
+
+
+def test_workers_share_encodes_through_redis(rag_module, embedding_fn, monkeypatch, fake_redis):
+    fn, model = embedding_fn
+    monkeypatch.setattr(rag_module, "EMBEDDING_CACHE_REDIS", True)
+    monkeypatch.setattr(rag_module, "get_redis", lambda: fake_redis)
+    vector = fn.encode_query("юнит-экономика")
+
+    other = rag_module.E5EmbeddingFunction("torch")
+
+    assert other.encode_query("Юнит-экономика") == vector
+    assert model.encoded == ["query: юнит-экономика"]
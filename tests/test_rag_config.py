@@ -0,0 +1,15 @@
+import sys
+
+
+def test_index_files_follow_rag_data_dir(rag_module, monkeypatch, tmp_path):
+    monkeypatch.setenv("RAG_DATA_DIR", str(tmp_path / "volume"))
+    monkeypatch.delitem(sys.modules, "rag")
+    import rag
+
+    paths = [rag.MANIFEST_PATH, rag.MIGRATION_CHECKPOINT_PATH, rag.LEXICAL_INDEX_PATH, rag.NUMPY_STORE_PATH]
+    assert all(path.parent == tmp_path / "volume" for path in paths)
+
+
+def test_index_files_default_to_the_chroma_directory(rag_module, tmp_path):
+    assert rag_module.MANIFEST_PATH.parent == tmp_path / "chroma"
+    assert rag_module.LEXICAL_INDEX_PATH.parent == tmp_path / "chroma"
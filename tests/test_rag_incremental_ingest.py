@@ -0,0 +1,48 @@
+ALPHA = "Рынок фермерских продуктов в России растёт за счёт доставки и подписок на наборы. " * 3
+BETA = "Команда из трёх основателей с опытом в логистике, ритейле и мобильной разработке. " * 3
+SHARED = "Инвесторы ждут от агротех-стартапа подтверждённой выручки и понятной юнит-экономики. " * 3
+
+
+def _write(rag, name, text):
+    path = rag.DOCS_DIR / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def _ids(rag, text):
+    return {rag._chunk_id(chunk) for chunk in rag._chunk_text(text.strip())}
+
+
+def _stored(collection):
+    return set(collection.get()["ids"])
+
+
+def test_changed_and_removed_files_drop_only_their_own_chunks(rag_module, chroma_collection):
+    alpha = _write(rag_module, "alpha.txt", ALPHA)
+    beta = _write(rag_module, "beta.txt", BETA)
+    _write(rag_module, "copy.txt", SHARED)
+    _write(rag_module, "shared.txt", SHARED)
+    rag_module._sync_documents(chroma_collection)
+    assert _stored(chroma_collection) == _ids(rag_module, ALPHA) | _ids(rag_module, BETA) | _ids(rag_module, SHARED)
+
+    alpha.write_text(BETA + ALPHA[:120], encoding="utf-8")
+    beta.unlink()
+    (rag_module.DOCS_DIR / "copy.txt").unlink()
+    rag_module._sync_documents(chroma_collection)
+
+    # Old alpha chunks are gone; beta's text lives on inside the new alpha,
+    # and the chunk copy.txt shared with shared.txt is still referenced
+    expected = _ids(rag_module, BETA + ALPHA[:120]) | _ids(rag_module, SHARED)
+    assert _stored(chroma_collection) == expected
+
+
+def test_reingesting_a_file_keeps_chunks_other_files_use(rag_module, chroma_collection):
+    _write(rag_module, "shared.txt", SHARED)
+    rag_module._sync_documents(chroma_collection)
+    path = _write(rag_module, "upload.txt", SHARED)
+    rag_module._ingest_file(chroma_collection, path)
+
+    path.write_text(ALPHA, encoding="utf-8")
+    rag_module._ingest_file(chroma_collection, path)
+
+    assert _stored(chroma_collection) == _ids(rag_module, SHARED) | _ids(rag_module, ALPHA)
@@ -0,0 +1,46 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from auth import create_access_token
+from db import SessionLocal
+from models import User
+
+
+@pytest.fixture
+def admin_headers():
+    with SessionLocal() as db:
+        user = User(email=f"admin_{uuid.uuid4()}@example.com", name="Admin", email_verified=True, is_admin=True)
+        db.add(user)
+        db.commit()
+        user_id = user.id
+    return {"Authorization": f"Bearer {create_access_token(user_id)}"}
+
+
+def test_failed_pdf_ingest_removes_the_upload_and_reports_the_job(monkeypatch, tmp_path, admin_headers):
+    monkeypatch.setattr(main, "get_redis", lambda: None)
+    monkeypatch.setattr(main, "pdf_page_count", lambda path: 2)
+    monkeypatch.setattr(main, "iter_pdf_pages", lambda path: iter(["", ""]))
+    monkeypatch.setattr(main.rag, "add_stream_to_rag", lambda segments, path, header="", progress=None: 0)
+    pdf_path = tmp_path / "scan.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    txt_path = tmp_path / "scan.pdf.txt"
+    job_id = uuid.uuid4().hex
+    main._set_rag_job(job_id, status="PENDING", source="scan.pdf", done=0, total=0, chunks_added=0)
+
+    main.background_ingest_pdf(job_id, str(pdf_path), str(txt_path), "scan.pdf")
+
+    assert not pdf_path.exists()
+    assert not txt_path.exists()
+    res = TestClient(main.app).get(f"/admin/rag/jobs/{job_id}", headers=admin_headers)
+    assert res.status_code == 200
+    assert res.json()["status"] == "FAILED"
+    assert "Could not extract text" in res.json()["error"]
+
+
+def test_unknown_job_is_not_found(monkeypatch, admin_headers):
+    monkeypatch.setattr(main, "get_redis", lambda: None)
+    res = TestClient(main.app).get(f"/admin/rag/jobs/{uuid.uuid4().hex}", headers=admin_headers)
+    assert res.status_code == 404
@@ -0,0 +1,55 @@
+import pytest
+
+DOCS = [f"Глава {n}: как стартапу в агротехе найти первых клиентов и проверить спрос на продукт." for n in range(7)]
+
+
+@pytest.fixture
+def old_collection(rag_module, chroma_client, stub_embedding, monkeypatch):
+    monkeypatch.setattr(rag_module, "MIGRATION_PAGE_SIZE", 3)
+    collection = chroma_client.create_collection(
+        rag_module.COLLECTION_NAME, embedding_function=stub_embedding, metadata={rag_module.MODEL_META_KEY: "old-model"}
+    )
+    collection.add(
+        ids=[rag_module._chunk_id(doc) for doc in DOCS],
+        documents=DOCS,
+        metadatas=[{"source": "book.txt"}] * len(DOCS),
+    )
+    return collection
+
+
+def test_interrupted_migration_resumes_from_its_checkpoint(
+    rag_module, chroma_client, stub_embedding, old_collection, monkeypatch
+):
+    add_chunks = rag_module._add_chunks
+    embedded = []
+
+    def crash_on_second_page(collection, chunks, embedder=None):
+        if embedded:
+            raise RuntimeError("killed")
+        embedded.append(sorted(chunks))
+        return add_chunks(collection, chunks, embedder)
+
+    monkeypatch.setattr(rag_module, "_add_chunks", crash_on_second_page)
+    with pytest.raises(RuntimeError):
+        rag_module._migrate_collection_if_needed(chroma_client, stub_embedding)
+
+    # Nothing is swapped in or dropped until the copy is complete
+    assert rag_module._active_collection_name(chroma_client) == rag_module.COLLECTION_NAME
+    assert old_collection.count() == len(DOCS)
+    assert rag_module.MIGRATION_CHECKPOINT_PATH.exists()
+
+    def recording(collection, chunks, embedder=None):
+        embedded.append(sorted(chunks))
+        return add_chunks(collection, chunks, embedder)
+
+    monkeypatch.setattr(rag_module, "_add_chunks", recording)
+    migrated = rag_module._migrate_collection_if_needed(chroma_client, stub_embedding)
+
+    first_page, *resumed = embedded
+    assert len(first_page) == 3
+    assert not set(first_page) & {cid for page in resumed for cid in page}
+    assert sorted(migrated.get()["documents"]) == sorted(DOCS)
+    assert rag_module._active_collection_name(chroma_client) == migrated.name
+    assert rag_module.COLLECTION_NAME not in {c.name for c in chroma_client.list_collections()}
+    assert not rag_module.MIGRATION_CHECKPOINT_PATH.exists()
+    assert rag_module._migrate_collection_if_needed(chroma_client, stub_embedding) is None
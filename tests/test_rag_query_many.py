@@ -0,0 +1,47 @@
+import pytest
+
+DOCS = [
+    "Доставка фермерских продуктов по подписке: овощи, молоко и мясо от местных хозяйств.",
+    "Сервис заказа такси для малых городов с фиксированной ценой поездки и оплатой картой.",
+    "Онлайн-школа программирования для подростков с проектами и наставниками из индустрии.",
+    "Маркетплейс услуг ремонта квартир с проверенными мастерами и гарантией на работы.",
+]
+QUERIES = ["доставка фермерских продуктов", "школа программирования для подростков", "такси в малых городах"]
+
+
+@pytest.fixture
+def instance(rag_module, chroma_client, chroma_collection, stub_embedding, monkeypatch):
+    rag = rag_module.StartupRAG(
+        client=chroma_client, collection=chroma_collection, embedding_fn=stub_embedding, dedup=None
+    )
+    rag.add_documents(DOCS)
+    monkeypatch.setattr(rag_module, "_RAG_INSTANCE", rag)
+    return rag
+
+
+@pytest.mark.parametrize("hybrid", [True, False])
+def test_query_many_matches_single_queries_with_one_search(rag_module, instance, monkeypatch, hybrid):
+    monkeypatch.setattr(rag_module, "HYBRID_RETRIEVAL", hybrid)
+    expected = [instance.query(text, top_k=2) for text in QUERIES]
+    searches = []
+    search = instance.store.search
+
+    def counting_search(embeddings, k):
+        searches.append(len(embeddings))
+        return search(embeddings, k)
+
+    monkeypatch.setattr(instance.store, "search", counting_search)
+
+    assert instance.query_many(QUERIES, top_k=2) == expected
+    assert searches == [len(QUERIES)]
+
+
+def test_get_relevant_chunks_many_keeps_query_order(rag_module, instance, monkeypatch, fake_redis):
+    monkeypatch.setattr(rag_module, "get_redis", lambda: fake_redis)
+    rag_module._set_state("ready")
+    rag_module.get_relevant_chunks(QUERIES[1], top_k=1)
+
+    results = rag_module.get_relevant_chunks_many(QUERIES, top_k=1)
+
+    assert [chunks[0] for chunks in results] == [DOCS[0], DOCS[2], DOCS[1]]
+    assert rag_module.get_relevant_chunks_many([]) == []
@@ -0,0 +1,92 @@
+import itertools
+
+import pytest
+
+MARKET = "Рынок фермерских продуктов в России растёт за счёт доставки и подписок на наборы. " * 3
+TEAM = "Команда из трёх основателей с опытом в логистике, ритейле и мобильной разработке. " * 3
+NOTE = "Инвесторы ждут от агротех-стартапа подтверждённой выручки и понятной юнит-экономики. " * 3
+PITCH = "Питч-дек должен уместиться в десять слайдов и начинаться с проблемы клиента. " * 3
+
+
+@pytest.fixture
+def live(rag_module, monkeypatch, chroma_client, stub_embedding):
+    """A serving StartupRAG over an in-memory collection; reindexes get distinct names."""
+    collection = chroma_client.create_collection(rag_module.COLLECTION_NAME, embedding_function=stub_embedding)
+    instance = rag_module.StartupRAG(
+        client=chroma_client, collection=collection, embedding_fn=stub_embedding, dedup=None
+    )
+    monkeypatch.setattr(rag_module, "_RAG_INSTANCE", instance)
+    versions = itertools.count(1)
+    monkeypatch.setattr(rag_module.time, "strftime", lambda fmt: f"{next(versions):04d}")
+    return instance
+
+
+def _documents(collection):
+    return " ".join(collection.get()["documents"])
+
+
+def _ingest(rag, name, text):
+    path = rag.DOCS_DIR / name
+    path.write_text(text, encoding="utf-8")
+    rag.add_file_to_rag(path)
+
+
+def test_reindex_keeps_crawled_files_and_added_texts(rag_module, live):
+    _ingest(rag_module, "crawl_market.txt", MARKET)
+    live.add_documents([TEAM])
+
+    def add_while_building(done, total):
+        live.add_documents([NOTE])
+
+    name = rag_module.reindex_rag(progress=add_while_building)
+
+    assert live.collection.name == name
+    documents = _documents(live.collection)
+    for text in (MARKET, TEAM, NOTE):
+        assert text.strip()[:60] in documents
+    assert set(live.lexical.ids()) == set(live.collection.get()["ids"])
+
+
+def test_other_workers_follow_the_alias_and_keep_their_collection(
+    rag_module, live, monkeypatch, fake_redis, chroma_client, stub_embedding
+):
+    monkeypatch.setattr(rag_module, "get_redis", lambda: fake_redis)
+    monkeypatch.setattr(rag_module, "REINDEX_KEEP_PREVIOUS", False)
+    _ingest(rag_module, "market.txt", MARKET)
+    original = live.collection.name
+    other = rag_module.StartupRAG(
+        client=chroma_client, collection=live.collection, embedding_fn=stub_embedding, dedup=None
+    )
+    fake_redis.setex(rag_module._SERVING_KEY_PREFIX + "other", 90, original)
+
+    first = rag_module.reindex_rag()
+    names = {collection.name for collection in chroma_client.list_collections()}
+    # The other worker still serves the original collection, so it survives GC
+    assert original in names
+
+    assert other._follow_alias()
+    assert other.collection.name == first
+    assert MARKET.strip()[:60] in _documents(other.collection)
+
+    fake_redis.setex(rag_module._SERVING_KEY_PREFIX + "other", 90, first)
+    second = rag_module.reindex_rag()
+    names = {collection.name for collection in chroma_client.list_collections()}
+    assert original not in names
+    assert {first, second} <= names
+
+
+def test_reembedding_reindex_rebuilds_the_numpy_mirror(rag_module, live, monkeypatch, make_stub_embedding):
+    monkeypatch.setattr(rag_module, "VECTOR_STORE", "numpy")
+    _ingest(rag_module, "market.txt", MARKET)
+    _ingest(rag_module, "team.txt", TEAM)
+    live.store = rag_module._build_vector_store(live.collection)
+    assert live.store.dim == 32
+
+    live.embedding_fn = make_stub_embedding(16)
+    rag_module.reindex_rag(reembed=True)
+
+    # Same content ids, new vectors: a plain sync would have kept the 32-d rows
+    assert live.store.dim == 16
+    assert live.store.vectors_path.parent == rag_module.NUMPY_STORE_PATH.parent
+    query = live.embedding_fn.encode_query(TEAM)
+    assert TEAM.strip()[:60] in live.store.search([query], 1)[1][0][0]
@@ -0,0 +1,44 @@
+from lexical_index import BM25Index
+
+FARM = "Доставка фермерских продуктов по подписке: овощи, молоко и мясо от местных хозяйств."
+TAXI = "Сервис заказа такси для малых городов с фиксированной ценой поездки и оплатой картой."
+EDU = "Онлайн-школа программирования для подростков с проектами и наставниками из индустрии."
+
+
+def _candidates():
+    ids = ["farm", "taxi", "edu", "short"]
+    documents = [FARM, TAXI, EDU, "фермерских"]
+    lexical = BM25Index()
+    lexical.add(zip(ids, documents))
+    return ids, documents, lexical
+
+
+def test_bm25_lifts_the_lexical_match_and_drops_short_chunks(rag_module):
+    ids, documents, lexical = _candidates()
+    # Vector order puts the farm chunk last
+    distances = [0.30, 0.20, 0.25, 0.10]
+
+    ranked = rag_module._rerank_chunks("доставка фермерских продуктов", ids, documents, distances, lexical)
+
+    assert ranked == [FARM, TAXI, EDU]
+
+
+def test_vector_weight_one_keeps_the_vector_order(rag_module):
+    ids, documents, lexical = _candidates()
+    distances = [0.30, 0.20, 0.25, 0.10]
+
+    ranked = rag_module._rerank_chunks(
+        "доставка фермерских продуктов", ids, documents, distances, lexical, vector_weight=1.0
+    )
+
+    assert ranked == [TAXI, EDU, FARM]
+
+
+def test_candidates_missing_from_the_index_are_scored(rag_module):
+    ids, documents, _ = _candidates()
+    lexical = BM25Index()
+
+    ranked = rag_module._rerank_chunks("онлайн-школа программирования", ids, documents, [0.2, 0.2, 0.2, 0.2], lexical)
+
+    assert ranked[0] == EDU
+    assert "edu" in lexical
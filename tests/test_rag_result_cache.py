@@ -0,0 +1,47 @@
+import redis
+
+
+class BrokenRedis:
+    def get(self, key):
+        raise redis.ConnectionError("down")
+
+    def incr(self, key):
+        raise redis.ConnectionError("down")
+
+
+class CountingRAG:
+    def __init__(self):
+        self.calls = 0
+
+    def query(self, text, top_k=3):
+        self.calls += 1
+        return [f"chunk {self.calls}"]
+
+
+def test_version_bump_invalidates_cached_results(rag_module, monkeypatch, fake_redis):
+    instance = CountingRAG()
+    monkeypatch.setattr(rag_module, "_RAG_INSTANCE", instance)
+    monkeypatch.setattr(rag_module, "get_redis", lambda: fake_redis)
+
+    assert rag_module.get_relevant_chunks("рынок агротеха") == ["chunk 1"]
+    assert rag_module.get_relevant_chunks("рынок агротеха") == ["chunk 1"]
+    assert instance.calls == 1
+
+    # Another worker ingests a file: only the shared version moves
+    fake_redis.incr(rag_module._VERSION_KEY)
+    assert rag_module.get_relevant_chunks("рынок агротеха") == ["chunk 2"]
+    assert instance.calls == 2
+
+
+def test_result_cache_is_bypassed_without_a_shared_version(rag_module, monkeypatch):
+    instance = CountingRAG()
+    monkeypatch.setattr(rag_module, "_RAG_INSTANCE", instance)
+
+    monkeypatch.setattr(rag_module, "get_redis", lambda: None)
+    rag_module.get_relevant_chunks("рынок агротеха")
+    rag_module.get_relevant_chunks("рынок агротеха")
+    assert instance.calls == 2
+
+    monkeypatch.setattr(rag_module, "get_redis", lambda: BrokenRedis())
+    rag_module.get_relevant_chunks("рынок агротеха")
+    assert instance.calls == 3
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+DOCS = [f"Раздел {n}: юнит-экономика подписочного сервиса доставки фермерских продуктов." for n in range(6)]
+
+
+@pytest.fixture
+def snapshot_cli(rag_module, chroma_client, monkeypatch):
+    import rag_snapshot
+
+    monkeypatch.setattr(rag_snapshot, "rag", rag_module)
+    monkeypatch.setattr(rag_module, "_build_client", lambda: chroma_client)
+    # Several pages on both sides of the round trip
+    monkeypatch.setattr(rag_module, "UPSERT_BATCH_SIZE", 1)
+    monkeypatch.setattr(rag_module, "BULK_UPSERT_BATCH_SIZE", 4)
+    return rag_snapshot
+
+
+def test_snapshot_round_trip_restores_vectors_without_the_model(
+    rag_module, snapshot_cli, chroma_client, stub_embedding, tmp_path, monkeypatch, fake_redis
+):
+    monkeypatch.setattr(rag_module, "get_redis", lambda: fake_redis)
+    live = chroma_client.create_collection(rag_module.COLLECTION_NAME, embedding_function=stub_embedding)
+    live.add(
+        ids=[rag_module._chunk_id(doc) for doc in DOCS],
+        documents=DOCS,
+        metadatas=[{"source": f"part{n % 2}.txt"} for n in range(len(DOCS))],
+    )
+    rag_module._save_manifest({"part0.txt": {"sha256": "x", "chunk_ids": []}})
+
+    meta = snapshot_cli.export_snapshot(tmp_path / "snap")
+    assert meta["rows"] == len(DOCS) and meta["dim"] == stub_embedding.dim
+    assert np.load(tmp_path / "snap" / "vectors.npy", mmap_mode="r").shape == (len(DOCS), stub_embedding.dim)
+
+    rag_module.MANIFEST_PATH.unlink()
+    name = snapshot_cli.import_snapshot(tmp_path / "snap")
+
+    assert rag_module._active_collection_name(chroma_client) == name
+    assert rag_module._collection_version() == 1
+    assert json.loads(rag_module.MANIFEST_PATH.read_text(encoding="utf-8"))["files"] == {
+        "part0.txt": {"sha256": "x", "chunk_ids": []}
+    }
+    include = ["embeddings", "documents", "metadatas"]
+    original = live.get(include=include)
+    restored = chroma_client.get_collection(name).get(ids=original["ids"], include=include)
+    by_id = {cid: n for n, cid in enumerate(restored["ids"])}
+    for n, cid in enumerate(original["ids"]):
+        assert restored["documents"][by_id[cid]] == original["documents"][n]
+        assert restored["metadatas"][by_id[cid]] == original["metadatas"][n]
+        np.testing.assert_allclose(restored["embeddings"][by_id[cid]], original["embeddings"][n], rtol=1e-6)
+
+
+def test_snapshot_from_another_model_is_refused(rag_module, snapshot_cli, chroma_client, tmp_path):
+    (tmp_path / "meta.json").write_text(json.dumps({"model": "other-model", "rows": 0, "dim": 4}), encoding="utf-8")
+
+    with pytest.raises(SystemExit, match="other-model"):
+        snapshot_cli.import_snapshot(tmp_path)
+    assert chroma_client.list_collections() == []
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def model_dir(rag_module, monkeypatch, tmp_path):
+    path = tmp_path / "model"
+    monkeypatch.setattr(rag_module, "EMBEDDING_MODEL_DIR", path)
+    return path
+
+
+def test_model_loads_from_the_local_directory_with_safetensors(rag_module, monkeypatch, model_dir):
+    loads = []
+    monkeypatch.setattr(rag_module, "SentenceTransformer", lambda source, **kwargs: loads.append((source, kwargs)))
+
+    rag_module._load_embedding_model("torch")
+    model_dir.mkdir()
+    (model_dir / "config.json").write_text("{}")
+    (model_dir / "model.safetensors").write_bytes(b"")
+    rag_module._load_embedding_model("torch")
+
+    hub, local = loads
+    assert hub[0] == rag_module.EMBEDDING_MODEL_NAME and hub[1]["local_files_only"] is False
+    assert local[0] == str(model_dir)
+    assert local[1]["local_files_only"] is True
+    assert local[1]["model_kwargs"] == {"low_cpu_mem_usage": True, "use_safetensors": True}
+
+
+def test_build_warms_up_the_model_and_times_each_phase(rag_module, monkeypatch, chroma_client, stub_embedding):
+    warmups = []
+    stub_embedding.warmup = lambda: warmups.append(True)
+    monkeypatch.setattr(rag_module, "E5EmbeddingFunction", lambda: stub_embedding)
+    monkeypatch.setattr(rag_module, "_build_client", lambda: chroma_client)
+    (rag_module.DOCS_DIR / "market.txt").write_text("Рынок фермерских продуктов растёт. " * 5, encoding="utf-8")
+
+    instance = rag_module.StartupRAG.build()
+
+    assert warmups == [True]
+    assert instance.collection.count() == 1
+    assert set(rag_module._STARTUP_TIMINGS) == {
+        "model_load", "warmup", "client", "collection", "sync", "lexical", "vector_store",
+    }
@@ -0,0 +1,50 @@
+import pytest
+
+from lexical_index import BM25Index
+
+PAGE = "Рынок фермерских продуктов в России растёт за счёт доставки и подписок. " * 5
+
+
+def _ingest(rag, collection, segments, path):
+    return rag._ingest_stream(collection, BM25Index(), segments, path, header="Source: test.pdf\n\n")
+
+
+def test_stream_ingest_publishes_the_text_file_only_on_success(rag_module, chroma_collection):
+    path = rag_module.DOCS_DIR / "report.txt"
+
+    added = _ingest(rag_module, chroma_collection, iter([PAGE, PAGE.upper()]), path)
+
+    assert added == chroma_collection.count() > 0
+    assert path.read_text(encoding="utf-8").startswith("Source: test.pdf")
+    assert list(rag_module.DOCS_DIR.iterdir()) == [path]
+    assert sorted(rag_module._load_manifest()["files"]["report.txt"]["chunk_ids"]) == sorted(
+        chroma_collection.get()["ids"]
+    )
+
+
+def test_failed_stream_ingest_leaves_no_file_or_chunks(rag_module, chroma_collection, monkeypatch):
+    # Small windows and batches: some chunks are stored before the failure
+    monkeypatch.setattr(rag_module, "STREAM_WINDOW_CHARS", 200)
+    monkeypatch.setattr(rag_module, "UPSERT_BATCH_SIZE", 1)
+    path = rag_module.DOCS_DIR / "broken.txt"
+
+    def pages():
+        yield PAGE
+        yield PAGE.upper()
+        raise ValueError("corrupt page")
+
+    with pytest.raises(ValueError):
+        _ingest(rag_module, chroma_collection, pages(), path)
+
+    assert list(rag_module.DOCS_DIR.iterdir()) == []
+    assert chroma_collection.count() == 0
+    assert "broken.txt" not in rag_module._load_manifest().get("files", {})
+
+
+def test_stream_without_text_is_not_kept(rag_module, chroma_collection):
+    path = rag_module.DOCS_DIR / "scan.txt"
+
+    # A scanned PDF: pages without extractable text, only the header would remain
+    assert _ingest(rag_module, chroma_collection, iter(["", "  "]), path) == 0
+    assert list(rag_module.DOCS_DIR.iterdir()) == []
+    assert chroma_collection.count() == 0
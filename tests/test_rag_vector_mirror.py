@@ -0,0 +1,31 @@
+from vector_store import NumpyVectorStore
+
+TEXT = "Рынок фермерских продуктов в России растёт за счёт доставки и подписок на наборы. " * 3
+
+
+def _no_full_sync(collection):
+    raise AssertionError("a write must not re-list the collection")
+
+
+def test_added_documents_reach_the_numpy_mirror_at_once(
+    rag_module, monkeypatch, tmp_path, chroma_client, chroma_collection, stub_embedding
+):
+    store = NumpyVectorStore(tmp_path / "vectors")
+    store.sync(chroma_collection)
+    instance = rag_module.StartupRAG(
+        client=chroma_client, collection=chroma_collection, embedding_fn=stub_embedding, dedup=None, store=store
+    )
+    monkeypatch.setattr(rag_module, "_RAG_INSTANCE", instance)
+    monkeypatch.setattr(store, "sync", _no_full_sync)
+
+    instance.add_documents([TEXT])
+    path = rag_module.DOCS_DIR / "notes.txt"
+    path.write_text(TEXT.upper(), encoding="utf-8")
+    rag_module.add_file_to_rag(path)
+
+    assert len(store) == chroma_collection.count() == 2
+    path.write_text("Команда из трёх основателей с опытом в логистике и ритейле. " * 3, encoding="utf-8")
+    rag_module.add_file_to_rag(path)
+    # The file's old chunk left the mirror along with the collection
+    assert sorted(store.documents(chroma_collection.get()["ids"])) == sorted(chroma_collection.get()["ids"])
+    assert len(store) == 2
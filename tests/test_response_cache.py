@@ -0,0 +1,37 @@
+import numpy as np
+
+from response_cache import ResponseCache
+
+
+def test_exact_hit_ignores_case_and_whitespace(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    cache = ResponseCache("test_exact", salt="prompt-v1")
+
+    value, _ = cache.lookup("/test", "Маркетплейс  для фермеров")
+    assert value is None
+
+    cache.store("Маркетплейс  для фермеров", {"investment_score": 7})
+    value, _ = cache.lookup("/test", "  маркетплейс для ФЕРМЕРОВ ")
+    assert value == {"investment_score": 7}
+
+
+def test_semantic_hit_above_threshold(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    vectors = {
+        "a": np.array([1.0, 0.0], dtype=np.float32),
+        "b": np.array([0.99, 0.141], dtype=np.float32),
+        "c": np.array([0.0, 1.0], dtype=np.float32),
+    }
+    cache = ResponseCache(
+        "test_semantic",
+        embed_fn=lambda text: vectors[text].tolist(),
+        semantic=True,
+        semantic_threshold=0.95,
+    )
+
+    value, embedding = cache.lookup("/test", "a")
+    assert value is None
+    cache.store("a", {"investment_score": 5}, embedding)
+
+    assert cache.lookup("/test", "b")[0] == {"investment_score": 5}
+    assert cache.lookup("/test", "c")[0] is None
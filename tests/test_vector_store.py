@@ -0,0 +1,186 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from vector_store import NumpyVectorStore, PQVectorStore
+
+
+def _unit(rng, n, dim=8):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_numpy_store_exact_search_survives_reload_and_tombstones(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = _unit(rng, 50)
+    ids = [f"chunk_{i}" for i in range(50)]
+    store = NumpyVectorStore(tmp_path / "vectors")
+    store.append(ids, vectors, [f"doc {i}" for i in range(50)])
+
+    found, docs, distances = store.search([vectors[7].tolist()], 3)
+    assert found[0][0] == "chunk_7" and docs[0][0] == "doc 7"
+    assert abs(distances[0][0]) < 1e-5
+    assert distances[0] == sorted(distances[0])
+
+    store.remove(["chunk_7"])
+    reloaded = NumpyVectorStore(tmp_path / "vectors")
+    reloaded.load()
+    assert len(reloaded) == 49
+    assert "chunk_7" not in reloaded.search([vectors[7].tolist()], 5)[0][0]
+    assert reloaded.documents(["chunk_8", "chunk_7"]) == {"chunk_8": "doc 8"}
+
+
+def test_pq_store_ranks_nearest_first_and_reloads_codebook(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = _unit(rng, 300)
+    ids = [f"chunk_{i}" for i in range(300)]
+    store = PQVectorStore(tmp_path / "vectors", subvectors=4, refine=0, min_train_size=256)
+    store.append(ids, vectors, ids)
+
+    assert store.trained
+    assert store.codes_path.stat().st_size == 300 * 4
+    assert "chunk_3" in store.search([vectors[3].tolist()], 5)[0][0]
+
+    reloaded = PQVectorStore(tmp_path / "vectors", subvectors=4, refine=0, min_train_size=256)
+    reloaded.load()
+    assert len(reloaded) == 300 and reloaded.trained
+    assert reloaded.search([vectors[3].tolist()], 5)[0] == store.search([vectors[3].tolist()], 5)[0]
+
+
+def test_pq_store_serves_exact_rows_until_it_has_enough_to_train(tmp_path):
+    rng = np.random.default_rng(4)
+    vectors = _unit(rng, 400)
+    store = PQVectorStore(tmp_path / "vectors", subvectors=4, min_train_size=300)
+    # A first small upload must not become the codebook
+    store.append([f"c{i}" for i in range(5)], vectors[:5], ["doc"] * 5)
+    assert not store.trained and not store.codebook_path.exists()
+    found, _, distances = store.search([vectors[2].tolist()], 1)
+    assert found == [["c2"]] and abs(distances[0][0]) < 1e-3
+
+    other = PQVectorStore(tmp_path / "vectors", subvectors=4, min_train_size=300)
+    other.load()
+    other.append([f"c{i}" for i in range(5, 350)], vectors[5:350], ["doc"] * 345)
+    assert other.trained
+    # Codes cover the rows written before training, and the first process adopts the codebook
+    store.append([f"c{i}" for i in range(350, 400)], vectors[350:], ["doc"] * 50)
+    assert store.trained
+    np.testing.assert_array_equal(store.codebook, other.codebook)
+    assert store.codes_path.stat().st_size == 400 * 4
+
+
+class _NoCollection:
+    def get(self, **kwargs):
+        raise AssertionError("refine must not query Chroma")
+
+
+def test_pq_refine_rescores_with_local_rows(tmp_path):
+    rng = np.random.default_rng(5)
+    vectors = _unit(rng, 600)
+    ids = [f"c{i}" for i in range(600)]
+    store = PQVectorStore(tmp_path / "vectors", subvectors=4, refine=8, min_train_size=256)
+    store.append(ids, vectors, ids)
+    store.collection = _NoCollection()
+
+    found, _, distances = store.search(vectors[:20].tolist(), 3)
+
+    assert [row[0] for row in found] == ids[:20]
+    assert max(abs(row[0]) for row in distances) < 1e-3
+    assert all(row == sorted(row) for row in distances)
+
+
+class _ListingSpy:
+    """Collection wrapper counting `get` calls that list the whole collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.listings = 0
+
+    def get(self, ids=None, **kwargs):
+        self.listings += ids is None
+        return self.collection.get(ids=ids, **kwargs)
+
+
+def test_numpy_store_mirrors_a_write_without_listing_the_collection(tmp_path, chroma_collection):
+    chroma_collection.add(ids=["a", "b"], documents=["рынок доставки", "команда стартапа"])
+    store = NumpyVectorStore(tmp_path / "vectors")
+    store.sync(chroma_collection)
+
+    chroma_collection.add(ids=["c"], documents=["инвестиции в агротех"])
+    chroma_collection.delete(ids=["a"])
+    store.collection = spy = _ListingSpy(chroma_collection)
+    store.apply(["b", "c"], ["a"])
+
+    assert spy.listings == 0
+    assert sorted(store.documents(["a", "b", "c"])) == ["b", "c"]
+    assert len(store) == 2
+
+
+def test_two_processes_mirroring_into_one_path_keep_each_others_rows(tmp_path):
+    rng = np.random.default_rng(2)
+    x, y, z = _unit(rng, 3)
+    first = NumpyVectorStore(tmp_path / "vectors")
+    second = NumpyVectorStore(tmp_path / "vectors")
+    first.load()
+    second.load()
+
+    first.append(["doc-x"], x[None], ["x"])
+    # `second` has not seen x; its write must land after it, not over it
+    second.append(["doc-y"], y[None], ["y"])
+    first.append(["doc-z"], z[None], ["z"])
+    second.remove(["doc-x"])
+
+    for store in (first, second):
+        store.load()
+        assert store.search([y.tolist()], 1)[0] == [["doc-y"]]
+        assert store.search([z.tolist()], 1)[0] == [["doc-z"]]
+        assert store.documents(["doc-x", "doc-y", "doc-z"]) == {"doc-y": "y", "doc-z": "z"}
+    assert abs(second.search([y.tolist()], 1)[2][0][0]) < 1e-5
+    assert len(second) == 2
+
+
+def test_writer_reloads_after_another_process_replaces_the_files(tmp_path):
+    rng = np.random.default_rng(3)
+    old, new, extra = _unit(rng, 3)
+    serving = NumpyVectorStore(tmp_path / "vectors")
+    serving.append(["old"], old[None], ["old"])
+    rebuilt = NumpyVectorStore(tmp_path / "scratch")
+    rebuilt.append(["new"], new[None], ["new"])
+
+    rebuilt.move_to(tmp_path / "vectors")
+    serving.append(["extra"], extra[None], ["extra"])
+
+    assert serving.documents(["old", "new", "extra"]) == {"new": "new", "extra": "extra"}
+    assert serving.search([new.tolist()], 1)[0] == [["new"]]
+    rebuilt.load()
+    assert len(rebuilt) == 2
+
+
+def _append_rows(path, worker, rows):
+    store = NumpyVectorStore(path)
+    store.load()
+    for i in range(rows):
+        vector = np.zeros(8, dtype=np.float32)
+        vector[worker] = 1.0
+        vector[4 + i % 4] = i / rows
+        store.append([f"w{worker}-{i}"], vector[None], [f"{worker}:{i}"])
+
+
+def test_concurrent_processes_never_overwrite_rows(tmp_path):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs fork")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_append_rows, args=(tmp_path / "vectors", w, 40)) for w in range(2)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(30)
+        assert process.exitcode == 0
+
+    store = NumpyVectorStore(tmp_path / "vectors")
+    store.load()
+    assert len(store) == 80
+    for cid, row in store._rows.items():
+        worker, i = map(int, store._docs[row].split(":"))
+        assert cid == f"w{worker}-{i}"
+        assert store._matrix[row][worker] == 1.0 and np.isclose(store._matrix[row][4 + i % 4], i / 40)
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import yandex_gpt_client as client
+from llm_rate_limiter import RateLimitExceeded
+from yandex_gpt_client import CircuitBreaker, YandexGPTError
+
+
+def test_retries_honor_retry_after_and_breaker_fails_fast(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(client.time, "sleep", sleeps.append)
+    monkeypatch.setattr(client, "BREAKER", CircuitBreaker(failure_threshold=2, reset_seconds=60))
+
+    calls = iter([YandexGPTError("rate_limit", "Rate limit exceeded", 429, retry_after=3.0), "ok"])
+
+    def flaky():
+        result = next(calls)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert client._with_retries(flaky) == "ok"
+    assert sleeps == [3.0]
+
+    def down():
+        raise YandexGPTError("server_error", "YandexGPT server error", 503)
+
+    with pytest.raises(YandexGPTError):
+        client._with_retries(down)
+    assert client.BREAKER.state == "open"
+    with pytest.raises(YandexGPTError) as exc_info:
+        client._with_retries(lambda: "never called")
+    assert exc_info.value.code == "circuit_open"
+    assert exc_info.value.status_code == 503
+
+
+def test_cancelled_probe_frees_the_half_open_slot(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    monkeypatch.setattr(client, "BREAKER", breaker)
+    breaker.record_failure()
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(client._awith_retries(cancelled))
+    # Cancellation is neither success nor failure: the breaker waits for a new probe
+    assert breaker.state == "half_open"
+    assert not breaker._probing
+
+    async def ok():
+        return "ok"
+
+    assert asyncio.run(client._awith_retries(ok)) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_unexpected_error_in_probe_reopens_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    monkeypatch.setattr(client, "BREAKER", breaker)
+    breaker.record_failure()
+    breaker._opened_at -= 60
+
+    def broken():
+        raise ValueError("Expecting value")
+
+    with pytest.raises(ValueError):
+        client._with_retries(broken)
+    assert breaker.state == "open"
+    assert not breaker._probing
+
+
+def test_rate_limit_in_an_outage_does_not_reset_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    monkeypatch.setattr(client, "BREAKER", breaker)
+    monkeypatch.setattr(client, "RETRY_MAX_ATTEMPTS", 1)
+    errors = [
+        YandexGPTError("server_error", "YandexGPT server error", 503),
+        YandexGPTError("server_error", "YandexGPT server error", 503),
+        YandexGPTError("rate_limit", "Rate limit exceeded", 429),
+        YandexGPTError("server_error", "YandexGPT server error", 503),
+    ]
+    for error in errors:
+        def fail(error=error):
+            raise error
+
+        with pytest.raises(YandexGPTError):
+            client._with_retries(fail)
+    assert breaker.state == "open"
+
+    # A 429 from the half-open probe frees the slot but does not close the breaker
+    breaker._opened_at -= 60
+
+    def limited():
+        raise YandexGPTError("rate_limit", "Rate limit exceeded", 429)
+
+    with pytest.raises(YandexGPTError):
+        client._with_retries(limited)
+    assert breaker.state == "half_open"
+    assert not breaker._probing
+
+
+class _SpyLimiter:
+    def __init__(self, exhausted=False):
+        self.acquired = []
+        self.exhausted = exhausted
+
+    def acquire(self, tokens=0):
+        self.acquired.append(tokens)
+        if self.exhausted:
+            raise RateLimitExceeded(2.0)
+
+
+def test_open_breaker_rejects_before_taking_rate_limit_quota(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    limiter = _SpyLimiter()
+    monkeypatch.setattr(client, "BREAKER", breaker)
+    monkeypatch.setattr(client, "LIMITER", limiter)
+    breaker.record_failure()
+
+    with pytest.raises(YandexGPTError) as exc_info:
+        client._with_retries(lambda: "never called", tokens=500)
+    assert exc_info.value.code == "circuit_open"
+    assert limiter.acquired == []
+
+
+def test_rate_limited_probe_frees_the_half_open_slot(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    monkeypatch.setattr(client, "BREAKER", breaker)
+    monkeypatch.setattr(client, "LIMITER", _SpyLimiter(exhausted=True))
+    breaker.record_failure()
+
+    with pytest.raises(YandexGPTError) as exc_info:
+        client._with_retries(lambda: "never called", tokens=500)
+    assert exc_info.value.code == "rate_limited"
+    assert breaker.state == "half_open"
+    assert not breaker._probing
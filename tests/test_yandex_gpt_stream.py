@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+import httpx
+
+import yandex_gpt_client as client
+
+
+def _line(text, usage=None):
+    result = {"alternatives": [{"message": {"role": "assistant", "text": text}}]}
+    if usage:
+        result["usage"] = usage
+    return json.dumps({"result": result}, ensure_ascii=False)
+
+
+def test_stream_yields_each_piece_of_text_once(monkeypatch):
+    # The third line rewrites text that was already sent
+    lines = [_line("Hel"), _line("Hello"), _line("Help me"), _line("Help me now", {"totalTokens": "7"})]
+
+    def handler(request):
+        return httpx.Response(200, content="\n".join(lines).encode("utf-8"))
+
+    async def collect():
+        monkeypatch.setattr(client, "_ASYNC_CLIENT", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(client, "_ASYNC_SEMAPHORE", None)
+        try:
+            return [item async for item in client._astream_once("https://llm.test/completion", {}, {}, 5)]
+        finally:
+            await client.aclose_client()
+
+    chunks = asyncio.run(collect())
+    assert [delta for delta, _ in chunks] == ["Hel", "lo", "me", " now"]
+    assert chunks[-1][1] == {"totalTokens": "7"}
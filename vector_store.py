@@ -0,0 +1,561 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single worker per store path
+    fcntl = None
+
+if TYPE_CHECKING:
+    from chromadb.api.models.Collection import Collection
+
+# (ids, documents, cosine distances) per query, best first
+SearchResult = Tuple[List[List[str]], List[List[str]], List[List[float]]]
+
+FETCH_PAGE_SIZE = 1000
+
+
+def _write_at(path: Path, offset: int, rows: np.ndarray) -> None:
+    """Write `rows` at byte `offset`, dropping anything after it.
+
+    Bytes past the last logged row are left over from a crash before its
+    log write, so they are overwritten rather than kept.
+    """
+    with open(path, "ab") as out:
+        out.seek(offset)
+        out.truncate()
+        out.write(rows.tobytes())
+        out.flush()
+        os.fsync(out.fileno())
+
+
+@contextmanager
+def _file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock shared by every process using `path`; released when the file closes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        yield
+
+
+class ChromaVectorStore:
+    """Query side of the chunk index served by Chroma (HNSW, possibly remote)."""
+
+    def __init__(self, collection: Collection):
+        self.collection = collection
+
+    def search(self, query_embeddings: List[List[float]], k: int) -> SearchResult:
+        result = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            include=["documents", "distances"],
+        )
+        return result["ids"], result["documents"], result["distances"]
+
+    def documents(self, ids: List[str]) -> Dict[str, str]:
+        if not ids:
+            return {}
+        page = self.collection.get(ids=ids, include=["documents"])
+        return dict(zip(page["ids"], page["documents"]))
+
+    def sync(self, collection: Collection) -> None:
+        self.collection = collection
+
+    def apply(self, added: List[str], removed: List[str]) -> None:
+        """Chroma serves its own writes; nothing to mirror."""
+
+    def __len__(self) -> int:
+        return self.collection.count()
+
+
+class NumpyVectorStore:
+    """Exact dot-product search over a memory-mapped matrix, mirrored from Chroma.
+
+    Chroma stays the system of record for writes. `sync` appends vectors of
+    new ids to `<path>.<dtype>` and tombstones removed ones; `apply` does the
+    same for one write batch without listing the collection. The row log
+    `<path>.<dtype>.jsonl` holds ids and texts, so a restart only replays it. Search
+    is a blocked matrix product with `argpartition` top-k, no HNSW and no
+    network round trip. Vectors are assumed normalized (E5), so the dot
+    product is cosine similarity. Rows can be stored as float16 to halve memory.
+
+    Every worker process mirrors into the same files. Writes take an `fcntl`
+    lock on `<path>.<dtype>.lock` and first replay what other processes
+    appended to the log, so rows are only ever added at the real end of the
+    file. Searches read the memmap without the lock.
+    """
+
+    def __init__(self, path: Path, dim: int | None = None, dtype: str = "float32", block_rows: int = 65536):
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = self._file_paths(path)["vectors_path"]
+        self.dim = dim
+        self.block_rows = block_rows
+        self._lock = threading.RLock()
+        self._writing = False
+        self._ids: List[str] = []
+        self._docs: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._log_offset = 0
+        self._log_inode: int | None = None
+        self._matrix: np.ndarray | None = None
+        self.collection: Collection | None = None
+
+    def _file_paths(self, path: Path) -> Dict[str, Path]:
+        return {"vectors_path": Path(f"{path}.{self.dtype.name}")}
+
+    def move_to(self, path: Path) -> None:
+        """Take over the files of prefix `path`, e.g. after a rebuild under a scratch prefix."""
+        with self._lock:
+            log_path = self.log_path
+            targets = self._file_paths(path)
+            # Other processes see the new log inode on their next write and reload
+            with _file_lock(Path(f"{targets['vectors_path']}.lock")):
+                for attr, target in targets.items():
+                    source = getattr(self, attr)
+                    if source.exists():
+                        os.replace(source, target)
+                    setattr(self, attr, target)
+                if log_path.exists():
+                    os.replace(log_path, self.log_path)
+            self._remap()
+
+    @property
+    def log_path(self) -> Path:
+        # One row log per vector file, so switching dtype never misaligns rows
+        return Path(f"{self.vectors_path}.jsonl")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def load(self) -> None:
+        """Replay the row log; drops a torn tail left by a crash mid-append."""
+        with self._lock:
+            self._reset()
+            # Catching up from an empty state replays the whole log
+            with self._writer():
+                pass
+
+    @contextmanager
+    def _writer(self) -> Iterator[None]:
+        """Hold the cross-process write lock, caught up with other processes' writes."""
+        with self._lock:
+            if self._writing:
+                yield
+                return
+            with _file_lock(Path(f"{self.vectors_path}.lock")):
+                self._writing = True
+                try:
+                    self._catch_up()
+                    yield
+                finally:
+                    self._writing = False
+
+    def _reset(self) -> None:
+        self._ids, self._docs, self._rows = [], [], {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._log_offset, self._log_inode = 0, None
+
+    def _catch_up(self) -> None:
+        try:
+            stat = self.log_path.stat()
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+            # The log was replaced (rebuild, compaction) or removed: start over
+            self._reset()
+        if stat is not None and stat.st_size > self._log_offset:
+            self._replay()
+        elif not self._ids:
+            self._remap()
+
+    def _replay(self) -> None:
+        """Apply log entries past `_log_offset`, cutting off a torn tail."""
+        torn = False
+        with open(self.log_path, "rb") as log:
+            self._log_inode = os.fstat(log.fileno()).st_ino
+            log.seek(self._log_offset)
+            for line in log:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    item = json.loads(line)
+                except ValueError:
+                    torn = True
+                    break
+                self._log_offset += len(line)
+                if "del" in item:
+                    self._rows.pop(item["del"], None)
+                    continue
+                self.dim = self.dim or item.get("dim")
+                self._rows[item["id"]] = len(self._ids)
+                self._ids.append(item["id"])
+                self._docs.append(item["doc"])
+        rows_on_disk = self._rows_on_disk()
+        if rows_on_disk < len(self._ids):
+            # Vectors were not fully written for the last log entries
+            torn = True
+            for cid in self._ids[rows_on_disk:]:
+                if self._rows.get(cid, -1) >= rows_on_disk:
+                    del self._rows[cid]
+            del self._ids[rows_on_disk:], self._docs[rows_on_disk:]
+        self._alive = np.zeros(len(self._ids), dtype=bool)
+        self._alive[list(self._rows.values())] = True
+        if torn:
+            self._rewrite_log()
+        self._remap()
+
+    def _rewrite_log(self) -> None:
+        """Write the log back from memory, so later appends line up with vector rows."""
+        tmp_path = self.log_path.with_name(f"{self.log_path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as log:
+            for row, (cid, doc) in enumerate(zip(self._ids, self._docs)):
+                log.write(json.dumps({"id": cid, "doc": doc, "dim": self.dim}, ensure_ascii=False) + "\n")
+                if not self._alive[row]:
+                    log.write(json.dumps({"del": cid}) + "\n")
+        os.replace(tmp_path, self.log_path)
+        self._log_written()
+
+    def _log_written(self) -> None:
+        """Record the log end after a write under the lock; nobody else appended meanwhile."""
+        stat = self.log_path.stat()
+        self._log_offset, self._log_inode = stat.st_size, stat.st_ino
+
+    def _row_width(self) -> int:
+        return self.dim or 0
+
+    def _rows_on_disk(self) -> int:
+        if not self._row_width() or not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (self._row_width() * self.dtype.itemsize)
+
+    def _remap(self) -> None:
+        count = len(self._ids)
+        if not count or not self._row_width():
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(count, self._row_width()))
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(self.dtype)
+
+    def _write_rows(self, start: int, vectors: np.ndarray) -> None:
+        _write_at(self.vectors_path, start * self._row_width() * self.dtype.itemsize, self._encode(vectors))
+
+    def append(self, ids: List[str], vectors: np.ndarray, docs: List[str]) -> None:
+        """Append rows; an id already present is tombstoned and re-added."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(ids):
+            return
+        self.vectors_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._writer():
+            self.dim = self.dim or int(vectors.shape[1])
+            self.remove([cid for cid in ids if cid in self._rows])
+            start = len(self._ids)
+            # Vectors first: a crash before the log write leaves unused bytes, never unknown rows
+            self._write_rows(start, vectors)
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                for cid, doc in zip(ids, docs):
+                    log.write(json.dumps({"id": cid, "doc": doc, "dim": self.dim}, ensure_ascii=False) + "\n")
+            self._log_written()
+            for offset, (cid, doc) in enumerate(zip(ids, docs)):
+                self._rows[cid] = start + offset
+                self._ids.append(cid)
+                self._docs.append(doc)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            self._remap()
+
+    def remove(self, ids: List[str]) -> None:
+        with self._writer():
+            gone = [cid for cid in dict.fromkeys(ids) if cid in self._rows]
+            if not gone:
+                return
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                for cid in gone:
+                    self._alive[self._rows.pop(cid)] = False
+                    log.write(json.dumps({"del": cid}) + "\n")
+            self._log_written()
+
+    def sync(self, collection: Collection) -> None:
+        """Reconcile with `collection`: append missing ids, tombstone removed ones."""
+        self.collection = collection
+        stored: List[str] = []
+        offset = 0
+        while True:
+            page = collection.get(include=[], limit=FETCH_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            stored.extend(page["ids"])
+            offset += len(page["ids"])
+        stored_set = set(stored)
+        with self._writer():
+            extra = [cid for cid in self._rows if cid not in stored_set]
+            missing = [cid for cid in stored if cid not in self._rows]
+        self.remove(extra)
+        for i in range(0, len(missing), FETCH_PAGE_SIZE):
+            page = collection.get(ids=missing[i:i + FETCH_PAGE_SIZE], include=["embeddings", "documents"])
+            self.append(page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["documents"])
+
+    def apply(self, added: List[str], removed: List[str]) -> None:
+        """Mirror one write to the synced collection: fetch only the `added` ids."""
+        self.remove(removed)
+        with self._writer():
+            added = [cid for cid in dict.fromkeys(added) if cid not in self._rows]
+        if self.collection is None:
+            return
+        for i in range(0, len(added), FETCH_PAGE_SIZE):
+            page = self.collection.get(ids=added[i:i + FETCH_PAGE_SIZE], include=["embeddings", "documents"])
+            if page["ids"]:
+                self.append(page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["documents"])
+
+    def _scores(self, queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), self.block_rows):
+            block = np.asarray(matrix[start:start + self.block_rows], dtype=np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def _scan_matrix(self) -> np.ndarray | None:
+        """Rows scored for every query; subclasses may scan a compressed copy."""
+        return self._matrix
+
+    def _fetch_k(self, k: int, scan: np.ndarray) -> int:
+        return k
+
+    def _refine(
+        self, queries: np.ndarray, top: np.ndarray, top_scores: np.ndarray, matrix: np.ndarray, scan: np.ndarray
+    ) -> np.ndarray:
+        return top_scores
+
+    def search(self, query_embeddings: List[List[float]], k: int) -> SearchResult:
+        with self._lock:
+            matrix, alive, ids, docs = self._matrix, self._alive, self._ids, self._docs
+            scan = self._scan_matrix()
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if matrix is None or not len(queries):
+            return [[] for _ in queries], [[] for _ in queries], [[] for _ in queries]
+        alive = alive[:len(matrix)]
+        k = min(k, int(alive.sum()))
+        if k <= 0:
+            return [[] for _ in queries], [[] for _ in queries], [[] for _ in queries]
+
+        scores = self._scores(queries, scan)
+        scores[:, ~alive] = -np.inf
+        fetch = min(self._fetch_k(k, scan), int(alive.sum()))
+        top = np.argpartition(-scores, fetch - 1, axis=1)[:, :fetch]
+        top_scores = self._refine(queries, top, np.take_along_axis(scores, top, axis=1), matrix, scan)
+        order = np.argsort(-top_scores, axis=1, kind="stable")[:, :k]
+
+        out_ids, out_docs, out_distances = [], [], []
+        for row_top, row_scores, row_order in zip(top, top_scores, order):
+            keep = row_order[np.isfinite(row_scores[row_order])]
+            out_ids.append([ids[row_top[i]] for i in keep])
+            out_docs.append([docs[row_top[i]] for i in keep])
+            out_distances.append((1.0 - row_scores[keep]).tolist())
+        return out_ids, out_docs, out_distances
+
+    def documents(self, ids: List[str]) -> Dict[str, str]:
+        with self._lock:
+            return {cid: self._docs[self._rows[cid]] for cid in ids if cid in self._rows}
+
+
+class PQVectorStore(NumpyVectorStore):
+    """NumpyVectorStore that scans product-quantized codes instead of vectors.
+
+    Every vector is cut into `subvectors` slices and each slice is stored as
+    the uint8 index of its nearest of 256 k-means centroids, so a 384-d E5
+    vector is scanned as 48 bytes instead of 1536. Scores are approximate
+    (exact query against centroids); with `refine` the best `k * refine`
+    candidates are re-scored exactly against float16 rows kept next to the
+    codes, so only those rows are paged in and no query goes to Chroma.
+
+    The codebook is trained once the store holds `min_train_size` rows, on
+    up to `train_size` of them; until then every query is answered exactly
+    from the float16 rows. A codebook fitted to a handful of vectors would
+    quantize everything added later badly and is never retrained.
+    """
+
+    CENTROIDS = 256
+
+    def __init__(
+        self,
+        path: Path,
+        subvectors: int = 48,
+        refine: int = 4,
+        block_rows: int = 65536,
+        train_size: int = 10000,
+        min_train_size: int = 4096,
+    ):
+        self.subvectors = subvectors
+        self.codebook: np.ndarray | None = None  # (subvectors, 256, dim // subvectors)
+        self._codes: np.ndarray | None = None
+        self._codebook_inode: int | None = None
+        super().__init__(path, dtype="float16", block_rows=block_rows)
+        paths = self._file_paths(path)
+        self.codes_path = paths["codes_path"]
+        self.codebook_path = paths["codebook_path"]
+        self.refine = refine
+        self.train_size = train_size
+        self.min_train_size = max(min_train_size, self.CENTROIDS)
+
+    def _file_paths(self, path: Path) -> Dict[str, Path]:
+        return {
+            "vectors_path": Path(f"{path}.pq{self.subvectors}.float16"),
+            "codes_path": Path(f"{path}.pq{self.subvectors}"),
+            "codebook_path": Path(f"{path}.pq{self.subvectors}.codebook.npy"),
+        }
+
+    @property
+    def trained(self) -> bool:
+        return self._codes is not None
+
+    def _reset(self) -> None:
+        super()._reset()
+        # Files replaced by another process may come with another codebook
+        self.codebook = None
+        self._codes = None
+        self._codebook_inode = None
+
+    def _catch_up(self) -> None:
+        super()._catch_up()
+        # Another process may have trained without appending a row since
+        self._remap()
+
+    def _code_rows(self) -> int:
+        if not self.codes_path.exists():
+            return 0
+        return self.codes_path.stat().st_size // self.subvectors
+
+    def _remap(self) -> None:
+        super()._remap()
+        try:
+            inode = self.codebook_path.stat().st_ino
+        except FileNotFoundError:
+            inode = None
+        if inode is not None and inode != self._codebook_inode:
+            # Trained by this or another process
+            self.codebook = np.load(self.codebook_path)
+            self._codebook_inode = inode
+        count = len(self._ids)
+        if self.codebook is not None and count and self._code_rows() >= count:
+            self._codes = np.memmap(self.codes_path, dtype=np.uint8, mode="r", shape=(count, self.subvectors))
+        else:
+            self._codes = None
+
+    def train(self, vectors: np.ndarray, iterations: int = 15, seed: int = 0) -> None:
+        """Fit one 256-centroid k-means per subvector slice, persist it and encode every row."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] % self.subvectors:
+            raise ValueError(f"Dimension {vectors.shape[1]} is not divisible by {self.subvectors} subvectors")
+        rng = np.random.default_rng(seed)
+        if len(vectors) > self.train_size:
+            vectors = vectors[rng.choice(len(vectors), self.train_size, replace=False)]
+        slices = vectors.reshape(len(vectors), self.subvectors, -1)
+        codebook = np.empty((self.subvectors, self.CENTROIDS, slices.shape[2]), dtype=np.float32)
+        for j in range(self.subvectors):
+            points = slices[:, j]
+            start = rng.choice(len(points), self.CENTROIDS, replace=len(points) < self.CENTROIDS)
+            centroids = points[start].copy()
+            for _ in range(iterations):
+                assignment = self._nearest(points, centroids)
+                counts = np.bincount(assignment, minlength=self.CENTROIDS)
+                sums = np.stack(
+                    [
+                        np.bincount(assignment, weights=points[:, d], minlength=self.CENTROIDS)
+                        for d in range(points.shape[1])
+                    ],
+                    axis=1,
+                )
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            codebook[j] = centroids
+        self.codebook_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._writer():
+            self.codebook = codebook
+            self.dim = self.dim or vectors.shape[1]
+            # Codes of every row first: a codebook without codes is never used
+            self._write_codes(len(self._ids), np.zeros((0, self.dim), dtype=np.float32))
+            tmp_path = self.codebook_path.with_name(f"{self.codebook_path.name}.{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, "wb") as out:
+                np.save(out, codebook)
+            os.replace(tmp_path, self.codebook_path)
+            self._remap()
+
+    def _maybe_train(self) -> None:
+        with self._writer():
+            if self.codebook is not None or len(self._rows) < self.min_train_size:
+                return
+            alive = np.flatnonzero(self._alive)
+            if len(alive) > self.train_size:
+                alive = np.sort(np.random.default_rng(0).choice(alive, self.train_size, replace=False))
+            self.train(np.asarray(self._matrix[alive], dtype=np.float32))
+
+    @staticmethod
+    def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        distances = (centroids ** 2).sum(axis=1)[None, :] - 2 * points @ centroids.T
+        return distances.argmin(axis=1)
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        slices = vectors.reshape(len(vectors), self.subvectors, -1)
+        codes = np.empty((len(vectors), self.subvectors), dtype=np.uint8)
+        for j in range(self.subvectors):
+            codes[:, j] = self._nearest(slices[:, j], self.codebook[j])
+        return codes
+
+    def _write_codes(self, start: int, vectors: np.ndarray) -> None:
+        done = min(self._code_rows(), start)
+        if done < start:
+            # Rows appended before the codebook existed are encoded from their float16 copy
+            vectors = np.concatenate([np.asarray(self._matrix[done:start], dtype=np.float32), vectors])
+        _write_at(self.codes_path, done * self.subvectors, self._quantize(vectors))
+
+    def _write_rows(self, start: int, vectors: np.ndarray) -> None:
+        super()._write_rows(start, vectors)
+        if self.codebook is not None:
+            self._write_codes(start, vectors)
+
+    def append(self, ids: List[str], vectors: np.ndarray, docs: List[str]) -> None:
+        with self._writer():
+            super().append(ids, vectors, docs)
+            self._maybe_train()
+
+    def _scan_matrix(self) -> np.ndarray | None:
+        return self._codes if self._codes is not None else self._matrix
+
+    def _scores(self, queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        if matrix.dtype != np.uint8:
+            return super()._scores(queries, matrix)
+        # Per query: dot products of its slices with every centroid, looked up by code
+        tables = np.einsum("qmd,mcd->qmc", queries.reshape(len(queries), self.subvectors, -1), self.codebook)
+        subspace = np.arange(self.subvectors)
+        scores = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), self.block_rows):
+            codes = np.asarray(matrix[start:start + self.block_rows])
+            for qi, table in enumerate(tables):
+                scores[qi, start:start + len(codes)] = table[subspace, codes].sum(axis=1)
+        return scores
+
+    def _fetch_k(self, k: int, scan: np.ndarray) -> int:
+        return k * self.refine if self.refine > 1 and scan.dtype == np.uint8 else k
+
+    def _refine(
+        self, queries: np.ndarray, top: np.ndarray, top_scores: np.ndarray, matrix: np.ndarray, scan: np.ndarray
+    ) -> np.ndarray:
+        if self.refine <= 1 or scan.dtype != np.uint8:
+            return top_scores
+        rows, position = np.unique(top, return_inverse=True)
+        exact = np.asarray(matrix[rows], dtype=np.float32)[position.reshape(top.shape)]
+        refined = np.einsum("qd,qkd->qk", queries, exact)
+        # Tombstoned rows stay out
+        refined[~np.isfinite(top_scores)] = -np.inf
+        return refined
@@ -1,30 +1,155 @@
+import asyncio
 import json
 import os
+import random
+import threading
 import time
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Tuple, TypeVar
 
+import httpx
 import jwt
 import requests
 
+from context_assembly import estimate_tokens
+from llm_rate_limiter import RateLimitExceeded, TokenBucketLimiter
+from metrics import YANDEX_GPT_BREAKER_REJECTIONS, YANDEX_GPT_BREAKER_STATE, YANDEX_GPT_RETRIES
+
 
 DEFAULT_ENDPOINT = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
 IAM_ENDPOINT = "https://iam.api.cloud.yandex.net/iam/v1/tokens"
 DEFAULT_MODEL_URI_TEMPLATE = "gpt://{folder_id}/yandexgpt/latest"
 
+# Async client pool: keep-alive connections are reused across requests and the
+# number of in-flight generations per worker is capped by a semaphore.
+ASYNC_MAX_CONNECTIONS = int(os.getenv("YC_GPT_MAX_CONNECTIONS", "100"))
+ASYNC_MAX_CONCURRENCY = int(os.getenv("YC_GPT_MAX_CONCURRENCY", "64"))
+ASYNC_HTTP2 = os.getenv("YC_GPT_HTTP2", "true").lower() == "true"
+
+# Retries of 429/5xx/timeouts with decorrelated jitter; a Retry-After longer
+# than RETRY_MAX_SECONDS is not waited for
+RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("YC_GPT_RETRY_MAX_ATTEMPTS", "3")))
+RETRY_BASE_SECONDS = float(os.getenv("YC_GPT_RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("YC_GPT_RETRY_MAX_SECONDS", "8"))
+# Circuit breaker: this many failed calls in a row open it, calls then fail
+# fast until one probe succeeds after BREAKER_RESET_SECONDS
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("YC_GPT_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("YC_GPT_BREAKER_RESET_SECONDS", "30"))
+
+# Folder quota shared by every worker through Redis (see llm_rate_limiter);
+# calls queue up to RATE_LIMIT_MAX_WAIT_SECONDS for a slot. RPS 0 disables it
+RATE_LIMIT_RPS = float(os.getenv("YC_GPT_RATE_LIMIT_RPS", "10"))
+RATE_LIMIT_TPM = int(os.getenv("YC_GPT_RATE_LIMIT_TPM", "0"))
+RATE_LIMIT_BURST = float(os.getenv("YC_GPT_RATE_LIMIT_BURST", "0")) or None
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("YC_GPT_RATE_LIMIT_MAX_WAIT_SECONDS", "5"))
+# Without Redis each process gets 1/share of the limits
+RATE_LIMIT_LOCAL_SHARE = int(os.getenv("YC_GPT_RATE_LIMIT_LOCAL_SHARE", os.getenv("WEB_CONCURRENCY", "1")))
+MAX_COMPLETION_TOKENS = 800
+
+RETRYABLE_CODES = {"rate_limit", "server_error", "timeout", "unavailable"}
+# A 429 means the upstream is up and throttling, so it does not trip the breaker
+BREAKER_CODES = {"server_error", "timeout", "unavailable"}
+
+T = TypeVar("T")
+
 
 class YandexGPTError(Exception):
-    def __init__(self, code: str, message: str, status_code: int | None = None):
+    def __init__(
+        self, code: str, message: str, status_code: int | None = None, retry_after: float | None = None
+    ):
         super().__init__(message)
         self.code = code
         self.message = message
         self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker shared by every call in this process.
+
+    closed: calls go through. open: calls fail at once with `circuit_open`
+    until `reset_seconds` have passed. half-open: one probe call is let
+    through; its success closes the breaker, its failure opens it again.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = "closed"
+        YANDEX_GPT_BREAKER_STATE.set(0)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        YANDEX_GPT_BREAKER_STATE.set(self.STATES[state])
+
+    def before_call(self) -> bool:
+        """Let a call through or raise `circuit_open`; True means the call is the half-open probe."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._set_state("half_open")
+            if self.state == "closed" or (self.state == "half_open" and not self._probing):
+                self._probing = self.state == "half_open"
+                return self._probing
+            retry_after = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+        YANDEX_GPT_BREAKER_REJECTIONS.inc()
+        raise YandexGPTError("circuit_open", "YandexGPT is temporarily unavailable", 503, retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != "closed":
+                self._set_state("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self._probing = False
+                self._opened_at = time.monotonic()
+                self._set_state("open")
+
+    def release_probe(self, probe: bool) -> None:
+        """Free the probe slot of a call that ended without a verdict, e.g. a cancelled one."""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def record_result(self, exc: "YandexGPTError") -> None:
+        """Count a failed call.
+
+        Errors that say nothing about upstream health (429, bad request, auth)
+        leave the state and the failure count alone; the caller still frees a
+        probe slot with `release_probe`.
+        """
+        if exc.code in BREAKER_CODES:
+            self.record_failure()
 
 
 _CACHED_IAM_TOKEN: str | None = None
 _CACHED_IAM_EXP: float | None = None
 
+_ASYNC_CLIENT: httpx.AsyncClient | None = None
+_ASYNC_SEMAPHORE: asyncio.Semaphore | None = None
+
+BREAKER = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+LIMITER = TokenBucketLimiter(
+    "yandexgpt",
+    rps=RATE_LIMIT_RPS,
+    tpm=RATE_LIMIT_TPM,
+    burst=RATE_LIMIT_BURST,
+    max_wait=RATE_LIMIT_MAX_WAIT_SECONDS,
+    local_share=RATE_LIMIT_LOCAL_SHARE,
+)
+
 
 def _get_api_key() -> str | None:
     api_key = os.getenv("YC_API_KEY")
@@ -118,6 +243,12 @@ def _get_iam_token() -> str:
     return token
 
 
+def _iam_token_is_cached() -> bool:
+    if _get_api_key() or os.getenv("YC_IAM_TOKEN"):
+        return True
+    return bool(_CACHED_IAM_TOKEN and _CACHED_IAM_EXP and _CACHED_IAM_EXP - time.time() > 60)
+
+
 def _build_headers() -> Dict[str, str]:
     folder_id = os.getenv("YC_FOLDER_ID")
     api_key = _get_api_key()
@@ -146,7 +277,9 @@ def _build_headers() -> Dict[str, str]:
     }
 
 
-def _build_payload(system_prompt: str, user_prompt: str, folder_id: str) -> Dict[str, Any]:
+def _build_payload(
+    system_prompt: str, user_prompt: str, folder_id: str, stream: bool = False
+) -> Dict[str, Any]:
     model_uri = os.getenv(
         "YC_GPT_MODEL_URI",
         DEFAULT_MODEL_URI_TEMPLATE.format(folder_id=folder_id),
@@ -154,9 +287,9 @@ def _build_payload(system_prompt: str, user_prompt: str, folder_id: str) -> Dict
     return {
         "modelUri": model_uri,
         "completionOptions": {
-            "stream": False,
+            "stream": stream,
             "temperature": 0.2,
-            "maxTokens": 800,
+            "maxTokens": MAX_COMPLETION_TOKENS,
         },
         "messages": [
             {"role": "system", "text": system_prompt},
@@ -165,43 +298,48 @@ def _build_payload(system_prompt: str, user_prompt: str, folder_id: str) -> Dict
     }
 
 
-def call_yandex_gpt(system_prompt: str, user_prompt: str, timeout: int = 20) -> Tuple[str, Dict[str, str]]:
-    endpoint = os.getenv("YC_GPT_ENDPOINT", DEFAULT_ENDPOINT)
-    headers = _build_headers()
+def _get_folder_id() -> str:
     folder_id = os.getenv("YC_FOLDER_ID")
     if not folder_id:
         raise YandexGPTError(
             "config_error",
             "YC_IAM_TOKEN or YC_FOLDER_ID is missing in environment",
         )
-    payload = _build_payload(system_prompt, user_prompt, folder_id)
+    return folder_id
 
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
     try:
-        response = requests.post(
-            endpoint,
-            json=payload,
-            headers=headers,
-            timeout=timeout,
-        )
-    except requests.Timeout as exc:
-        raise YandexGPTError("timeout", "YandexGPT request timed out") from exc
-    except requests.RequestException as exc:
-        raise YandexGPTError("unavailable", "YandexGPT API is unreachable") from exc
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
-    if response.status_code == 401:
+
+def _raise_for_status(status_code: int, body: str, retry_after: str | None = None) -> None:
+    if status_code == 401:
         raise YandexGPTError("invalid_token", "Invalid API key or IAM token", 401)
-    if response.status_code == 429:
-        raise YandexGPTError("rate_limit", "Rate limit exceeded", 429)
-    if response.status_code >= 500:
-        raise YandexGPTError("server_error", "YandexGPT server error", response.status_code)
-    if not response.ok:
+    if status_code == 429:
+        raise YandexGPTError("rate_limit", "Rate limit exceeded", 429, _parse_retry_after(retry_after))
+    if status_code >= 500:
+        raise YandexGPTError(
+            "server_error", "YandexGPT server error", status_code, _parse_retry_after(retry_after)
+        )
+    if status_code >= 400:
         raise YandexGPTError(
             "bad_request",
-            f"YandexGPT error: {response.text}",
-            response.status_code,
+            f"YandexGPT error: {body}",
+            status_code,
         )
 
-    data = response.json()
+
+def _parse_completion(data: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
     try:
         text = data["result"]["alternatives"][0]["message"]["text"]
         usage = data["result"].get("usage", {})
@@ -210,6 +348,327 @@ def call_yandex_gpt(system_prompt: str, user_prompt: str, timeout: int = 20) ->
         raise YandexGPTError("bad_response", "Unexpected response format") from exc
 
 
+def _retry_delay(exc: YandexGPTError, previous: float) -> float | None:
+    """Decorrelated jitter delay before the next attempt, or None to give up now."""
+    delay = min(RETRY_MAX_SECONDS, random.uniform(RETRY_BASE_SECONDS, max(RETRY_BASE_SECONDS, previous * 3)))
+    if exc.retry_after is not None:
+        if exc.retry_after > RETRY_MAX_SECONDS:
+            return None
+        delay = max(delay, exc.retry_after)
+    return delay
+
+
+def _next_retry(exc: YandexGPTError, attempt: int, previous: float) -> float | None:
+    BREAKER.record_result(exc)
+    if exc.code not in RETRYABLE_CODES or attempt >= RETRY_MAX_ATTEMPTS:
+        return None
+    delay = _retry_delay(exc, previous)
+    if delay is not None:
+        YANDEX_GPT_RETRIES.labels(reason=exc.code).inc()
+    return delay
+
+
+def _estimate_payload_tokens(payload: Dict[str, Any]) -> int:
+    """Prompt tokens plus the completion limit, charged to the TPM bucket up front."""
+    prompt = "".join(message["text"] for message in payload["messages"])
+    return estimate_tokens(prompt) + payload["completionOptions"]["maxTokens"]
+
+
+def _usage_tokens(usage: Dict[str, str]) -> int:
+    try:
+        return int(usage.get("totalTokens", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _rate_limited(exc: RateLimitExceeded) -> YandexGPTError:
+    return YandexGPTError("rate_limited", "Too many YandexGPT requests, try again later", 429, exc.retry_after)
+
+
+def _acquire(tokens: int) -> None:
+    try:
+        LIMITER.acquire(tokens)
+    except RateLimitExceeded as exc:
+        raise _rate_limited(exc) from exc
+
+
+async def _aacquire(tokens: int) -> None:
+    try:
+        await LIMITER.aacquire(tokens)
+    except RateLimitExceeded as exc:
+        raise _rate_limited(exc) from exc
+
+
+def _admit(tokens: int) -> bool:
+    """Pass the circuit breaker, then take a rate-limit slot; returns the probe flag.
+
+    The breaker comes first so calls it rejects never spend the shared quota.
+    """
+    probe = BREAKER.before_call()
+    try:
+        _acquire(tokens)
+    except BaseException:
+        # A rate-limited or cancelled wait says nothing about upstream health
+        BREAKER.release_probe(probe)
+        raise
+    return probe
+
+
+async def _aadmit(tokens: int) -> bool:
+    probe = BREAKER.before_call()
+    try:
+        await _aacquire(tokens)
+    except BaseException:
+        BREAKER.release_probe(probe)
+        raise
+    return probe
+
+
+def _with_retries(send: Callable[[], T], tokens: int = 0) -> T:
+    """Run `send` behind the rate limiter and circuit breaker, retrying retryable failures.
+
+    Every attempt takes its own rate-limit slot and `tokens`.
+    """
+    delay = RETRY_BASE_SECONDS
+    for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+        probe = _admit(tokens)
+        try:
+            result = send()
+        except YandexGPTError as exc:
+            delay = _next_retry(exc, attempt, delay)
+            if delay is None:
+                raise
+        except Exception:
+            BREAKER.record_failure()
+            raise
+        else:
+            BREAKER.record_success()
+            return result
+        finally:
+            BREAKER.release_probe(probe)
+        time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+async def _awith_retries(send: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+    delay = RETRY_BASE_SECONDS
+    for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+        probe = await _aadmit(tokens)
+        try:
+            result = await send()
+        except YandexGPTError as exc:
+            delay = _next_retry(exc, attempt, delay)
+            if delay is None:
+                raise
+        except Exception:
+            BREAKER.record_failure()
+            raise
+        else:
+            BREAKER.record_success()
+            return result
+        finally:
+            BREAKER.release_probe(probe)
+        await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def call_yandex_gpt(system_prompt: str, user_prompt: str, timeout: int = 20) -> Tuple[str, Dict[str, str]]:
+    """Blocking completion call; `timeout` applies to each attempt."""
+    endpoint = os.getenv("YC_GPT_ENDPOINT", DEFAULT_ENDPOINT)
+    headers = _build_headers()
+    folder_id = _get_folder_id()
+    payload = _build_payload(system_prompt, user_prompt, folder_id)
+
+    def _send() -> Tuple[str, Dict[str, str]]:
+        try:
+            response = requests.post(
+                endpoint,
+                json=payload,
+                headers=headers,
+                timeout=timeout,
+            )
+        except requests.Timeout as exc:
+            raise YandexGPTError("timeout", "YandexGPT request timed out") from exc
+        except requests.RequestException as exc:
+            raise YandexGPTError("unavailable", "YandexGPT API is unreachable") from exc
+
+        _raise_for_status(response.status_code, response.text, response.headers.get("Retry-After"))
+        try:
+            data = response.json()
+        except ValueError as exc:
+            raise YandexGPTError("bad_response", "Unexpected response format") from exc
+        text, usage = _parse_completion(data)
+        LIMITER.settle(tokens, _usage_tokens(usage))
+        return text, usage
+
+    tokens = _estimate_payload_tokens(payload)
+    return _with_retries(_send, tokens)
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT.is_closed:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            http2=ASYNC_HTTP2,
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            ),
+        )
+    return _ASYNC_CLIENT
+
+
+def _get_async_semaphore() -> asyncio.Semaphore:
+    global _ASYNC_SEMAPHORE
+    if _ASYNC_SEMAPHORE is None:
+        _ASYNC_SEMAPHORE = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+    return _ASYNC_SEMAPHORE
+
+
+async def _abuild_headers() -> Dict[str, str]:
+    # Minting a new IAM token does blocking I/O; it happens at most once an hour.
+    if _iam_token_is_cached():
+        return _build_headers()
+    return await asyncio.to_thread(_build_headers)
+
+
+async def acall_yandex_gpt(
+    system_prompt: str, user_prompt: str, timeout: float = 20
+) -> Tuple[str, Dict[str, str]]:
+    """Async variant of `call_yandex_gpt` over a pooled keep-alive client.
+
+    `timeout` is a deadline for each attempt, including time spent waiting
+    for a free concurrency slot. Backoff sleeps hold no slot.
+    """
+    endpoint = os.getenv("YC_GPT_ENDPOINT", DEFAULT_ENDPOINT)
+    headers = await _abuild_headers()
+    folder_id = _get_folder_id()
+    payload = _build_payload(system_prompt, user_prompt, folder_id)
+
+    async def _post() -> httpx.Response:
+        async with _get_async_semaphore():
+            return await _get_async_client().post(
+                endpoint,
+                json=payload,
+                headers=headers,
+                timeout=timeout,
+            )
+
+    async def _send() -> Tuple[str, Dict[str, str]]:
+        try:
+            response = await asyncio.wait_for(_post(), timeout=timeout)
+        except (asyncio.TimeoutError, httpx.TimeoutException) as exc:
+            raise YandexGPTError("timeout", "YandexGPT request timed out") from exc
+        except httpx.HTTPError as exc:
+            raise YandexGPTError("unavailable", "YandexGPT API is unreachable") from exc
+
+        _raise_for_status(response.status_code, response.text, response.headers.get("Retry-After"))
+        try:
+            data = response.json()
+        except ValueError as exc:
+            raise YandexGPTError("bad_response", "Unexpected response format") from exc
+        text, usage = _parse_completion(data)
+        await asyncio.to_thread(LIMITER.settle, tokens, _usage_tokens(usage))
+        return text, usage
+
+    tokens = _estimate_payload_tokens(payload)
+    return await _awith_retries(_send, tokens)
+
+
+async def astream_yandex_gpt(
+    system_prompt: str, user_prompt: str, timeout: float = 20
+) -> AsyncIterator[Tuple[str, Dict[str, str]]]:
+    """Stream a completion as `(delta, usage)` pairs.
+
+    YandexGPT streams newline-delimited JSON where every line carries the full
+    text generated so far, so only the text past what was already yielded is
+    yielded; the deltas join into what the client has shown. `usage` is empty
+    until the final line. `timeout` bounds the wait for the first byte and for
+    each following chunk. Failures are retried only until the first delta has
+    been yielded; after that they are raised.
+    """
+    endpoint = os.getenv("YC_GPT_ENDPOINT", DEFAULT_ENDPOINT)
+    headers = await _abuild_headers()
+    folder_id = _get_folder_id()
+    payload = _build_payload(system_prompt, user_prompt, folder_id, stream=True)
+
+    tokens = _estimate_payload_tokens(payload)
+    delay = RETRY_BASE_SECONDS
+    for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+        probe = await _aadmit(tokens)
+        started = False
+        final_usage: Dict[str, str] = {}
+        try:
+            async for delta, usage in _astream_once(endpoint, headers, payload, timeout):
+                started = True
+                final_usage = usage or final_usage
+                yield delta, usage
+        except YandexGPTError as exc:
+            if started:
+                BREAKER.record_result(exc)
+                raise
+            delay = _next_retry(exc, attempt, delay)
+            if delay is None:
+                raise
+        except Exception:
+            BREAKER.record_failure()
+            raise
+        else:
+            BREAKER.record_success()
+            await asyncio.to_thread(LIMITER.settle, tokens, _usage_tokens(final_usage))
+            return
+        finally:
+            # A cancelled call or closed stream says nothing about upstream health
+            BREAKER.release_probe(probe)
+        await asyncio.sleep(delay)
+
+
+async def _astream_once(
+    endpoint: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float
+) -> AsyncIterator[Tuple[str, Dict[str, str]]]:
+    async with _get_async_semaphore():
+        try:
+            async with _get_async_client().stream(
+                "POST",
+                endpoint,
+                json=payload,
+                headers=headers,
+                timeout=timeout,
+            ) as response:
+                if response.status_code >= 400:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    _raise_for_status(response.status_code, body, response.headers.get("Retry-After"))
+
+                sent_len = 0
+                async for line in response.aiter_lines():
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError as exc:
+                        raise YandexGPTError("bad_response", "Unexpected response format") from exc
+                    text, usage = _parse_completion(data)
+                    # Text already sent is never sent again, even if a line rewrites it
+                    delta = text[sent_len:]
+                    sent_len = max(sent_len, len(text))
+                    if delta or usage:
+                        yield delta, usage
+        except httpx.TimeoutException as exc:
+            raise YandexGPTError("timeout", "YandexGPT request timed out") from exc
+        except httpx.HTTPError as exc:
+            raise YandexGPTError("unavailable", "YandexGPT API is unreachable") from exc
+
+
+async def aclose_client() -> None:
+    global _ASYNC_CLIENT, _ASYNC_SEMAPHORE
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+    _ASYNC_CLIENT = None
+    _ASYNC_SEMAPHORE = None
+
+
 def extract_json(text: str) -> Dict[str, Any]:
     start = text.find("{")
     end = text.rfind("}")
@@ -227,7 +686,7 @@ def generate_chat_title(text: str, timeout: int = 15) -> str:
         "только сам текст названия."
     )
     user_prompt = text[:500]  # Limit context to avoid errors and save tokens
-    
+
     try:
         title, _ = call_yandex_gpt(system_prompt, user_prompt, timeout=timeout)
         title = title.strip(' "\'\n\r\t.-').capitalize()